@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -76,12 +77,45 @@ WSGI_APPLICATION = "courseAI.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# SQLite by default. DB_ENGINE=postgresql switches to the PostgreSQL profile, configured
+# from POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST and POSTGRES_PORT.
+# Its connections persist for DB_CONN_MAX_AGE seconds; with DB_POOL=1 they come from
+# psycopg's pool instead (needs psycopg[pool]), sized by DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE.
+
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("POSTGRES_DB", "courseai"),
+            "USER": os.getenv("POSTGRES_USER", "courseai"),
+            "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+            "HOST": os.getenv("POSTGRES_HOST", "localhost"),
+            "PORT": os.getenv("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    if os.getenv("DB_POOL") == "1":
+        # Pooled connections are returned on close, so they must not also persist
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "20")),
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock when a transaction begins (see generation/db_utils.py)
+            "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+            # A file, not shared-cache memory, so threaded tests lock like the real database
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
     }
-}
 
 
 # Password validation
@@ -130,3 +164,105 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# LLM model routing (see generation/llm_utils.py)
+# Map a task to a different tier, replace the models in a tier, or pin a task to one model.
+# e.g. LLM_TASK_TIERS = {"quiz": "large"}, LLM_TASK_MODELS = {"article": "qwen-3-coder-480b"}
+
+LLM_TASK_TIERS = {}
+
+LLM_TIER_MODELS = {}
+
+LLM_TASK_MODELS = {}
+
+
+# Vector retrieval for article enrichment (see generation/vector_index.py)
+# "pinecone" queries the hosted index; "local" searches the memory-mapped copy in
+# VECTOR_INDEX_DIR, filled by `python manage.py sync_vector_index`.
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+
+VECTOR_INDEX_DIR = BASE_DIR / "vector_index"
+
+# Seconds a vector search result is reused for the same normalised query (generation/retrieval_cache.py)
+RETRIEVAL_CACHE_TTL = 24 * 60 * 60
+
+
+# Web search for external-resource lessons (see generation/search_utils.py)
+# Cached questions/results are reused for TAVILY_CACHE_TTL seconds; a chapter's
+# searches run with at most TAVILY_MAX_PARALLEL in parallel.
+
+TAVILY_CACHE_TTL = 7 * 24 * 60 * 60
+
+TAVILY_MAX_PARALLEL = 4
+
+
+# Article reuse (see generation/article_reuse.py): a new article lesson whose match
+# score against an earlier article reaches ARTICLE_REUSE_THRESHOLD copies it; one
+# reaching ARTICLE_ADAPT_THRESHOLD gets the earlier article with a new introduction.
+
+ARTICLE_REUSE_THRESHOLD = 0.9
+
+ARTICLE_ADAPT_THRESHOLD = 0.75
+
+# Newest original articles kept in each process's reuse index
+ARTICLE_REUSE_MAX_ARTICLES = 5000
+
+
+# YouTube Data API caching and quota (see generation/youtube_utils.py)
+# Search results and video statistics are cached with separate TTLs (seconds). Calls
+# stop once today's spend would come within YOUTUBE_QUOTA_RESERVE units of the quota;
+# cached results are served instead.
+
+YOUTUBE_SEARCH_TTL = 7 * 24 * 60 * 60
+
+YOUTUBE_STATS_TTL = 24 * 60 * 60
+
+YOUTUBE_DAILY_QUOTA = 10000
+
+YOUTUBE_QUOTA_RESERVE = 500
+
+# A query's picked video is reused from the catalog for YOUTUBE_MATCH_TTL seconds
+YOUTUBE_MATCH_TTL = 30 * 24 * 60 * 60
+
+# (connect, read) timeout in seconds for YouTube Data API requests
+YOUTUBE_HTTP_TIMEOUT = (3.05, 10)
+
+
+# Lesson page sidebar (see generation/sidebar.py): the course tree and rendered
+# sidebar are cached per course for SIDEBAR_CACHE_TTL seconds and dropped by signals
+# when the course changes. Several server processes need a shared cache backend
+# (CACHES) for that invalidation to reach all of them.
+
+SIDEBAR_CACHE_TTL = 24 * 60 * 60
+
+
+# SQLite concurrency (see generation/db_utils.py): connections use WAL with the
+# given synchronous mode, and a writer waits up to SQLITE_BUSY_TIMEOUT seconds for
+# the lock. With SQLITE_WRITE_QUEUE, generation threads hand their write batches to
+# one in-process writer thread instead of contending for the lock.
+
+SQLITE_BUSY_TIMEOUT = 20
+
+SQLITE_SYNCHRONOUS = "NORMAL"
+
+SQLITE_WRITE_QUEUE = True
+
+
+# Generation jobs (see generation/jobs.py): with GENERATION_QUEUE, a submitted course
+# is only recorded as pending and `manage.py run_generation_worker` processes claim
+# and generate it. A claimed course still generating after GENERATION_CLAIM_TIMEOUT
+# seconds is marked failed when a worker starts.
+
+GENERATION_QUEUE = os.getenv("GENERATION_QUEUE") == "1"
+
+GENERATION_CLAIM_TIMEOUT = 60 * 60
+
+
+# Course and project listings (see generation/pagination.py): LIST_PAGE_SIZE rows per
+# keyset page; the total shown under a listing is cached for LIST_COUNT_TTL seconds.
+
+LIST_PAGE_SIZE = 24
+
+LIST_COUNT_TTL = 5 * 60
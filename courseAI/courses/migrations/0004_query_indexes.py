@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_project_is_final_project'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-updated_at'], name='project_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:49
+
+import generation.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_list_pagination'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='content',
+            field=generation.fields.CompressedTextField(dictionary='code'),
+        ),
+    ]
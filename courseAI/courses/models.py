@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from generation.fields import CompressedTextField
+
 # Create your models here.
 class Project(models.Model):
     """Programming project for interactive lessons."""
@@ -26,6 +28,12 @@ class Project(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Project list pages, most recently edited first (generation/pagination.py)
+            models.Index(fields=['-updated_at', '-id'], name='project_updated_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -33,7 +41,7 @@ class File(models.Model):
     project = models.ForeignKey(Project, related_name='files', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
     relative_path = models.CharField(max_length=500)
-    content = models.TextField()
+    content = CompressedTextField(dictionary="code")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -4,6 +4,8 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.db.models import Prefetch
+from generation.pagination import cached_count, keyset_page
 from .models import Project, File
 
 # Create your views here.
@@ -208,7 +210,19 @@ def get_workspace_files(request):
 
 def list_projects(request):
     """
-    Display a list of all saved projects with links to load them in the editor
+    Display saved projects, most recently edited first, one keyset page at a time,
+    with links to load them in the editor
     """
-    projects = Project.objects.all().order_by('-updated_at')
-    return render(request, 'courses/project_list.html', {'projects': projects})
\ No newline at end of file
+    cursor = request.GET.get('after')
+    # File names only (no contents) for the whole page in one query
+    projects = (Project.objects
+                .select_related('owner')
+                .only('id', 'name', 'description', 'created_at', 'updated_at', 'owner__username')
+                .prefetch_related(Prefetch('files', queryset=File.objects.only('id', 'project_id', 'relative_path').order_by('id'))))
+    page, next_cursor = keyset_page(projects, 'updated_at', cursor)
+    return render(request, 'courses/project_list.html', {
+        'projects': page,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+        'total_projects': cached_count('projects', Project.objects.all()),
+    })
\ No newline at end of file
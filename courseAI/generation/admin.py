@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import CourseGeneration, GeneratedChapter, GeneratedLesson, LessonType, GenerationLog, MultipleChoiceQuiz, ArticleContent, YouTubeVideo, ExternalArticles, TextResponseQuestion, TextResponseSubmission
+from django.db.models import Count
+from django.db.models.functions import Length
+from .models import CourseGeneration, GeneratedChapter, GeneratedLesson, LessonType, GenerationLog, MultipleChoiceQuiz, ArticleContent, YouTubeVideo, ExternalArticles, TextResponseQuestion, TextResponseSubmission, LLMCallSample, TaskTokenBudget, WebSearchCache, LessonDigest, YouTubeSearchCache, YouTubeQuotaUsage, VideoCatalog, VideoQueryMatch, CourseProgress, CourseSnapshot, CompressionDictionary
 
 
 @admin.register(CourseGeneration)
@@ -54,10 +56,18 @@ class GenerationLogAdmin(admin.ModelAdmin):
 
 admin.site.register(MultipleChoiceQuiz)
 admin.site.register(ArticleContent)
-admin.site.register(YouTubeVideo)
 admin.site.register(ExternalArticles)
 
 
+@admin.register(YouTubeVideo)
+class YouTubeVideoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'lesson', 'video']
+    list_select_related = ['lesson', 'video']
+    search_fields = ['lesson__lesson_name', 'video__video_id', 'video__title']
+    raw_id_fields = ['lesson', 'video']
+    ordering = ['-id']
+
+
 @admin.register(TextResponseQuestion)
 class TextResponseQuestionAdmin(admin.ModelAdmin):
     list_display = ['id', 'lesson', 'question_number', 'question_preview', 'created_at']
@@ -82,4 +92,114 @@ class TextResponseSubmissionAdmin(admin.ModelAdmin):
     def get_readonly_fields(self, request, obj=None):
         if obj:  # editing an existing object
             return self.readonly_fields + ['lesson', 'user', 'user_answers']
-        return self.readonly_fields
\ No newline at end of file
+        return self.readonly_fields
+
+@admin.register(LLMCallSample)
+class LLMCallSampleAdmin(admin.ModelAdmin):
+    list_display = ['id', 'task', 'model', 'completion_tokens', 'latency_ms', 'truncated', 'created_at']
+    list_filter = ['task', 'model', 'truncated']
+    readonly_fields = ['created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(TaskTokenBudget)
+class TaskTokenBudgetAdmin(admin.ModelAdmin):
+    list_display = ['task', 'max_tokens', 'p99_tokens', 'sample_count', 'updated_at']
+    readonly_fields = ['updated_at']
+    ordering = ['task']
+
+
+@admin.register(WebSearchCache)
+class WebSearchCacheAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'text', 'hits', 'created_at']
+    list_filter = ['kind']
+    search_fields = ['text']
+    readonly_fields = ['created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(LessonDigest)
+class LessonDigestAdmin(admin.ModelAdmin):
+    list_display = ['id', 'lesson', 'main_ideas', 'search_query', 'video_query', 'created_at']
+    search_fields = ['lesson__lesson_name', 'main_ideas', 'search_query']
+    readonly_fields = ['created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(YouTubeSearchCache)
+class YouTubeSearchCacheAdmin(admin.ModelAdmin):
+    list_display = ['id', 'key', 'fetched_at']
+    readonly_fields = ['fetched_at']
+    ordering = ['-fetched_at']
+
+
+@admin.register(VideoCatalog)
+class VideoCatalogAdmin(admin.ModelAdmin):
+    list_display = ['video_id', 'title', 'channel_title', 'lesson_count', 'available', 'stats_fetched_at', 'created_at']
+    list_filter = ['available']
+    search_fields = ['video_id', 'title', 'channel_title']
+    readonly_fields = ['created_at']
+    ordering = ['-created_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(lesson_total=Count('lesson_videos'))
+    
+    def lesson_count(self, obj):
+        return obj.lesson_total
+    lesson_count.short_description = 'Lessons'
+
+
+@admin.register(VideoQueryMatch)
+class VideoQueryMatchAdmin(admin.ModelAdmin):
+    list_display = ['query', 'video', 'matched_at']
+    list_select_related = ['video']
+    search_fields = ['query', 'video__video_id']
+    raw_id_fields = ['video']
+    ordering = ['-matched_at']
+
+
+@admin.register(YouTubeQuotaUsage)
+class YouTubeQuotaUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'units', 'search_calls', 'videos_calls', 'refused_calls']
+    ordering = ['-day']
+
+
+@admin.register(CourseProgress)
+class CourseProgressAdmin(admin.ModelAdmin):
+    list_display = ['id', 'course', 'user', 'session_key', 'completed_count', 'updated_at']
+    search_fields = ['user__username', 'session_key']
+    readonly_fields = ['completed', 'created_at', 'updated_at']
+    ordering = ['-updated_at']
+
+
+@admin.register(CourseSnapshot)
+class CourseSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['course', 'compressed_size', 'raw_size', 'updated_at']
+    search_fields = ['course__user_prompt']
+    exclude = ['data']
+    readonly_fields = ['course', 'raw_size', 'created_at', 'updated_at']
+    ordering = ['-updated_at']
+    
+    def get_queryset(self, request):
+        # Sizes come from the database; the blobs themselves are never loaded here
+        return super().get_queryset(request).defer('data').annotate(data_size=Length('data'))
+    
+    def compressed_size(self, obj):
+        return obj.data_size
+    compressed_size.short_description = 'Compressed bytes'
+
+
+@admin.register(CompressionDictionary)
+class CompressionDictionaryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'dictionary_size', 'sample_count', 'created_at']
+    list_filter = ['name']
+    exclude = ['data']
+    readonly_fields = ['name', 'sample_count', 'created_at']
+    ordering = ['-created_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('data').annotate(data_size=Length('data'))
+    
+    def dictionary_size(self, obj):
+        return obj.data_size
+    dictionary_size.short_description = 'Bytes'
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GenerationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "generation"
+
+    def ready(self):
+        from . import db_utils, signals
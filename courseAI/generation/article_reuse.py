@@ -0,0 +1,230 @@
+import math
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from . import providers
+from .llm_utils import complete_text
+from .models import ArticleContent
+from .vector_index import HashingEmbedder
+
+client = providers.lazy("cerebras")
+
+# --------------- Article reuse ---------------
+# Articles are the most expensive asset we generate, and courses on similar topics
+# ask for near-identical ones. Every original ArticleContent is indexed in process
+# twice: BM25 over the lesson text plus article body (full-text), and a hashing
+# embedding of the lesson text. A new article lesson is matched against both:
+#   score = EMBEDDING_WEIGHT * cosine(lesson texts) + (1 - EMBEDDING_WEIGHT) * term coverage
+# where term coverage is the share of the new lesson's terms found in the candidate.
+# At or above ARTICLE_REUSE_THRESHOLD the article is copied; at or above
+# ARTICLE_ADAPT_THRESHOLD a short lesson-specific introduction is generated for it.
+#
+# The index holds term counts and vectors only, never article bodies: each article
+# keeps its lesson terms plus its MAX_BODY_TERMS most frequent body terms, and only
+# the newest ARTICLE_REUSE_MAX_ARTICLES articles are kept. New articles are streamed
+# in by one thread at a time into a fresh snapshot that is then swapped in, so
+# lookups never wait on a refresh; they use the previous snapshot meanwhile.
+
+DEFAULT_REUSE_THRESHOLD = 0.9
+DEFAULT_ADAPT_THRESHOLD = 0.75
+DEFAULT_MAX_ARTICLES = 5000
+EMBEDDING_WEIGHT = 0.7
+BM25_CANDIDATES = 20
+BM25_K1 = 1.5
+BM25_B = 0.75
+MAX_BODY_TERMS = 200
+LOAD_CHUNK = 200
+
+_TOKEN = re.compile(r"[a-z0-9+#]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into", "is", "it",
+    "learn", "lesson", "of", "on", "or", "that", "the", "this", "to", "understand", "use", "using",
+    "what", "will", "with", "you", "your",
+}
+
+
+def _terms(text):
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def lesson_text(name, description, details, goals):
+    return f"{name}\n{description}\n{details}\n{goals}"
+
+
+def _doc_terms(text, body):
+    """(term counts kept for an article, its full length in terms)."""
+    lesson_terms = Counter(_terms(text))
+    body_terms = Counter(_terms(body))
+    length = sum(lesson_terms.values()) + sum(body_terms.values())
+    kept = dict(body_terms.most_common(MAX_BODY_TERMS))
+    for term, count in lesson_terms.items():
+        kept[term] = kept.get(term, 0) + count
+    return kept, length
+
+
+class _Snapshot:
+    """One immutable state of the index; lookups read whichever snapshot is current."""
+    __slots__ = ("max_id", "ids", "courses", "doc_terms", "doc_lengths", "df", "vectors")
+
+    def __init__(self, max_id, ids, courses, doc_terms, doc_lengths, df, vectors):
+        self.max_id = max_id
+        self.ids = ids
+        self.courses = courses
+        self.doc_terms = doc_terms
+        self.doc_lengths = doc_lengths
+        self.df = df
+        self.vectors = vectors
+
+
+class ArticleReuseIndex:
+    """In-memory hybrid (BM25 + embedding) index over original generated articles."""
+
+    def __init__(self, max_articles=None):
+        self._refreshing = threading.Lock()
+        self._embedder = HashingEmbedder()
+        self.max_articles = max_articles
+        self._snapshot = _Snapshot(0, [], [], [], [], Counter(),
+                                   np.zeros((0, self._embedder.dim), dtype=np.float32))
+
+    def __len__(self):
+        return len(self._snapshot.ids)
+
+    def refresh(self):
+        """Index articles saved since the last refresh (by any process); no-op while another thread refreshes."""
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            current = self._snapshot
+            rows = (ArticleContent.objects
+                    .filter(id__gt=current.max_id, reused_from__isnull=True)
+                    .order_by('id')
+                    .values_list('id', 'content', 'lesson__lesson_name', 'lesson__lesson_description',
+                                 'lesson__lesson_details', 'lesson__lesson_goals',
+                                 'lesson__chapter__course_generation_id')
+                    .iterator(chunk_size=LOAD_CHUNK))
+            ids, courses, doc_terms, doc_lengths, texts = [], [], [], [], []
+            df = Counter()
+            for article_id, body, name, description, details, goals, course_id in rows:
+                text = lesson_text(name, description, details, goals)
+                # Embed content words only so stopwords do not dilute short lesson texts
+                texts.append(" ".join(_terms(text)))
+                terms, length = _doc_terms(text, body)
+                ids.append(article_id)
+                courses.append(course_id)
+                doc_terms.append(terms)
+                doc_lengths.append(length)
+                df.update(terms.keys())
+            if ids:
+                self._snapshot = self._extend(current, ids, courses, doc_terms, doc_lengths, df, texts)
+        finally:
+            self._refreshing.release()
+
+    def _extend(self, current, ids, courses, doc_terms, doc_lengths, df, texts):
+        """A new snapshot with the given articles added and the oldest ones past the limit dropped."""
+        df.update(current.df)
+        ids, courses = current.ids + ids, current.courses + courses
+        doc_terms, doc_lengths = current.doc_terms + doc_terms, current.doc_lengths + doc_lengths
+        vectors = np.vstack([current.vectors, self._embedder.embed(texts)])
+        limit = self.max_articles or getattr(settings, "ARTICLE_REUSE_MAX_ARTICLES", DEFAULT_MAX_ARTICLES)
+        drop = max(0, len(ids) - limit)
+        for terms in doc_terms[:drop]:
+            df.subtract(terms.keys())
+        df = +df
+        return _Snapshot(ids[-1] if ids else current.max_id, ids[drop:], courses[drop:], doc_terms[drop:],
+                         doc_lengths[drop:], df, vectors[drop:])
+
+    def _bm25_candidates(self, snapshot, terms):
+        n = len(snapshot.ids)
+        avgdl = sum(snapshot.doc_lengths) / n
+        scores = np.zeros(n, dtype=np.float32)
+        for term in set(terms):
+            df = snapshot.df.get(term)
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i, doc in enumerate(snapshot.doc_terms):
+                tf = doc.get(term)
+                if tf:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * snapshot.doc_lengths[i] / avgdl)
+                    scores[i] += idf * tf * (BM25_K1 + 1) / norm
+        ranked = np.argsort(-scores)[:BM25_CANDIDATES]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+    def best_match(self, text, exclude_course=None):
+        """(article id, score) of the closest original article, or None."""
+        self.refresh()
+        snapshot = self._snapshot
+        if not snapshot.ids:
+            return None
+        terms = _terms(text)
+        if not terms:
+            return None
+        query = self._embedder.embed([" ".join(terms)])[0]
+        # Full-text narrows the field; the dense vector catches paraphrased lesson text
+        candidates = set(self._bm25_candidates(snapshot, terms))
+        candidates.update(int(i) for i in np.argsort(-(snapshot.vectors @ query))[:BM25_CANDIDATES])
+        best = None
+        unique_terms = set(terms)
+        for i in candidates:
+            if exclude_course is not None and snapshot.courses[i] == exclude_course:
+                continue
+            cosine = max(0.0, float(snapshot.vectors[i] @ query))
+            coverage = sum(1 for t in unique_terms if t in snapshot.doc_terms[i]) / len(unique_terms)
+            score = EMBEDDING_WEIGHT * cosine + (1 - EMBEDDING_WEIGHT) * coverage
+            if best is None or score > best[1]:
+                best = (snapshot.ids[i], score)
+        return best
+
+
+_index = ArticleReuseIndex()
+
+
+def _adapt(article, lesson):
+    """Short introduction tying an existing article to the new lesson's goals."""
+    return complete_text(
+        "article_intro",
+        [
+            {
+                "role": "system",
+                "content": "You write a short Markdown introduction (one or two paragraphs, no heading) that connects an existing article to a specific lesson. Do not repeat the article. Return only the introduction.",
+            },
+            {
+                "role": "user",
+                "content": f"""
+                    Lesson: {lesson.lesson_name}
+                    Description: {lesson.lesson_description}
+                    Goals: {lesson.lesson_goals}
+
+                    Existing article (beginning):
+                    {article.content[:3000]}
+                """,
+            },
+        ],
+        client,
+        temperature=0.7,
+    ).strip()
+
+
+def find_reusable_article(lesson):
+    """Return (content, source ArticleContent, score) when an earlier article fits this lesson, else None."""
+    text = lesson_text(lesson.lesson_name, lesson.lesson_description, lesson.lesson_details, lesson.lesson_goals)
+    match = _index.best_match(text, exclude_course=lesson.chapter.course_generation_id)
+    if match is None:
+        return None
+    article_id, score = match
+    adapt_threshold = getattr(settings, "ARTICLE_ADAPT_THRESHOLD", DEFAULT_ADAPT_THRESHOLD)
+    if score < adapt_threshold:
+        return None
+    source = ArticleContent.objects.filter(id=article_id).first()
+    if source is None:
+        return None
+    if score >= getattr(settings, "ARTICLE_REUSE_THRESHOLD", DEFAULT_REUSE_THRESHOLD):
+        print(f"♻️ Reusing article {source.id} for lesson {lesson.id} (score {score:.2f})")
+        return source.content, source, score
+    print(f"♻️ Adapting article {source.id} for lesson {lesson.id} (score {score:.2f})")
+    intro = _adapt(source, lesson)
+    return (f"{intro}\n\n{source.content}" if intro else source.content), source, score
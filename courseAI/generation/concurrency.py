@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# --------------- Adaptive (AIMD) concurrency limits ---------------
+# One limiter per provider and API key. Healthy calls grow the limit by roughly one
+# slot per window of completed calls (additive increase); a 429, a 5xx or a latency
+# spike halves it (multiplicative decrease). At most one cut is applied per cooldown
+# so a burst of throttled calls that were already in flight only counts once.
+
+INITIAL_LIMIT = 4
+MIN_LIMIT = 1
+MAX_LIMIT = 32
+DECREASE_FACTOR = 0.5
+LATENCY_ALPHA = 0.1
+LATENCY_SPIKE = 2.5
+LATENCY_MIN_SAMPLES = 10
+DECREASE_COOLDOWN = 5.0
+
+
+def key_id(api_key):
+    """Short, non-reversible label for an API key so limits are per key without logging it."""
+    if not api_key:
+        return "default"
+    return hashlib.sha256(str(api_key).encode("utf-8")).hexdigest()[:8]
+
+
+def status_code(exc):
+    """Best-effort HTTP status for an SDK or requests exception (None when unknown)."""
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        response = getattr(exc, "response", None)
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_overload(exc):
+    """True for errors that mean the provider wants less traffic: 429 and 5xx."""
+    code = status_code(exc)
+    return code is not None and (code == 429 or code >= 500)
+
+
+def is_transient(exc):
+    """True for errors worth retrying later: overload, timeouts and dropped connections."""
+    if is_overload(exc) or isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    # SDK connection errors (APIConnectionError, APITimeoutError) carry no status code
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError"}
+
+
+class AIMDLimiter:
+    """Blocking concurrency limit that adapts to upstream rate-limit feedback."""
+
+    def __init__(self, name, initial=INITIAL_LIMIT, minimum=MIN_LIMIT, maximum=MAX_LIMIT):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._latency = None
+        self._samples = 0
+        self._last_decrease = 0.0
+        self.stats = {"calls": 0, "errors": 0, "throttled": 0, "spikes": 0, "decreases": 0,
+                      "wait_seconds": 0.0, "peak_in_flight": 0}
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def acquire(self):
+        started = time.monotonic()
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+            self.stats["calls"] += 1
+            self.stats["wait_seconds"] += time.monotonic() - started
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+
+    def release(self, latency=None, exc=None):
+        with self._cond:
+            self._in_flight -= 1
+            if exc is not None:
+                self.stats["errors"] += 1
+                if is_overload(exc):
+                    self.stats["throttled"] += 1
+                    self._decrease()
+            elif latency is not None:
+                spike = (self._samples >= LATENCY_MIN_SAMPLES
+                         and latency > self._latency * LATENCY_SPIKE)
+                if spike:
+                    self.stats["spikes"] += 1
+                    self._decrease()
+                else:
+                    self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+                # Spikes still feed the baseline so a permanent slowdown stops counting as one
+                self._latency = latency if self._latency is None else (
+                    LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self._latency)
+                self._samples += 1
+            self._cond.notify_all()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.minimum), self._limit * DECREASE_FACTOR)
+        self.stats["decreases"] += 1
+        print(f"🐢 {self.name} concurrency cut to {self.limit}")
+
+    @contextmanager
+    def slot(self):
+        """Hold one slot for the duration of a provider call and report how it went.
+
+        The caller may set ``call["units"]`` (e.g. tokens generated) so latency is
+        compared per unit of work rather than per call.
+        """
+        self.acquire()
+        started = time.monotonic()
+        call = {"units": 1}
+        try:
+            yield call
+        except BaseException as e:
+            self.release(exc=e)
+            raise
+        else:
+            self.release(latency=(time.monotonic() - started) / max(1, call["units"]))
+
+    @asynccontextmanager
+    async def aslot(self):
+        """``slot()`` for coroutines: waiting for a free slot happens off the event loop."""
+        # The waiting thread cannot be interrupted, so a cancelled waiter must hand back
+        # the slot it is still about to get: whichever side comes second releases it
+        handoff = threading.Lock()
+        state = {"held": False, "abandoned": False}
+
+        def acquire():
+            self.acquire()
+            with handoff:
+                if state["abandoned"]:
+                    self.release()
+                else:
+                    state["held"] = True
+
+        try:
+            await asyncio.to_thread(acquire)
+        except asyncio.CancelledError:
+            with handoff:
+                state["abandoned"] = True
+                held = state["held"]
+            if held:
+                self.release()
+            raise
+        started = time.monotonic()
+        call = {"units": 1}
+        try:
+            yield call
+        except BaseException as e:
+            self.release(exc=e)
+            raise
+        else:
+            self.release(latency=(time.monotonic() - started) / max(1, call["units"]))
+
+    def snapshot(self):
+        with self._cond:
+            return {"limit": self.limit, "in_flight": self._in_flight,
+                    "latency_ewma": self._latency, **self.stats}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(provider, key="default"):
+    """Return the shared limiter for a provider and API key (e.g. "cerebras", "primary")."""
+    name = f"{provider}:{key}"
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = AIMDLimiter(name)
+        return _limiters[name]
+
+
+def limiter_stats():
+    """Current limit, in-flight count and feedback counters for every limiter."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {l.name: l.snapshot() for l in limiters}
@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models import Case, Count, Value, When
+
+from .models import CourseGeneration, GeneratedChapter, GeneratedLesson
+
+# --------------- Course counters ---------------
+# Lesson totals and per-type counts are stored on CourseGeneration and
+# GeneratedChapter so course pages read them from the rows they already load.
+# recount_course() rebuilds them with one grouped aggregate and two UPDATEs (all
+# chapters at once, then the course) when a course finishes generating or loses
+# lessons. Completion is per learner (generation/progress.py).
+
+
+def course_counts(course_id):
+    """Lesson totals per chapter, per type and for the course, from one grouped query."""
+    rows = (GeneratedLesson.objects
+            .filter(chapter__course_generation_id=course_id)
+            .values('chapter_id', 'lesson_type')
+            .annotate(total=Count('id'))
+            .order_by())
+    chapters = {}
+    types = {}
+    for row in rows:
+        chapters[row['chapter_id']] = chapters.get(row['chapter_id'], 0) + row['total']
+        types[row['lesson_type']] = types.get(row['lesson_type'], 0) + row['total']
+    return {
+        'chapters': chapters,
+        'lesson_type_counts': types,
+        'total_lessons': sum(chapters.values()),
+    }
+
+
+def recount_course(course):
+    """Recompute and store a course's counters; the instance is updated as well."""
+    counts = course_counts(course.id)
+    with transaction.atomic():
+        # The number of chapters updated is the chapter total
+        course.total_chapters = GeneratedChapter.objects.filter(course_generation_id=course.id).update(
+            total_lessons=Case(*[When(id=chapter_id, then=Value(total)) for chapter_id, total in counts['chapters'].items()],
+                               default=Value(0)),
+        )
+        course.total_lessons = counts['total_lessons']
+        course.lesson_type_counts = counts['lesson_type_counts']
+        CourseGeneration.objects.filter(id=course.id).update(
+            total_chapters=course.total_chapters,
+            total_lessons=course.total_lessons,
+            lesson_type_counts=course.lesson_type_counts,
+        )
+    return course
+
+
+def percent_complete(completed, total):
+    """Whole-number percentage of lessons completed (0 for an empty course)."""
+    return round(100 * completed / total) if total else 0
@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+
+from .models import CourseGeneration, GeneratedChapter
+
+# --------------- Course tree ---------------
+# Navigation, the sidebar and course totals only need a handful of fields per
+# chapter and lesson (nothing learner-specific; see generation/progress.py), so a course is loaded once with a single values() query into
+# small __slots__ objects and cached per course. Lessons are also kept in one flat,
+# course-ordered list with an id -> position map, which makes previous/next lookups
+# O(1). Signals (generation/signals.py) invalidate the cached tree on change.
+
+DEFAULT_TTL = 24 * 60 * 60
+# GeneratedLesson fields the tree holds; saves touching only other fields keep it
+TREE_FIELDS = {'lesson_number', 'lesson_name', 'lesson_type', 'ordinal', 'chapter', 'chapter_id'}
+
+LESSON_ICONS = {'vid': '🎬', 'int': '💻', 'code': '💻', 'mcq': '📝', 'art': '📖', 'ext': '🔗', 'txt': '✍️'}
+
+
+class LessonNode:
+    __slots__ = ('id', 'number', 'name', 'type', 'ordinal', 'quiz_id', 'has_article', 'has_external',
+                 'chapter_number', 'position')
+
+    def __init__(self, id, number, name, type, ordinal, quiz_id, has_article, has_external, chapter_number):
+        self.id = id
+        self.number = number
+        self.name = name
+        self.type = type
+        self.ordinal = ordinal
+        self.quiz_id = quiz_id
+        self.has_article = has_article
+        self.has_external = has_external
+        self.chapter_number = chapter_number
+        self.position = None
+
+    @property
+    def icon(self):
+        return LESSON_ICONS.get(self.type, '')
+
+    @property
+    def url(self):
+        """Page for this lesson, or None while its content does not exist yet."""
+        if self.type == 'vid':
+            return reverse('generation:lesson_youtube', args=[self.id])
+        if self.type in ('int', 'code'):
+            return reverse('generation:load_lesson_project', args=[self.id])
+        if self.type == 'mcq' and self.quiz_id:
+            return reverse('generation:take_quiz', args=[self.quiz_id])
+        if self.type == 'art' and self.has_article:
+            return reverse('generation:lesson_article', args=[self.id])
+        if self.type == 'ext' and self.has_external:
+            return reverse('generation:lesson_external', args=[self.id])
+        if self.type == 'txt':
+            return reverse('generation:lesson_text_response', args=[self.id])
+        return None
+
+    def __repr__(self):
+        return f"<LessonNode {self.id} {self.chapter_number}.{self.number} {self.type}>"
+
+
+class ChapterNode:
+    __slots__ = ('id', 'number', 'name', 'lessons')
+
+    def __init__(self, id, number, name):
+        self.id = id
+        self.number = number
+        self.name = name
+        self.lessons = []
+
+    def __repr__(self):
+        return f"<ChapterNode {self.id} {self.number}>"
+
+
+class CourseTree:
+    """Chapters and lessons of one course, in order."""
+    __slots__ = ('course_id', 'title', 'chapters', 'lessons', '_positions')
+
+    def __init__(self, course_id, title, chapters):
+        self.course_id = course_id
+        self.title = title
+        self.chapters = chapters
+        self.lessons = [lesson for chapter in chapters for lesson in chapter.lessons]
+        self._positions = {}
+        for position, lesson in enumerate(self.lessons):
+            lesson.position = position
+            self._positions[lesson.id] = position
+
+    def lesson(self, lesson_id):
+        position = self._positions.get(lesson_id)
+        return None if position is None else self.lessons[position]
+
+    def previous(self, lesson_id):
+        position = self._positions.get(lesson_id)
+        return self.lessons[position - 1] if position else None
+
+    def next(self, lesson_id):
+        position = self._positions.get(lesson_id)
+        if position is None or position + 1 >= len(self.lessons):
+            return None
+        return self.lessons[position + 1]
+
+    @property
+    def total_chapters(self):
+        return len(self.chapters)
+
+    @property
+    def total_lessons(self):
+        return len(self.lessons)
+
+    def type_counts(self):
+        """Lesson count per lesson type, in order of first appearance."""
+        counts = {}
+        for lesson in self.lessons:
+            counts[lesson.type] = counts.get(lesson.type, 0) + 1
+        return counts
+
+
+def build_course_tree(course_id):
+    """Load a course's tree with one query."""
+    rows = (GeneratedChapter.objects
+            .filter(course_generation_id=course_id)
+            .order_by('chapter_number', 'lessons__lesson_number')
+            .values_list('id', 'chapter_number', 'chapter_name', 'course_generation__user_prompt',
+                         'lessons__id', 'lessons__lesson_number', 'lessons__lesson_name', 'lessons__lesson_type',
+                         'lessons__ordinal', 'lessons__quiz__id', 'lessons__article__id',
+                         'lessons__external_article__id'))
+    chapters = []
+    title = None
+    for (chapter_id, chapter_number, chapter_name, title,
+         lesson_id, number, name, lesson_type, ordinal, quiz_id, article_id, external_id) in rows:
+        if not chapters or chapters[-1].id != chapter_id:
+            chapters.append(ChapterNode(chapter_id, chapter_number, chapter_name))
+        if lesson_id is not None:
+            chapters[-1].lessons.append(LessonNode(lesson_id, number, name, lesson_type, ordinal, quiz_id,
+                                                   article_id is not None, external_id is not None,
+                                                   chapter_number))
+    if title is None:
+        title = CourseGeneration.objects.filter(id=course_id).values_list('user_prompt', flat=True).first()
+    return CourseTree(course_id, title, chapters)
+
+
+def tree_key(course_id):
+    return f"course_tree:{course_id}"
+
+
+def sidebar_key(course_id):
+    return f"sidebar:html:{course_id}"
+
+
+def cache_ttl():
+    return getattr(settings, "SIDEBAR_CACHE_TTL", DEFAULT_TTL)
+
+
+def course_tree(course_id):
+    """The cached tree for a course, rebuilt on a miss."""
+    tree = cache.get(tree_key(course_id))
+    if tree is None:
+        tree = build_course_tree(course_id)
+        cache.set(tree_key(course_id), tree, cache_ttl())
+    return tree
+
+
+def invalidate_course(course_id):
+    """Drop a course's cached tree and everything rendered from it once the transaction commits."""
+    if course_id is None:
+        return
+    transaction.on_commit(lambda: cache.delete_many([tree_key(course_id), sidebar_key(course_id)]))
@@ -0,0 +1,140 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+
+from .course_stats import recount_course
+from .course_tree import build_course_tree
+from .db_utils import db_stats, write
+from .jobs import claim_course
+from .models import CourseGeneration, CourseProgress, GeneratedChapter, GeneratedLesson, GenerationLog
+from .progress import mark_complete, number_lessons
+
+# --------------- Database load benchmark ---------------
+# The same workload for every backend, used by `manage.py bench_db` and the backend
+# compatibility test in generation/tests.py. It runs from a thread pool, the way
+# course generation does. There are four phases:
+#   seed      build courses the way generation does (chapters, lessons, logs)
+#   read      load course trees and detail rows
+#   progress  learners completing lessons (compare-and-swap on CourseProgress)
+#   claim     workers racing to claim the courses as generation jobs
+# Bench courses are marked by BENCH_PREFIX in user_prompt and deleted by cleanup().
+# Do not run the claim phase while real generation workers are running.
+
+BENCH_PREFIX = "bench_db:"
+LESSON_TYPES = ["vid", "art", "mcq", "txt", "ext"]
+
+
+def _timed(fn, items, threads):
+    """Run fn over items on a thread pool; wall time, per-call latencies and errors."""
+    def call(item):
+        started = time.perf_counter()
+        try:
+            fn(item)
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, e
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        outcomes = list(executor.map(call, items))
+    wall = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in outcomes)
+    errors = [error for _, error in outcomes if error is not None]
+    return {
+        "ops": len(outcomes),
+        "errors": len(errors),
+        "first_error": str(errors[0]) if errors else None,
+        "seconds": wall,
+        "ops_per_second": len(outcomes) / wall if wall else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
+    }
+
+
+def _seed_course(n, chapters, lessons):
+    def save():
+        course = CourseGeneration.objects.create(user_prompt=f"{BENCH_PREFIX}{n}", status='completed')
+        for c in range(1, chapters + 1):
+            chapter = GeneratedChapter.objects.create(course_generation=course, chapter_number=c,
+                                                      chapter_name=f"Chapter {c}", difficulty_rating=c)
+            GeneratedLesson.objects.bulk_create([
+                GeneratedLesson(chapter=chapter, lesson_number=l, lesson_type=LESSON_TYPES[l % len(LESSON_TYPES)],
+                                lesson_name=f"Lesson {c}.{l}")
+                for l in range(1, lessons + 1)
+            ])
+            GenerationLog.objects.create(course_generation=course, step=f"lesson_generation_chapter_{c}",
+                                         status="completed", message=f"Generated {lessons} lessons")
+        return course
+
+    course = write(save)
+    recount_course(course)
+    number_lessons(course.id)
+
+
+def _read_course(course_id):
+    build_course_tree(course_id)
+    course = CourseGeneration.objects.get(id=course_id)
+    list(course.chapters.all())
+
+
+def _learner(n):
+    return SimpleNamespace(user=AnonymousUser(), session=SimpleNamespace(session_key=f"bench-{n}"))
+
+
+def _complete(item):
+    learner_n, lesson = item
+    mark_complete(_learner(learner_n), lesson)
+
+
+def bench_courses():
+    return CourseGeneration.objects.filter(user_prompt__startswith=BENCH_PREFIX)
+
+
+def cleanup():
+    bench_courses().delete()
+
+
+def run(courses=20, chapters=4, lessons=6, learners=10, threads=8):
+    """Run all phases and return their stats plus the database lock/writer counters."""
+    results = {"vendor": connection.vendor, "threads": threads}
+    cleanup()
+    try:
+        results["seed"] = _timed(lambda n: _seed_course(n, chapters, lessons), range(courses), threads)
+        course_ids = list(bench_courses().values_list('id', flat=True))
+        results["read"] = _timed(_read_course, course_ids * 5, threads)
+
+        # Every learner completes every lesson of the first course, all at once
+        first_lessons = list(GeneratedLesson.objects
+                             .filter(chapter__course_generation_id=min(course_ids))
+                             .select_related('chapter'))
+        items = [(n, lesson) for lesson in first_lessons for n in range(learners)]
+        results["progress"] = _timed(_complete, items, threads)
+        recorded = sum(CourseProgress.objects.filter(course_id=min(course_ids))
+                       .values_list('completed_count', flat=True))
+        results["progress"]["lost_updates"] = len(items) - recorded
+
+        bench_courses().update(status='pending')
+        claimed = []
+
+        def drain(_):
+            while True:
+                course = claim_course(bench_courses())
+                if course is None:
+                    return
+                claimed.append(course.id)
+
+        results["claim"] = _timed(drain, range(threads), threads)
+        results["claim"]["claimed"] = len(claimed)
+        results["claim"]["duplicates"] = len(claimed) - len(set(claimed))
+        seconds = results["claim"]["seconds"]
+        results["claim"]["claims_per_second"] = len(claimed) / seconds if seconds else 0.0
+        results["database"] = db_stats()
+    finally:
+        cleanup()
+    return results
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# --------------- SQLite connection setup ---------------
+# Course generation writes lessons, quizzes, articles and logs from a thread per
+# chapter. Every new SQLite connection is switched to WAL (readers no longer block the
+# writer or each other), synchronous=NORMAL (safe with WAL, one fsync per checkpoint
+# rather than per commit) and a busy_timeout, so a writer waits for the lock instead
+# of failing at once with "database is locked". DATABASES also sets
+# transaction_mode=IMMEDIATE: transactions take the write lock when they begin, while
+# the busy timeout still applies, instead of failing when a read upgrades to a write.
+
+DEFAULT_BUSY_TIMEOUT = 20
+DEFAULT_SYNCHRONOUS = "NORMAL"
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+# A write statement that takes longer than this was almost certainly waiting for the lock
+LOCK_WAIT_THRESHOLD = 0.1
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "BEGIN")
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    synchronous = str(getattr(settings, "SQLITE_SYNCHRONOUS", DEFAULT_SYNCHRONOUS)).upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        synchronous = DEFAULT_SYNCHRONOUS
+    busy_timeout = int(getattr(settings, "SQLITE_BUSY_TIMEOUT", DEFAULT_BUSY_TIMEOUT) * 1000)
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+    if record_lock_waits not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_lock_waits)
+
+
+# --------------- Lock-wait metrics ---------------
+# SQLite does not report how long a statement waited in its busy handler, so every
+# write statement (and BEGIN, where IMMEDIATE transactions wait) is timed: slow ones
+# count as lock waits, and "database is locked" errors are counted separately.
+
+_lock_stats = {"writes": 0, "write_seconds": 0.0, "lock_waits": 0, "lock_wait_seconds": 0.0,
+               "max_wait_seconds": 0.0, "locked_errors": 0}
+_lock_stats_lock = threading.Lock()
+
+
+def _is_write(sql):
+    return sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+
+
+def record_lock_waits(execute, sql, params, many, context):
+    if not _is_write(sql):
+        return execute(sql, params, many, context)
+    started = time.monotonic()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as exc:
+        if "locked" in str(exc) or "busy" in str(exc):
+            with _lock_stats_lock:
+                _lock_stats["locked_errors"] += 1
+        raise
+    finally:
+        elapsed = time.monotonic() - started
+        with _lock_stats_lock:
+            _lock_stats["writes"] += 1
+            _lock_stats["write_seconds"] += elapsed
+            if elapsed >= LOCK_WAIT_THRESHOLD:
+                _lock_stats["lock_waits"] += 1
+                _lock_stats["lock_wait_seconds"] += elapsed
+                _lock_stats["max_wait_seconds"] = max(_lock_stats["max_wait_seconds"], elapsed)
+
+
+# --------------- Serialized writer ---------------
+# Background write batches (see process_single_chapter) go through one writer thread
+# that runs each batch in its own transaction, so generation threads queue in process
+# instead of contending for the SQLite lock. Callers block until their batch is
+# committed and get its return value (or its exception). Batches run inline when the
+# queue is off (SQLITE_WRITE_QUEUE), the database is not SQLite, the caller is the
+# writer itself, or the caller is inside a transaction that may already hold the lock.
+
+class DatabaseWriter:
+    """Single thread that applies queued write batches one at a time."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "inline": 0, "errors": 0, "queue_wait_seconds": 0.0,
+                      "max_queue_wait_seconds": 0.0, "run_seconds": 0.0, "peak_depth": 0}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            future, fn, args, kwargs, queued_at = self._queue.get()
+            started = time.monotonic()
+            if future.set_running_or_notify_cancel():
+                try:
+                    with transaction.atomic():
+                        result = fn(*args, **kwargs)
+                    future.set_result(result)
+                except BaseException as exc:
+                    with self._lock:
+                        self.stats["errors"] += 1
+                    future.set_exception(exc)
+                finally:
+                    connection.close_if_unusable_or_obsolete()
+            with self._lock:
+                wait = started - queued_at
+                self.stats["batches"] += 1
+                self.stats["queue_wait_seconds"] += wait
+                self.stats["max_queue_wait_seconds"] = max(self.stats["max_queue_wait_seconds"], wait)
+                self.stats["run_seconds"] += time.monotonic() - started
+            self._queue.task_done()
+
+    def enabled(self):
+        return getattr(settings, "SQLITE_WRITE_QUEUE", True) and connection.vendor == "sqlite"
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) to run in a transaction on the writer thread; returns a Future."""
+        future = Future()
+        self._start()
+        self._queue.put((future, fn, args, kwargs, time.monotonic()))
+        with self._lock:
+            self.stats["peak_depth"] = max(self.stats["peak_depth"], self._queue.qsize())
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """Run a write batch through the queue (or inline, see above) and return its result."""
+        if (not self.enabled() or threading.current_thread() is self._thread
+                or connection.in_atomic_block):
+            with self._lock:
+                self.stats["inline"] += 1
+            with transaction.atomic():
+                return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def snapshot(self):
+        with self._lock:
+            return {**self.stats, "depth": self._queue.qsize()}
+
+
+writer = DatabaseWriter()
+
+
+def write(fn, *args, **kwargs):
+    """Apply one write batch through the shared writer; see DatabaseWriter.run."""
+    return writer.run(fn, *args, **kwargs)
+
+
+def db_stats():
+    """Lock-wait counters for SQLite writes and the writer queue's counters."""
+    with _lock_stats_lock:
+        locks = dict(_lock_stats)
+    return {"vendor": connection.vendor, "lock_waits": locks, "writer": writer.snapshot()}
@@ -0,0 +1,114 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+
+from . import providers
+from .db_utils import write
+from .llm_utils import complete_structured, StructuredOutputError
+from .models import LessonDigest
+
+client = providers.lazy("cerebras")
+
+# --------------- Lesson digests ---------------
+# One LLM call per lesson distils it into main ideas, keywords, a web search question
+# and a YouTube query. Article enrichment (Pinecone), external sources (Tavily) and
+# video search all read the stored digest instead of re-summarising the lesson.
+
+DIGEST_LESSON_TYPES = {'art', 'ext', 'vid'}
+MAX_PARALLEL = 4
+
+_WORD = re.compile(r"[A-Za-z0-9+#]+")
+
+
+def _fallback_digest(lesson):
+    """Digest built from the lesson text alone when the model output is unusable."""
+    keywords = []
+    for word in _WORD.findall(lesson.lesson_name):
+        if len(word) > 2 and word.lower() not in keywords:
+            keywords.append(word.lower())
+    return {
+        "main_ideas": lesson.lesson_name,
+        "keywords": keywords,
+        "search_query": f"{lesson.lesson_name}. {lesson.lesson_description}",
+        "video_query": f"{lesson.lesson_name} tutorial",
+    }
+
+
+def _generate_digest(lesson):
+    try:
+        return complete_structured(
+            "lesson_digest",
+            [
+                {
+                    "role": "system",
+                    "content": """
+                        You condense a lesson into the inputs for three lookups. Return ONLY a JSON object with:
+                        - main_ideas: the lesson's main ideas, a few words each, comma separated
+                        - keywords: 3 to 8 short keywords
+                        - search_query: one simple web search question containing the main ideas
+                        - video_query: a concise YouTube search query for an educational video under 20 minutes
+                        No explanations or extra text.
+                    """,
+                },
+                {
+                    "role": "user",
+                    "content": f"""
+                        Lesson Name: {lesson.lesson_name}
+                        Description: {lesson.lesson_description}
+                        Details: {lesson.lesson_details}
+                        Goals: {lesson.lesson_goals}
+                    """,
+                },
+            ],
+            client,
+        )
+    except StructuredOutputError as e:
+        print(f"⚠️ Lesson digest for lesson {lesson.id} unusable, using lesson text: {e}")
+        return _fallback_digest(lesson)
+
+
+def lesson_digest(lesson):
+    """The stored digest for a lesson, generating and saving it on first use."""
+    existing = LessonDigest.objects.filter(lesson=lesson).first()
+    if existing is not None:
+        return existing
+    data = _generate_digest(lesson)
+    fallback = _fallback_digest(lesson)
+    # Digests are built on worker threads, so they are saved by the shared writer (generation/db_utils.py);
+    # one computed concurrently elsewhere is kept
+    digest, _created = write(
+        LessonDigest.objects.get_or_create,
+        lesson=lesson,
+        defaults={
+            "main_ideas": data.get("main_ideas", "").strip() or fallback["main_ideas"],
+            "keywords": data.get("keywords") or fallback["keywords"],
+            "search_query": (data.get("search_query", "").strip() or fallback["search_query"])[:300],
+            "video_query": (data.get("video_query", "").strip() or fallback["video_query"])[:200],
+        },
+    )
+    return digest
+
+
+def lesson_digests(lessons):
+    """Digests for the retrieval-backed lessons (article, external, video), computed in parallel.
+
+    Returns a dict of lesson id -> LessonDigest.
+    """
+    lessons = [lesson for lesson in lessons if lesson.lesson_type in DIGEST_LESSON_TYPES]
+    if not lessons:
+        return {}
+
+    def worker(lesson):
+        try:
+            return lesson_digest(lesson)
+        except Exception as e:
+            # Lookups for this lesson will try again on first use
+            print(f"❌ Could not build digest for lesson {lesson.id}: {str(e)}")
+            return None
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=min(len(lessons), MAX_PARALLEL)) as executor:
+        digests = zip(lessons, executor.map(worker, lessons))
+        return {lesson.id: digest for lesson, digest in digests if digest is not None}
@@ -0,0 +1,207 @@
+import base64
+import binascii
+import json
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+from django import forms
+from django.apps import apps
+from django.db import DatabaseError, models
+
+# --------------- Compressed text fields ---------------
+# Generated articles, starter code and grading JSON are long, repetitive text. These
+# fields store them zlib-compressed in an ordinary text column and hand back the plain
+# value, so models and views see no difference. A stored value looks like
+#   "\x01z" <dictionary id> ":" <base64 of zlib data>
+# where the dictionary id is a CompressionDictionary (0 = none): a zlib preset
+# dictionary trained on earlier rows of the same kind, which is what makes short
+# values compress well. Values without the marker are read as they are, so rows
+# written before a field became compressed keep working until
+# `manage.py compress_content` rewrites them. Plain values that start with \x01
+# (user-supplied file content can) are stored behind ESCAPE so they are never read
+# as compressed. Lookups other than exact/isnull do not work on compressed columns.
+
+MARKER = "\x01z"
+ESCAPE = "\x01p"
+COMPRESSION_LEVEL = 6
+# Shorter values are stored as they are
+MIN_COMPRESS_SIZE = 128
+# zlib uses at most the last 32 KB of a preset dictionary
+DICTIONARY_SIZE = 32 * 1024
+LATEST_DICTIONARY_TTL = 5 * 60
+
+_STORED = re.compile(r"\x01z(\d+):")
+_dictionaries = {}
+_latest = {}
+_dictionaries_lock = threading.Lock()
+
+
+def _dictionary_data(dictionary_id):
+    """Preset dictionary bytes for an id (b'' for 0); dictionaries never change, so they are kept for good."""
+    if not dictionary_id:
+        return b""
+    with _dictionaries_lock:
+        if dictionary_id in _dictionaries:
+            return _dictionaries[dictionary_id]
+    CompressionDictionary = apps.get_model("generation", "CompressionDictionary")
+    data = bytes(CompressionDictionary.objects.values_list("data", flat=True).get(id=dictionary_id))
+    with _dictionaries_lock:
+        _dictionaries[dictionary_id] = data
+    return data
+
+
+def latest_dictionary(name):
+    """(id, bytes) of the newest trained dictionary called name, or (0, b'') when there is none."""
+    if not name:
+        return 0, b""
+    with _dictionaries_lock:
+        cached = _latest.get(name)
+        if cached and time.monotonic() - cached[2] < LATEST_DICTIONARY_TTL:
+            return cached[0], cached[1]
+    try:
+        CompressionDictionary = apps.get_model("generation", "CompressionDictionary")
+        row = CompressionDictionary.objects.filter(name=name).order_by("-id").values_list("id", "data").first()
+    except DatabaseError:
+        # Table not migrated yet
+        row = None
+    dictionary_id, data = (row[0], bytes(row[1])) if row else (0, b"")
+    with _dictionaries_lock:
+        _latest[name] = (dictionary_id, data, time.monotonic())
+        if dictionary_id:
+            _dictionaries[dictionary_id] = data
+    return dictionary_id, data
+
+
+def forget_dictionaries():
+    """Drop cached latest-dictionary lookups (after training a new one)."""
+    with _dictionaries_lock:
+        _latest.clear()
+
+
+def is_compressed(stored):
+    return isinstance(stored, str) and _STORED.match(stored) is not None
+
+
+def _plain(text):
+    return ESCAPE + text if text.startswith("\x01") else text
+
+
+def compress_text(text, dictionary=None):
+    """Stored form of text, compressed with the named dictionary when that makes it smaller."""
+    if text is None:
+        return text
+    if len(text) < MIN_COMPRESS_SIZE:
+        return _plain(text)
+    dictionary_id, zdict = latest_dictionary(dictionary)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=zdict) if zdict else zlib.compressobj(COMPRESSION_LEVEL)
+    data = compressor.compress(text.encode("utf-8")) + compressor.flush()
+    stored = f"{MARKER}{dictionary_id}:{base64.b64encode(data).decode('ascii')}"
+    return stored if len(stored) < len(text) else _plain(text)
+
+
+def decompress_text(stored):
+    """Plain text from a stored value; values without the marker are returned unchanged."""
+    if not isinstance(stored, str) or not stored.startswith("\x01"):
+        return stored
+    if stored.startswith(ESCAPE):
+        return stored[len(ESCAPE):]
+    match = _STORED.match(stored)
+    if match is None:
+        return stored
+    zdict = _dictionary_data(int(match.group(1)))
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    try:
+        data = base64.b64decode(stored[match.end():], validate=True)
+        return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+    except (binascii.Error, zlib.error, UnicodeDecodeError):
+        # A legacy plain row that merely looks like a stored value
+        return stored
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """A zlib preset dictionary from sample texts: the lines and phrases most of them share.
+
+    zlib has no trainer, so this keeps the strings that occur in the most samples,
+    weighted by length, with the most valuable ones last (closest to the data).
+    """
+    counts = Counter()
+    for text in samples:
+        seen = set()
+        for line in text.splitlines():
+            line = line.strip()
+            if 8 <= len(line) <= 200:
+                seen.add(line)
+        words = text.split()
+        for n in (2, 3, 4):
+            for i in range(len(words) - n + 1):
+                phrase = " ".join(words[i:i + n])
+                if 8 <= len(phrase) <= 80:
+                    seen.add(phrase)
+        counts.update(seen)
+    ranked = sorted(((count - 1) * len(s), s) for s, count in counts.items() if count > 1)
+    picked, total = [], 0
+    for _, s in reversed(ranked):
+        encoded = s.encode("utf-8") + b"\n"
+        if total + len(encoded) > size:
+            continue
+        picked.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(picked))
+
+
+class CompressedTextField(models.TextField):
+    """TextField stored compressed; ``dictionary`` names the trained preset dictionary to use."""
+
+    def __init__(self, *args, dictionary=None, **kwargs):
+        self.dictionary = dictionary
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dictionary:
+            kwargs["dictionary"] = self.dictionary
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        return compress_text(super().get_prep_value(value), self.dictionary)
+
+
+class CompressedJSONField(CompressedTextField):
+    """JSON value stored as compressed JSON text."""
+
+    def from_db_value(self, value, expression, connection):
+        value = decompress_text(value)
+        return None if value is None else json.loads(value)
+
+    def to_python(self, value):
+        if isinstance(value, str) and not is_compressed(value):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+
+    def get_prep_value(self, value):
+        if value is None or is_compressed(value):
+            return value
+        return compress_text(json.dumps(value), self.dictionary)
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
+
+    def formfield(self, **kwargs):
+        return super(models.TextField, self).formfield(**{"form_class": forms.JSONField, **kwargs})
+
+
+def compressed_fields():
+    """(model, field) for every compressed field of every installed model."""
+    return [(model, field)
+            for model in apps.get_models()
+            for field in model._meta.get_fields()
+            if isinstance(field, CompressedTextField)]
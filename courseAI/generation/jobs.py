@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CourseGeneration, GenerationLog
+
+# --------------- Generation jobs ---------------
+# With GENERATION_QUEUE on, process_generation only records a pending CourseGeneration
+# and `manage.py run_generation_worker` processes generate it. A worker claims the
+# oldest pending course with SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL, so
+# concurrent workers never wait on or take the same row. SQLite has no row locks, but
+# its IMMEDIATE transactions (generation/db_utils.py) serialize claims instead. The
+# status flip is also conditional on the row still being pending, so a course is
+# claimed at most once on either backend.
+
+DEFAULT_CLAIM_TIMEOUT = 60 * 60
+
+
+def claim_course(courses=None):
+    """Claim the oldest pending course for this worker and mark it generating; None when idle.
+
+    ``courses`` narrows the candidates (a CourseGeneration queryset; all courses by default).
+    """
+    if courses is None:
+        courses = CourseGeneration.objects.all()
+    with transaction.atomic():
+        course = (courses
+                  .select_for_update(skip_locked=True)
+                  .filter(status='pending')
+                  .order_by('created_at')
+                  .first())
+        if course is None:
+            return None
+        now = timezone.now()
+        if not CourseGeneration.objects.filter(id=course.id, status='pending').update(
+                status='generating', claimed_at=now, updated_at=now):
+            return None
+        GenerationLog.objects.create(
+            course_generation=course,
+            step="generation_claimed",
+            status="started",
+            message="Claimed by a generation worker"
+        )
+    course.status = 'generating'
+    course.claimed_at = now
+    course.updated_at = now
+    return course
+
+
+def fail_stale_claims():
+    """Mark courses whose worker stopped (claimed over GENERATION_CLAIM_TIMEOUT seconds ago) as failed."""
+    timeout = getattr(settings, "GENERATION_CLAIM_TIMEOUT", DEFAULT_CLAIM_TIMEOUT)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = list(CourseGeneration.objects
+                 .filter(status='generating', claimed_at__lt=cutoff)
+                 .values_list('id', flat=True))
+    failed = 0
+    for course_id in stale:
+        with transaction.atomic():
+            if CourseGeneration.objects.filter(id=course_id, status='generating', claimed_at__lt=cutoff).update(
+                    status='failed', updated_at=timezone.now()):
+                GenerationLog.objects.create(
+                    course_generation_id=course_id,
+                    step="generation_error",
+                    status="failed",
+                    level="error",
+                    message=f"Generation worker did not finish within {timeout} seconds"
+                )
+                failed += 1
+    return failed
@@ -0,0 +1,918 @@
+import json
+import math
+import random
+import threading
+import time
+
+from .concurrency import is_transient, key_id, limiter
+from .singleflight import call_key, flight
+
+# --------------- Task schemas ---------------
+# Each structured task declares the JSON shape it expects back. "items" names the
+# list whose elements are repaired one by one ("" means the document itself is the
+# list); for plain object documents the top-level fields are repaired individually.
+
+_STR_OR_INT = {"type": ["string", "integer"]}
+
+TASK_SPECS = {
+    "chapter_list": {
+        "items": "",
+        "schema": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["chapter_number", "chapter_name", "chapter_description", "chapter_difficulty"],
+                "properties": {
+                    "chapter_number": _STR_OR_INT,
+                    "chapter_name": {"type": "string"},
+                    "chapter_description": {"type": "string"},
+                    "chapter_difficulty": _STR_OR_INT,
+                },
+            },
+        },
+    },
+    "lesson_plan": {
+        "items": "",
+        "schema": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["lesson_number", "lesson_type", "lesson_name", "lesson_description"],
+                "properties": {
+                    "lesson_number": _STR_OR_INT,
+                    "lesson_type": {"type": "string", "enum": ["vid", "art", "ext", "int", "mcq", "txt"]},
+                    "lesson_type_ID": _STR_OR_INT,
+                    "lesson_name": {"type": "string"},
+                    "lesson_description": {"type": "string"},
+                    "lesson_details": {"type": "string"},
+                    "lesson_goals": {"type": ["string", "array"]},
+                    "lesson_guidlines": {"type": ["string", "array"]},
+                },
+            },
+        },
+    },
+    "quiz": {
+        "items": "questions",
+        "schema": {
+            "type": "object",
+            "required": ["questions"],
+            "properties": {
+                "questions": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {
+                        "type": "object",
+                        "required": ["question", "options", "correct_answer"],
+                        "properties": {
+                            "question": {"type": "string"},
+                            "options": {
+                                "type": "object",
+                                "required": ["A", "B", "C", "D"],
+                                "properties": {
+                                    "A": {"type": "string"},
+                                    "B": {"type": "string"},
+                                    "C": {"type": "string"},
+                                    "D": {"type": "string"},
+                                },
+                            },
+                            "correct_answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+                            "explanation": {"type": "string"},
+                        },
+                    },
+                },
+            },
+        },
+    },
+    "text_questions": {
+        "items": "questions",
+        "schema": {
+            "type": "object",
+            "required": ["questions"],
+            "properties": {
+                "questions": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {
+                        "type": "object",
+                        "required": ["question_number", "question", "optimal_answer"],
+                        "properties": {
+                            "question_number": {"type": "integer"},
+                            "question": {"type": "string"},
+                            "optimal_answer": {"type": "string"},
+                        },
+                    },
+                },
+            },
+        },
+    },
+    "text_grades": {
+        "items": "grades",
+        "schema": {
+            "type": "object",
+            "required": ["grades", "overall_score"],
+            "properties": {
+                "grades": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "required": ["question_number", "score", "feedback"],
+                        "properties": {
+                            "question_number": {"type": "integer"},
+                            "score": {"type": "number"},
+                            "feedback": {"type": "string"},
+                            "strengths": {"type": "array", "items": {"type": "string"}},
+                            "improvements": {"type": "array", "items": {"type": "string"}},
+                        },
+                    },
+                },
+                "overall_score": {"type": "number"},
+                "overall_feedback": {"type": "string"},
+            },
+        },
+    },
+    "programming_exercise": {
+        "items": None,
+        "schema": {
+            "type": "object",
+            "required": ["starter_files", "grading_method"],
+            "properties": {
+                "starter_files": {"type": "object", "additionalProperties": {"type": "string"}},
+                "grading_method": {"type": "string", "enum": ["ai_review", "terminal_matching"]},
+                "expected_output": {"type": "string"},
+            },
+        },
+    },
+    "final_project_content": {
+        "items": None,
+        "schema": {
+            "type": "object",
+            "required": ["details", "goals", "guidelines"],
+            "properties": {
+                "details": {"type": "string"},
+                "goals": {"type": "string"},
+                "guidelines": {"type": "string"},
+            },
+        },
+    },
+    "lesson_digest": {
+        "items": None,
+        "schema": {
+            "type": "object",
+            "required": ["main_ideas", "keywords", "search_query", "video_query"],
+            "properties": {
+                "main_ideas": {"type": "string"},
+                "keywords": {"type": "array", "items": {"type": "string"}},
+                "search_query": {"type": "string"},
+                "video_query": {"type": "string"},
+            },
+        },
+    },
+    "youtube_query": {
+        "items": None,
+        "schema": {
+            "type": "object",
+            "required": ["query"],
+            "properties": {
+                "query": {"type": "string"},
+                "relevanceLanguage": {"type": "string"},
+                "regionCode": {"type": "string"},
+                "videoCategoryId": {"type": "string"},
+            },
+        },
+    },
+    "code_correction": {
+        "items": None,
+        "schema": {
+            "type": "object",
+            "required": ["pass_fail", "corrected_code", "explanation"],
+            "properties": {
+                "pass_fail": {"type": "string", "enum": ["PASS", "FAIL"]},
+                "corrected_code": {"type": "object", "additionalProperties": {"type": "string"}},
+                "explanation": {"type": "string"},
+                "issues_found": {"type": "array", "items": {"type": "string"}},
+                "suggestions": {"type": "array", "items": {"type": "string"}},
+                "file_analysis": {"type": "object"},
+            },
+        },
+    },
+    "code_feedback": {
+        "items": "feedback_items",
+        "schema": {
+            "type": "object",
+            "required": ["feedback_items"],
+            "properties": {
+                "feedback_items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "required": ["type", "title", "message"],
+                        "properties": {
+                            "type": {"type": "string"},
+                            "priority": {"type": "integer"},
+                            "title": {"type": "string"},
+                            "message": {"type": "string"},
+                            "line_reference": {"type": "string"},
+                        },
+                    },
+                },
+                "overall_assessment": {"type": "string"},
+            },
+        },
+    },
+    "project_feedback": {
+        "items": "bullets",
+        "schema": {
+            "type": "object",
+            "required": ["bullets"],
+            "properties": {
+                "bullets": {"type": "array", "items": {"type": "string"}},
+            },
+        },
+    },
+}
+
+# Upper bound on per-element repair calls for a single document.
+MAX_REPAIRS = 4
+
+# Models that rejected response_format; we stop asking them for JSON mode.
+_JSON_MODE_UNSUPPORTED = set()
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a structured response cannot be recovered."""
+
+    def __init__(self, message, content=""):
+        super().__init__(message)
+        self.content = content
+
+
+# --------------- Validation ---------------
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+}
+
+
+def validate(value, schema, path="$"):
+    """Return a list of problems with value against a (small subset of) JSON schema."""
+    problems = []
+    expected = schema.get("type")
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        if not any(_TYPE_CHECKS[t](value) for t in types):
+            return [f"{path} should be {' or '.join(types)}"]
+    if "enum" in schema and value not in schema["enum"]:
+        problems.append(f"{path} should be one of {schema['enum']}")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                problems.append(f"{path}.{key} is missing")
+        for key, sub in schema.get("properties", {}).items():
+            if key in value:
+                problems.extend(validate(value[key], sub, f"{path}.{key}"))
+        extra = schema.get("additionalProperties")
+        if isinstance(extra, dict):
+            for key, item in value.items():
+                if key not in schema.get("properties", {}):
+                    problems.extend(validate(item, extra, f"{path}.{key}"))
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            problems.append(f"{path} needs at least {schema['minItems']} items")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                problems.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return problems
+
+
+# --------------- Parsing ---------------
+def _strip_fences(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def _load_document(text, root_type):
+    """Parse the document, falling back to the outermost bracket pair."""
+    text = _strip_fences(text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    open_char, close_char = ("[", "]") if root_type == "array" else ("{", "}")
+    start = text.find(open_char)
+    end = text.rfind(close_char)
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def _split_elements(text, start):
+    """Split a JSON array body beginning at text[start] == '[' into raw element strings."""
+    elements = []
+    depth = 0
+    in_string = False
+    escaped = False
+    element_start = start + 1
+    for i in range(start + 1, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "[{":
+            depth += 1
+        elif ch in "]}":
+            if depth == 0:
+                elements.append(text[element_start:i])
+                return elements
+            depth -= 1
+        elif ch == "," and depth == 0:
+            elements.append(text[element_start:i])
+            element_start = i + 1
+    # Truncated output: keep whatever was started
+    elements.append(text[element_start:])
+    return elements
+
+
+def _salvage_items(text, items_key):
+    """Recover list elements from a document that does not parse as a whole.
+
+    Returns (good_items, malformed_snippets) or None when no list can be located.
+    """
+    text = _strip_fences(text)
+    if items_key:
+        marker = text.find(f'"{items_key}"')
+        if marker == -1:
+            return None
+        start = text.find("[", marker)
+    else:
+        start = text.find("[")
+    if start == -1:
+        return None
+    good, malformed = [], []
+    for raw in _split_elements(text, start):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            good.append((len(good) + len(malformed), json.loads(raw)))
+        except json.JSONDecodeError:
+            malformed.append((len(good) + len(malformed), raw))
+    return good, malformed
+
+
+# --------------- Completion calls ---------------
+def json_mode_kwargs(task, model):
+    """Request JSON-mode output when the task returns an object and the model accepts it."""
+    if TASK_SPECS[task]["schema"].get("type") != "object" or model in _JSON_MODE_UNSUPPORTED:
+        return {}
+    return {"response_format": {"type": "json_object"}}
+
+
+def _send(client, **kwargs):
+    """One chat completion, held against the adaptive limit for this client's API key."""
+    with limiter("cerebras", key_id(getattr(client, "api_key", None))).slot() as call:
+        completion = client.chat.completions.create(**kwargs)
+        # Judge latency per generated token so long articles do not read as spikes
+        call["units"] = _completion_tokens(completion) or 1
+        return completion
+
+
+def _create(client, messages, model, json_kwargs, **create_kwargs):
+    """Call chat completions, dropping JSON mode if the model rejects it."""
+    try:
+        return _send(client, messages=messages, model=model, **json_kwargs, **create_kwargs)
+    except Exception as e:
+        if not json_kwargs or getattr(e, "status_code", None) != 400:
+            raise
+        print(f"⚠️ JSON mode rejected for {model}, retrying without it: {e}")
+        _JSON_MODE_UNSUPPORTED.add(model)
+        return _send(client, messages=messages, model=model, **create_kwargs)
+
+
+def _repair_element(client, model, task, element_schema, raw, problems, context):
+    """Ask the model to fix a single element and return the parsed value (or None)."""
+    messages = [
+        {
+            "role": "system",
+            "content": (
+                "You repair one malformed element of a larger JSON document. "
+                "Return ONLY the corrected JSON value for this element, matching the schema exactly. "
+                "Keep the original content where it is valid. No explanations or extra text."
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Task: {task}\n"
+                f"Original request (for context):\n{context[:2000]}\n\n"
+                f"Element schema:\n{json.dumps(element_schema)}\n\n"
+                f"Problems: {'; '.join(problems) if problems else 'invalid JSON'}\n\n"
+                f"Malformed element:\n{raw}"
+            ),
+        },
+    ]
+    json_kwargs = {"response_format": {"type": "json_object"}} if (
+        element_schema.get("type") == "object" and model not in _JSON_MODE_UNSUPPORTED) else {}
+    try:
+        completion = _create(client, messages, model, json_kwargs)
+        fixed = _load_document(completion.choices[0].message.content, element_schema.get("type"))
+    except Exception as e:
+        print(f"❌ Repair call failed for {task}: {e}")
+        return None
+    if fixed is None or validate(fixed, element_schema):
+        return None
+    return fixed
+
+
+def _repair_items(client, model, task, items, malformed, item_schema, context, state):
+    """Validate list items, re-asking only for the broken ones; unrecoverable items are dropped."""
+    slots = dict(items)
+    pending = [(i, json.dumps(v), validate(v, item_schema)) for i, v in items]
+    pending = [(i, raw, p) for i, raw, p in pending if p]
+    pending += [(i, raw, []) for i, raw in malformed]
+    for index, raw, problems in sorted(pending):
+        slots.pop(index, None)
+        if state["repairs"] >= MAX_REPAIRS:
+            print(f"⚠️ Dropping element {index} of {task}: repair budget exhausted")
+            state["dropped"] += 1
+            continue
+        state["repairs"] += 1
+        print(f"🔧 Repairing element {index} of {task}: {problems or 'invalid JSON'}")
+        fixed = _repair_element(client, model, task, item_schema, raw, problems, context)
+        if fixed is None:
+            print(f"⚠️ Dropping element {index} of {task}: repair failed")
+            state["dropped"] += 1
+        else:
+            slots[index] = fixed
+    return [slots[i] for i in sorted(slots)]
+
+
+def _repair_fields(client, model, task, document, schema, context, state):
+    """Re-ask only for top-level fields of an object document that fail validation."""
+    properties = schema.get("properties", {})
+    broken = [k for k in schema.get("required", []) if k not in document]
+    broken += [k for k, sub in properties.items() if k in document and validate(document[k], sub)]
+    for key in broken:
+        if state["repairs"] >= MAX_REPAIRS:
+            break
+        state["repairs"] += 1
+        field_schema = {
+            "type": "object",
+            "required": [key],
+            "properties": {key: properties.get(key, {})},
+        }
+        raw = json.dumps({key: document.get(key)})
+        problems = validate({key: document[key]} if key in document else {}, field_schema)
+        print(f"🔧 Repairing field '{key}' of {task}: {problems}")
+        fixed = _repair_element(client, model, task, field_schema, raw, problems, context)
+        if fixed is not None:
+            document[key] = fixed[key]
+        else:
+            state["dropped"] += 1
+            if key in document and validate(document[key], properties.get(key, {})):
+                document.pop(key)
+    return document
+
+
+def parse_structured(client, model, task, content, context=""):
+    """Parse a model response for task, repairing malformed elements individually."""
+    document, state = _parse_structured(client, model, task, content, context)
+    return document
+
+
+def _parse_structured(client, model, task, content, context):
+    state = {"repairs": 0, "dropped": 0, "unparsed": False}
+    spec = TASK_SPECS[task]
+    schema = spec["schema"]
+    items_key = spec["items"]
+    document = _load_document(content or "", schema.get("type"))
+
+    if document is None:
+        state["unparsed"] = True
+        print(f"JSON decode error in {task}; salvaging individual elements")
+        print(f"Response content length: {len(content or '')}")
+        if items_key is None:
+            raise StructuredOutputError(f"Unable to parse {task} JSON", content)
+        salvaged = _salvage_items(content or "", items_key)
+        if salvaged is None:
+            raise StructuredOutputError(f"No JSON found in {task} response", content)
+        items, malformed = salvaged
+        document = [] if items_key == "" else {items_key: []}
+    else:
+        items, malformed = None, []
+
+    if items_key is None:
+        if not isinstance(document, dict):
+            raise StructuredOutputError(f"Expected a JSON object for {task}", content)
+        return _repair_fields(client, model, task, document, schema, context, state), state
+
+    if items_key == "":
+        if isinstance(document, dict):
+            # Some models wrap the list in an object; unwrap the first list value
+            document = next((v for v in document.values() if isinstance(v, list)), [])
+        list_schema = schema
+    else:
+        if not isinstance(document, dict):
+            document = {items_key: document if isinstance(document, list) else []}
+        list_schema = schema["properties"][items_key]
+    if items is None:
+        current = document if items_key == "" else document.get(items_key)
+        items = list(enumerate(current)) if isinstance(current, list) else []
+
+    repaired = _repair_items(client, model, task, items, malformed, list_schema.get("items", {}), context, state)
+    if len(repaired) < list_schema.get("minItems", 0):
+        raise StructuredOutputError(f"No usable elements in {task} response", content)
+    if items_key == "":
+        return repaired, state
+    document[items_key] = repaired
+    return _repair_fields(client, model, task, document, {
+        **schema,
+        "required": [k for k in schema.get("required", []) if k != items_key],
+        "properties": {k: v for k, v in schema.get("properties", {}).items() if k != items_key},
+    }, context, state), state
+
+
+# --------------- Model routing ---------------
+# Tasks map to a tier; each tier lists candidate models in preference order.
+# Both tables can be overridden from settings (LLM_TIER_MODELS, LLM_TASK_TIERS)
+# and a task can be pinned to one model with LLM_TASK_MODELS.
+
+TIER_MODELS = {
+    "fast": ["llama3.1-8b", "qwen-3-235b-a22b-instruct-2507"],
+    "standard": ["qwen-3-235b-a22b-instruct-2507", "qwen-3-coder-480b"],
+    "large": ["qwen-3-coder-480b", "qwen-3-235b-a22b-instruct-2507"],
+}
+
+TASK_TIERS = {
+    # Short, low-stakes outputs
+    "course_name": "fast",
+    "youtube_query": "fast",
+    "lesson_digest": "fast",
+    "search_question": "fast",
+    "project_feedback": "fast",
+    # Structured lesson assets
+    "chapter_list": "standard",
+    "lesson_plan": "standard",
+    "quiz": "standard",
+    "text_questions": "standard",
+    "text_grades": "standard",
+    "final_project_content": "standard",
+    "code_feedback": "standard",
+    "chat": "standard",
+    "article_intro": "standard",
+    # Long-form and code-heavy generations
+    "article": "large",
+    "programming_exercise": "large",
+    "code_correction": "large",
+}
+
+# Routing only trusts a model's metrics after this many calls for a task.
+MIN_SAMPLES = 5
+# Candidates whose recent quality drops below this are skipped.
+QUALITY_FLOOR = 0.8
+# Smoothing factor for the latency / quality moving averages.
+EWMA_ALPHA = 0.2
+# Fraction of calls sent to a random candidate so every model keeps getting measured.
+EXPLORE_RATE = 0.05
+
+_stats_lock = threading.Lock()
+_model_stats = {}
+# Routing's own random source, so exploration can be seeded
+_rng = random.Random()
+
+
+def _setting(name, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def candidate_models(task):
+    """Return the candidate models for a task, honoring settings overrides."""
+    pinned = _setting("LLM_TASK_MODELS", {}).get(task)
+    if pinned:
+        return [pinned]
+    tier = _setting("LLM_TASK_TIERS", {}).get(task) or TASK_TIERS.get(task, "standard")
+    tiers = {**TIER_MODELS, **_setting("LLM_TIER_MODELS", {})}
+    return list(tiers.get(tier) or tiers["standard"])
+
+
+def record_call(task, model, latency, completion_tokens=None, ok=True, quality=None):
+    """Fold one call's latency and quality into the routing metrics."""
+    with _stats_lock:
+        stats = _model_stats.setdefault((task, model), {
+            "calls": 0, "errors": 0, "latency": None, "ms_per_token": None, "quality": None,
+        })
+        stats["calls"] += 1
+        if not ok:
+            stats["errors"] += 1
+            quality = 0.0
+        else:
+            stats["latency"] = latency if stats["latency"] is None else (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * stats["latency"])
+            if completion_tokens:
+                per_token = latency * 1000 / completion_tokens
+                stats["ms_per_token"] = per_token if stats["ms_per_token"] is None else (
+                    EWMA_ALPHA * per_token + (1 - EWMA_ALPHA) * stats["ms_per_token"])
+        if quality is not None:
+            stats["quality"] = quality if stats["quality"] is None else (
+                EWMA_ALPHA * quality + (1 - EWMA_ALPHA) * stats["quality"])
+
+
+def select_model(task):
+    """Pick the fastest candidate for a task whose measured quality is acceptable.
+
+    Until every candidate has MIN_SAMPLES calls, the tier's preference order wins.
+    """
+    candidates = candidate_models(task)
+    if len(candidates) == 1:
+        return candidates[0]
+    if _rng.random() < EXPLORE_RATE:
+        return _rng.choice(candidates)
+    with _stats_lock:
+        measured = {m: dict(_model_stats.get((task, m), {})) for m in candidates}
+    usable = [
+        m for m in candidates
+        if measured[m].get("calls", 0) < MIN_SAMPLES or (measured[m]["quality"] or 0.0) >= QUALITY_FLOOR
+    ]
+    if not usable:
+        return candidates[0]
+    if any(measured[m].get("calls", 0) < MIN_SAMPLES for m in usable):
+        return usable[0]
+
+    # Compare per-token latency when every candidate reports usage, otherwise wall time
+    metric = "ms_per_token" if all(measured[m]["ms_per_token"] is not None for m in usable) else "latency"
+    return min(usable, key=lambda m: measured[m][metric] if measured[m][metric] is not None else float("inf"))
+
+
+def model_stats():
+    """Snapshot of the routing metrics keyed by "task:model"."""
+    with _stats_lock:
+        return {f"{task}:{model}": dict(stats) for (task, model), stats in _model_stats.items()}
+
+
+def _completion_tokens(completion):
+    usage = getattr(completion, "usage", None)
+    return getattr(usage, "completion_tokens", None)
+
+
+# --------------- Token budgets ---------------
+# max_completion_tokens per task is learned from real completion lengths: the p99
+# of recent samples plus headroom. Until a task has enough history the defaults
+# below apply. Budgets are stored in TaskTokenBudget and recomputed periodically by a
+# background thread (or `manage.py refresh_token_budgets`), never inside an LLM call.
+# Samples are buffered in memory and written in batches through the writer queue; a
+# batch still buffered when the process exits is lost, which only thins the history.
+
+DEFAULT_TOKEN_BUDGETS = {
+    "course_name": 32,
+    "search_question": 96,
+    "youtube_query": 256,
+    "lesson_digest": 384,
+    "article_intro": 512,
+    "project_feedback": 768,
+    "chat": 1000,
+    "chapter_list": 2048,
+    "final_project_content": 2048,
+    "text_questions": 2048,
+    "text_grades": 3072,
+    "code_feedback": 3072,
+    "quiz": 4096,
+    "lesson_plan": 6144,
+    "programming_exercise": 8192,
+    "code_correction": 12288,
+    "article": 16384,
+}
+MIN_TOKEN_BUDGET = 32
+MAX_TOKEN_BUDGET = 20000
+BUDGET_HEADROOM = 1.25
+BUDGET_MIN_SAMPLES = 20
+BUDGET_WINDOW = 1000  # most recent samples per task considered (and kept)
+BUDGET_REFRESH_SECONDS = 6 * 60 * 60
+# Buffered samples are written once this many are pending or the oldest is this old
+SAMPLE_FLUSH_SIZE = 50
+SAMPLE_FLUSH_SECONDS = 60
+
+# Tasks whose output is still useful when cut short; these stop early instead of retrying.
+EARLY_STOP = {
+    "course_name": ["\n"],
+    "search_question": ["\n\n"],
+}
+TRUNCATION_SAFE = {"course_name", "search_question", "chat"}
+
+_budget_lock = threading.Lock()
+_budgets = {"values": {}, "loaded_at": 0.0}
+_samples_lock = threading.Lock()
+_samples = {"pending": [], "flushed_at": time.monotonic()}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _store_budget(task, cutoff, defaults):
+    from .models import LLMCallSample, TaskTokenBudget
+    if cutoff is not None:
+        # Drop samples that fell out of the window
+        LLMCallSample.objects.filter(task=task, created_at__lte=cutoff).delete()
+    if defaults:
+        TaskTokenBudget.objects.update_or_create(task=task, defaults=defaults)
+
+
+def refresh_token_budgets():
+    """Recompute every task's budget from its recent samples and store it."""
+    from .db_utils import write
+    from .models import LLMCallSample
+
+    flush_samples()
+    refreshed = {}
+    for task in LLMCallSample.objects.values_list("task", flat=True).distinct():
+        recent = LLMCallSample.objects.filter(task=task).order_by("-created_at")
+        tokens = list(recent.values_list("completion_tokens", flat=True)[:BUDGET_WINDOW])
+        cutoff = recent.values_list("created_at", flat=True)[BUDGET_WINDOW:BUDGET_WINDOW + 1]
+        defaults = None
+        if len(tokens) >= BUDGET_MIN_SAMPLES:
+            p99 = _percentile(tokens, 99)
+            max_tokens = min(MAX_TOKEN_BUDGET, max(MIN_TOKEN_BUDGET, math.ceil(p99 * BUDGET_HEADROOM)))
+            defaults = {"max_tokens": max_tokens, "p99_tokens": p99, "sample_count": len(tokens)}
+            refreshed[task] = max_tokens
+        if cutoff or defaults:
+            write(_store_budget, task, cutoff[0] if cutoff else None, defaults)
+    with _budget_lock:
+        _budgets["values"] = _load_budgets()
+        _budgets["loaded_at"] = time.monotonic()
+    return refreshed
+
+
+def _load_budgets():
+    from .models import TaskTokenBudget
+    return dict(TaskTokenBudget.objects.values_list("task", "max_tokens"))
+
+
+def _refresh_in_background():
+    from django.db import connection
+    try:
+        refresh_token_budgets()
+    except Exception as e:
+        print(f"⚠️ Could not refresh token budgets: {e}")
+    finally:
+        connection.close()
+
+
+def token_budget(task):
+    """Return max_completion_tokens for a task; stale stored budgets are refreshed in the background."""
+    with _budget_lock:
+        stale = time.monotonic() - _budgets["loaded_at"] > BUDGET_REFRESH_SECONDS or not _budgets["loaded_at"]
+        if stale:
+            # Only one refresher runs; every caller keeps using the current values meanwhile
+            _budgets["loaded_at"] = time.monotonic()
+    if stale:
+        threading.Thread(target=_refresh_in_background, name="token-budget-refresh", daemon=True).start()
+    return _budgets["values"].get(task) or DEFAULT_TOKEN_BUDGETS.get(task, MAX_TOKEN_BUDGET)
+
+
+def flush_samples():
+    """Write buffered LLMCallSample rows in one batch; returns how many were written."""
+    with _samples_lock:
+        pending, _samples["pending"] = _samples["pending"], []
+        _samples["flushed_at"] = time.monotonic()
+    if not pending:
+        return 0
+    try:
+        from .db_utils import write
+        from .models import LLMCallSample
+        write(LLMCallSample.objects.bulk_create, [LLMCallSample(**sample) for sample in pending])
+    except Exception as e:
+        print(f"⚠️ Could not record {len(pending)} LLM samples: {e}")
+        return 0
+    return len(pending)
+
+
+def _record_sample(task, model, completion_tokens, latency, truncated):
+    if not completion_tokens:
+        return
+    with _samples_lock:
+        _samples["pending"].append({
+            "task": task,
+            "model": model,
+            "completion_tokens": completion_tokens,
+            "latency_ms": int(latency * 1000),
+            "truncated": truncated,
+        })
+        due = (len(_samples["pending"]) >= SAMPLE_FLUSH_SIZE
+               or time.monotonic() - _samples["flushed_at"] >= SAMPLE_FLUSH_SECONDS)
+    if due:
+        flush_samples()
+
+
+# The Cerebras clients do not retry on their own (see providers.py), so every 429 and
+# 5xx reaches the AIMD limiter. When all clients fail that way, _route waits and tries
+# them again, up to ROUTE_ATTEMPTS rounds with jittered exponential backoff.
+ROUTE_ATTEMPTS = 3
+ROUTE_BACKOFF = 1.0
+
+
+def _route(task, messages, clients, json_kwargs_for, **create_kwargs):
+    """Send a task to the routed model, trying each client in order."""
+    if not isinstance(clients, (list, tuple)):
+        clients = [clients]
+    model = create_kwargs.pop("model", None) or select_model(task)
+    create_kwargs.setdefault("max_completion_tokens", token_budget(task))
+    if task in EARLY_STOP:
+        create_kwargs.setdefault("stop", EARLY_STOP[task])
+    errors = []
+    for attempt in range(ROUTE_ATTEMPTS):
+        if attempt:
+            delay = ROUTE_BACKOFF * 2 ** (attempt - 1) * (0.5 + _rng.random())
+            print(f"⏳ All clients throttled or unavailable for {task}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+        transient = True
+        for i, llm in enumerate(clients):
+            label = "Primary" if i == 0 else "Secondary"
+            started = time.monotonic()
+            try:
+                completion = _create(llm, messages, model, json_kwargs_for(model), **create_kwargs)
+                truncated = getattr(completion.choices[0], "finish_reason", None) == "length"
+                _record_sample(task, model, _completion_tokens(completion), time.monotonic() - started, truncated)
+                limit = create_kwargs["max_completion_tokens"]
+                if truncated and task not in TRUNCATION_SAFE and limit < MAX_TOKEN_BUDGET:
+                    # A cut-off document is worse than a slow one: retry once with a larger cap
+                    print(f"⚠️ {task} hit its {limit}-token budget, retrying with a larger cap")
+                    create_kwargs["max_completion_tokens"] = min(MAX_TOKEN_BUDGET, limit * 2)
+                    retry_started = time.monotonic()
+                    completion = _create(llm, messages, model, json_kwargs_for(model), **create_kwargs)
+                    _record_sample(task, model, _completion_tokens(completion), time.monotonic() - retry_started,
+                                   getattr(completion.choices[0], "finish_reason", None) == "length")
+            except Exception as e:
+                record_call(task, model, time.monotonic() - started, ok=False)
+                print(f"❌ {label} client failed for {task} ({model}): {str(e)}")
+                errors.append(f"{label}: {str(e)}")
+                transient = transient and is_transient(e)
+                continue
+            latency = time.monotonic() - started
+            return llm, model, completion, latency
+        if not transient:
+            break
+    raise Exception(f"All Cerebras clients failed for {task}. " + ", ".join(errors))
+
+
+def complete_structured(task, messages, clients, **create_kwargs):
+    """Run a structured task on its routed model and return the parsed, repaired document.
+
+    Identical concurrent requests share one upstream call.
+    """
+    key = call_key("structured", task, messages, create_kwargs)
+    return flight("llm").do(key, _complete_structured, task, messages, clients, **create_kwargs)
+
+
+def _complete_structured(task, messages, clients, **create_kwargs):
+    llm, model, completion, latency = _route(
+        task, messages, clients, lambda m: json_mode_kwargs(task, m), **create_kwargs)
+    context = "\n".join(m["content"] for m in messages if m.get("role") == "user")
+    try:
+        document, state = _parse_structured(llm, model, task, completion.choices[0].message.content, context)
+    except StructuredOutputError:
+        record_call(task, model, latency, _completion_tokens(completion), quality=0.0)
+        raise
+    quality = 1.0 if not (state["repairs"] or state["unparsed"]) else (0.5 if not state["dropped"] else 0.25)
+    record_call(task, model, latency, _completion_tokens(completion), quality=quality)
+    return document
+
+
+def complete_text(task, messages, clients, **create_kwargs):
+    """Run a free-text task on its routed model and return the message content.
+
+    Identical concurrent requests share one upstream call.
+    """
+    key = call_key("text", task, messages, create_kwargs)
+    return flight("llm").do(key, _complete_text, task, messages, clients, **create_kwargs)
+
+
+def _complete_text(task, messages, clients, **create_kwargs):
+    _llm, model, completion, latency = _route(task, messages, clients, lambda m: {}, **create_kwargs)
+    content = completion.choices[0].message.content or ""
+    record_call(task, model, latency, _completion_tokens(completion), quality=1.0 if content.strip() else 0.0)
+    return content
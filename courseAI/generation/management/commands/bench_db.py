@@ -0,0 +1,45 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from generation import db_bench
+
+
+class Command(BaseCommand):
+    help = ("Run the database load benchmark (seed, read, progress, job claiming) against the configured "
+            "backend. Run it once per DB_ENGINE profile to compare them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=20)
+        parser.add_argument("--chapters", type=int, default=4)
+        parser.add_argument("--lessons", type=int, default=6)
+        parser.add_argument("--learners", type=int, default=10)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+
+    def handle(self, *args, **options):
+        results = db_bench.run(
+            courses=options["courses"],
+            chapters=options["chapters"],
+            lessons=options["lessons"],
+            learners=options["learners"],
+            threads=options["threads"],
+        )
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"backend={results['vendor']} threads={results['threads']}")
+        for phase in ["seed", "read", "progress", "claim"]:
+            stats = results[phase]
+            self.stdout.write(
+                f"{phase:<9} ops={stats['ops']:<5} {stats['ops_per_second']:8.1f}/s "
+                f"p50={stats['p50_ms']:7.1f}ms p95={stats['p95_ms']:7.1f}ms errors={stats['errors']}"
+            )
+            if stats["first_error"]:
+                self.stderr.write(f"          first error: {stats['first_error']}")
+        self.stdout.write(f"lost progress updates: {results['progress']['lost_updates']}")
+        self.stdout.write(f"claimed {results['claim']['claimed']} courses, "
+                          f"{results['claim']['duplicates']} claimed twice")
+        locks = results["database"]["lock_waits"]
+        self.stdout.write(f"lock waits: {locks['lock_waits']} ({locks['lock_wait_seconds']:.2f}s, "
+                          f"max {locks['max_wait_seconds'] * 1000:.0f}ms), locked errors: {locks['locked_errors']}")
@@ -0,0 +1,58 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SDK_MODULES = ["cerebras.cloud.sdk", "pinecone", "tavily", "numpy"]
+
+# Boots Django like a worker would, imports every module with provider clients and
+# reports which SDKs ended up loaded.
+WORKER_BOOT = (
+    "import os, sys, django; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'courseAI.settings'); "
+    "django.setup(); "
+    "import generation.views, generation.youtube_utils, generation.search_utils, home.views; "
+    f"print(','.join(m for m in {SDK_MODULES!r} if m in sys.modules))"
+)
+
+
+class Command(BaseCommand):
+    help = "Time `manage.py check` and a worker-style boot in fresh processes, and list SDKs imported at startup."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+
+    def _time(self, argv, runs, env):
+        timings, output = [], ""
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = subprocess.run(argv, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            timings.append(time.perf_counter() - started)
+            if result.returncode != 0:
+                self.stderr.write(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+            output = result.stdout.strip()
+        return timings, output
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        env = dict(os.environ)
+        # Startup must not depend on provider credentials any more
+        for name in ["CEREBRAS_API_KEY", "SECOND_CEREBRAS_API_KEY", "PINECONE_API_KEY", "PINECONE_HOST", "TAVILY_API_KEY"]:
+            env.pop(name, None)
+
+        manage = os.path.join(settings.BASE_DIR, "manage.py")
+        for label, argv in [
+            ("manage.py check", [sys.executable, manage, "check"]),
+            ("worker boot", [sys.executable, "-c", WORKER_BOOT]),
+        ]:
+            timings, output = self._time(argv, runs, env)
+            self.stdout.write(
+                f"{label:<16} median={statistics.median(timings) * 1000:7.1f}ms "
+                f"min={min(timings) * 1000:7.1f}ms runs={runs}"
+            )
+            if label == "worker boot":
+                self.stdout.write(f"SDK modules loaded at boot: {output or 'none'}")
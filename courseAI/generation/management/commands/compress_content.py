@@ -0,0 +1,109 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from generation.fields import compressed_fields, forget_dictionaries, is_compressed, latest_dictionary, train_dictionary
+from generation.models import CompressionDictionary
+
+
+class Command(BaseCommand):
+    help = ("Rewrite rows of compressed fields (generation/fields.py) that are stored plain or with an older "
+            "dictionary, and report the space saved and the encode/decode cost.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--train", action="store_true", help="Train new dictionaries from current rows first")
+        parser.add_argument("--samples", type=int, default=500, help="Rows per dictionary to train on")
+        parser.add_argument("--batch", type=int, default=200)
+        parser.add_argument("--dry-run", action="store_true", help="Measure without writing")
+
+    def _rows(self, model, field, batch):
+        """(pk, stored value) in pk order, read raw so nothing is decoded."""
+        table = connection.ops.quote_name(model._meta.db_table)
+        pk = connection.ops.quote_name(model._meta.pk.column)
+        column = connection.ops.quote_name(field.column)
+        last = None
+        while True:
+            with connection.cursor() as cursor:
+                if last is None:
+                    cursor.execute(f"SELECT {pk}, {column} FROM {table} ORDER BY {pk} LIMIT %s", [batch])
+                else:
+                    cursor.execute(f"SELECT {pk}, {column} FROM {table} WHERE {pk} > %s ORDER BY {pk} LIMIT %s",
+                                   [last, batch])
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def _train(self, fields, samples):
+        by_name = {}
+        for model, field in fields:
+            by_name.setdefault(field.dictionary, []).append((model, field))
+        for name, members in by_name.items():
+            if not name:
+                continue
+            texts = []
+            for model, field in members:
+                for value in model.objects.order_by("-pk").values_list(field.name, flat=True)[:samples]:
+                    if value is not None:
+                        texts.append(value if isinstance(value, str) else json.dumps(value))
+            if not texts:
+                self.stdout.write(f"{name:<14} no rows to train on")
+                continue
+            data = train_dictionary(texts)
+            if not data:
+                self.stdout.write(f"{name:<14} nothing shared between {len(texts)} rows, no dictionary saved")
+                continue
+            dictionary = CompressionDictionary.objects.create(name=name, data=data, sample_count=len(texts))
+            self.stdout.write(f"{name:<14} dictionary {dictionary.id}: {len(data)} bytes from {len(texts)} rows")
+        forget_dictionaries()
+
+    def handle(self, *args, **options):
+        fields = compressed_fields()
+        if options["train"]:
+            self._train(fields, options["samples"])
+        totals = {"before": 0, "after": 0}
+        for model, field in fields:
+            label = f"{model._meta.label}.{field.name}"
+            rows = rewritten = before = after = 0
+            encode_seconds = decode_seconds = 0.0
+            # Load the dictionary before timing so its query is not counted against the first row
+            latest_dictionary(field.dictionary)
+            for batch in self._rows(model, field, options["batch"]):
+                updates = []
+                for pk, stored in batch:
+                    if stored is None:
+                        continue
+                    rows += 1
+                    value = field.from_db_value(stored, None, connection)
+                    started = time.perf_counter()
+                    encoded = field.get_prep_value(value)
+                    encode_seconds += time.perf_counter() - started
+                    started = time.perf_counter()
+                    field.from_db_value(encoded, None, connection)
+                    decode_seconds += time.perf_counter() - started
+                    size = len(stored.encode("utf-8"))
+                    before += size
+                    # Values that do not get smaller stay as they are; they read the same either way
+                    if is_compressed(encoded) and len(encoded) < size:
+                        updates.append((pk, encoded))
+                        after += len(encoded)
+                    else:
+                        after += size
+                if updates and not options["dry_run"]:
+                    with transaction.atomic():
+                        for pk, encoded in updates:
+                            model.objects.filter(pk=pk).update(**{field.name: encoded})
+                rewritten += len(updates)
+            totals["before"] += before
+            totals["after"] += after
+            saved = 100 * (before - after) / before if before else 0.0
+            self.stdout.write(
+                f"{label:<40} rows={rows:<7} rewritten={rewritten:<7} {before / 1024:9.1f}KB -> {after / 1024:9.1f}KB "
+                f"({saved:5.1f}% saved) encode={encode_seconds / rows * 1e6 if rows else 0:7.1f}us/row "
+                f"decode={decode_seconds / rows * 1e6 if rows else 0:7.1f}us/row"
+            )
+        saved = totals["before"] - totals["after"]
+        self.stdout.write(f"Total: {saved / 1024:.1f}KB saved{' (dry run, nothing written)' if options['dry_run'] else ''}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from generation.llm_utils import DEFAULT_TOKEN_BUDGETS, refresh_token_budgets
+from generation.models import TaskTokenBudget
+
+
+class Command(BaseCommand):
+    help = "Recompute per-task max_completion_tokens from observed completion lengths (p99 + headroom)."
+
+    def handle(self, *args, **options):
+        refreshed = refresh_token_budgets()
+        if not refreshed:
+            self.stdout.write("Not enough samples yet; default budgets still apply.")
+        for budget in TaskTokenBudget.objects.all():
+            default = DEFAULT_TOKEN_BUDGETS.get(budget.task, "-")
+            self.stdout.write(
+                f"{budget.task:<24} max={budget.max_tokens:<6} p99={budget.p99_tokens:<6} "
+                f"samples={budget.sample_count:<5} default={default}"
+            )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from generation.jobs import claim_course, fail_stale_claims
+from generation.views import ensure_lesson_types_exist, generate_course
+
+
+class Command(BaseCommand):
+    help = "Claim queued course generations (GENERATION_QUEUE) one at a time and generate them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=float, default=2.0, help="Seconds to sleep when no course is pending")
+        parser.add_argument("--once", action="store_true", help="Exit once no course is pending")
+
+    def handle(self, *args, **options):
+        ensure_lesson_types_exist()
+        failed = fail_stale_claims()
+        if failed:
+            self.stdout.write(f"Marked {failed} abandoned generation(s) as failed")
+        while True:
+            close_old_connections()
+            course = claim_course()
+            if course is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll"])
+                continue
+            self.stdout.write(f"Generating course {course.id}")
+            try:
+                generate_course(course)
+            except Exception as e:
+                # generate_course already marked the course failed and logged why
+                self.stderr.write(f"Course {course.id} failed: {e}")
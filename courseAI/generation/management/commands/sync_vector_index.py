@@ -0,0 +1,39 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from pinecone import Pinecone
+
+from generation.retrieval_cache import invalidate_namespace
+from generation.vector_index import write_namespace
+
+FETCH_BATCH = 100
+
+
+class Command(BaseCommand):
+    help = "Copy a Pinecone namespace into the local memory-mapped vector index (VECTOR_BACKEND='local')."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--namespace", default="pennapps")
+        parser.add_argument("--ivf", dest="ivf", action="store_true", default=None,
+                            help="Always build IVF partitions (default: only for large namespaces).")
+        parser.add_argument("--no-ivf", dest="ivf", action="store_false")
+
+    def handle(self, *args, **options):
+        namespace = options["namespace"]
+        index = Pinecone(api_key=os.getenv("PINECONE_API_KEY")).Index(host=os.getenv("PINECONE_HOST"))
+
+        records = []
+        for ids in index.list(namespace=namespace):
+            for start in range(0, len(ids), FETCH_BATCH):
+                fetched = index.fetch(ids=ids[start:start + FETCH_BATCH], namespace=namespace)
+                for record_id, vector in fetched.vectors.items():
+                    records.append({"_id": record_id, "fields": dict(vector.metadata or {})})
+            self.stdout.write(f"Fetched {len(records)} records...")
+
+        manifest = write_namespace(settings.VECTOR_INDEX_DIR, namespace, records, ivf=options["ivf"])
+        invalidate_namespace(namespace)
+        self.stdout.write(
+            f"Wrote {manifest['rows']} rows x {manifest['dim']} dims to "
+            f"{settings.VECTOR_INDEX_DIR / namespace} (ivf={manifest['ivf']})"
+        )
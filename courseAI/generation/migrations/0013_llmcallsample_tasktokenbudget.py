@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0012_generatedlesson_is_complete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCallSample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(db_index=True, max_length=50)),
+                ('model', models.CharField(max_length=100)),
+                ('completion_tokens', models.IntegerField()),
+                ('latency_ms', models.IntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False, help_text='Whether the completion hit its token cap')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TaskTokenBudget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=50, unique=True)),
+                ('max_tokens', models.IntegerField()),
+                ('p99_tokens', models.IntegerField(default=0)),
+                ('sample_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['task'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0013_llmcallsample_tasktokenbudget'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebSearchCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('question', 'Question to search query'), ('search', 'Search query to results')], max_length=20)),
+                ('key', models.CharField(help_text='sha256 of kind + normalised text', max_length=64, unique=True)),
+                ('text', models.TextField(help_text='Normalised question or query')),
+                ('payload', models.JSONField()),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
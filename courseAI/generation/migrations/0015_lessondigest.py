@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0014_websearchcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('main_ideas', models.TextField(help_text='A few short main ideas, used as the vector search query')),
+                ('keywords', models.JSONField(default=list)),
+                ('search_query', models.CharField(help_text='Web search question', max_length=300)),
+                ('video_query', models.CharField(blank=True, help_text='YouTube search query', max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='digest', to='generation.generatedlesson')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
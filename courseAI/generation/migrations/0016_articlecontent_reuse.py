@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0015_lessondigest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articlecontent',
+            name='reuse_score',
+            field=models.FloatField(blank=True, help_text='Match score against the reused article', null=True),
+        ),
+        migrations.AddField(
+            model_name='articlecontent',
+            name='reused_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reuses', to='generation.articlecontent'),
+        ),
+    ]
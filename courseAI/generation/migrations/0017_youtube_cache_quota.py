@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0016_articlecontent_reuse'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YouTubeQuotaUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('units', models.IntegerField(default=0)),
+                ('search_calls', models.IntegerField(default=0)),
+                ('videos_calls', models.IntegerField(default=0)),
+                ('refused_calls', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='YouTubeSearchCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of the search parameters (API key excluded)', max_length=64, unique=True)),
+                ('params', models.JSONField()),
+                ('items', models.JSONField(default=list)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-fetched_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='YouTubeStatsCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=50, unique=True)),
+                ('statistics', models.JSONField(default=dict)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-fetched_at'],
+            },
+        ),
+    ]
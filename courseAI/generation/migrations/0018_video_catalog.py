@@ -0,0 +1,158 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_catalog(apps, schema_editor):
+    """One catalog row per video id from the lesson copies and cached statistics."""
+    VideoCatalog = apps.get_model('generation', 'VideoCatalog')
+    YouTubeVideo = apps.get_model('generation', 'YouTubeVideo')
+    YouTubeStatsCache = apps.get_model('generation', 'YouTubeStatsCache')
+
+    catalog = {}
+    for video in YouTubeVideo.objects.order_by('id'):
+        entry = catalog.get(video.legacy_video_id)
+        if entry is None:
+            entry = catalog[video.legacy_video_id] = VideoCatalog.objects.create(
+                video_id=video.legacy_video_id,
+                title=video.title[:300],
+                description=video.description[:500],
+                thumbnail_url=video.thumbnail_url,
+                channel_title=video.channel_title,
+                published_at=video.published_at,
+            )
+        if YouTubeVideo.objects.filter(lesson_id=video.lesson_id, video=entry).exists():
+            video.delete()
+        else:
+            video.video = entry
+            video.save(update_fields=['video'])
+
+    for cached in YouTubeStatsCache.objects.all():
+        entry = catalog.get(cached.video_id)
+        if entry is None:
+            entry = catalog[cached.video_id] = VideoCatalog.objects.create(video_id=cached.video_id)
+        entry.statistics = cached.statistics
+        entry.stats_fetched_at = cached.fetched_at
+        entry.save(update_fields=['statistics', 'stats_fetched_at'])
+
+
+def split_catalog(apps, schema_editor):
+    """Copy catalog metadata back onto each lesson's video row and statistics back into their cache."""
+    VideoCatalog = apps.get_model('generation', 'VideoCatalog')
+    YouTubeVideo = apps.get_model('generation', 'YouTubeVideo')
+    YouTubeStatsCache = apps.get_model('generation', 'YouTubeStatsCache')
+
+    for video in YouTubeVideo.objects.select_related('video'):
+        entry = video.video
+        video.legacy_video_id = entry.video_id
+        video.title = entry.title
+        video.description = entry.description
+        video.thumbnail_url = entry.thumbnail_url
+        video.channel_title = entry.channel_title
+        video.published_at = entry.published_at
+        video.video_url = f'https://www.youtube.com/watch?v={entry.video_id}'
+        video.save()
+
+    YouTubeStatsCache.objects.bulk_create([
+        YouTubeStatsCache(video_id=entry.video_id, statistics=entry.statistics, fetched_at=entry.stats_fetched_at)
+        for entry in VideoCatalog.objects.filter(stats_fetched_at__isnull=False)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0017_youtube_cache_quota'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.CharField(max_length=50, unique=True)),
+                ('title', models.CharField(blank=True, max_length=300)),
+                ('description', models.TextField(blank=True, help_text='Snippet description, truncated')),
+                ('thumbnail_url', models.URLField(blank=True)),
+                ('channel_title', models.CharField(blank=True, max_length=200)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('statistics', models.JSONField(default=dict)),
+                ('stats_fetched_at', models.DateTimeField(blank=True, null=True)),
+                ('available', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='VideoQueryMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text='sha256 of the normalized query and filters', max_length=64, unique=True)),
+                ('query', models.CharField(max_length=200)),
+                ('matched_at', models.DateTimeField()),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='query_matches', to='generation.videocatalog')),
+            ],
+            options={
+                'ordering': ['-matched_at'],
+            },
+        ),
+        # The new foreign key's column is video_id; move the old video id column aside first
+        migrations.RenameField(
+            model_name='youtubevideo',
+            old_name='video_id',
+            new_name='legacy_video_id',
+        ),
+        migrations.AddField(
+            model_name='youtubevideo',
+            name='video',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='lesson_videos', to='generation.videocatalog'),
+        ),
+        migrations.RunPython(build_catalog, split_catalog),
+        migrations.DeleteModel(
+            name='YouTubeStatsCache',
+        ),
+        migrations.AlterField(
+            model_name='youtubevideo',
+            name='video',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lesson_videos', to='generation.videocatalog'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='youtubevideo',
+            unique_together={('lesson', 'video')},
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='channel_title',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='published_at',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='raw_data',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='thumbnail_url',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='title',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='legacy_video_id',
+        ),
+        migrations.RemoveField(
+            model_name='youtubevideo',
+            name='video_url',
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:35
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    CourseGeneration = apps.get_model('generation', 'CourseGeneration')
+    GeneratedChapter = apps.get_model('generation', 'GeneratedChapter')
+    GeneratedLesson = apps.get_model('generation', 'GeneratedLesson')
+
+    rows = (GeneratedLesson.objects
+            .values('chapter_id', 'chapter__course_generation_id', 'lesson_type')
+            .annotate(total=Count('id'), completed=Count('id', filter=Q(is_complete=True)))
+            .order_by())
+    chapters = {}
+    courses = {}
+    for row in rows:
+        chapter = chapters.setdefault(row['chapter_id'], [0, 0])
+        chapter[0] += row['total']
+        chapter[1] += row['completed']
+        course = courses.setdefault(row['chapter__course_generation_id'], {'lessons': 0, 'completed': 0, 'types': {}})
+        course['lessons'] += row['total']
+        course['completed'] += row['completed']
+        course['types'][row['lesson_type']] = course['types'].get(row['lesson_type'], 0) + row['total']
+    # Totals were only set when a generation finished, so failed and unfinished courses
+    # get theirs here too; chapters without lessons still count towards their course
+    chapter_counts = dict(GeneratedChapter.objects
+                          .values_list('course_generation_id')
+                          .annotate(total=Count('id'))
+                          .order_by())
+    for course_id in chapter_counts:
+        courses.setdefault(course_id, {'lessons': 0, 'completed': 0, 'types': {}})
+    for chapter_id, (total, completed) in chapters.items():
+        GeneratedChapter.objects.filter(id=chapter_id).update(total_lessons=total, completed_lessons=completed)
+    for course_id, course in courses.items():
+        CourseGeneration.objects.filter(id=course_id).update(
+            total_chapters=chapter_counts.get(course_id, 0), total_lessons=course['lessons'],
+            completed_lessons=course['completed'], lesson_type_counts=course['types'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0018_video_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegeneration',
+            name='completed_lessons',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coursegeneration',
+            name='lesson_type_counts',
+            field=models.JSONField(blank=True, default=dict, help_text='Lesson type -> number of lessons'),
+        ),
+        migrations.AddField(
+            model_name='generatedchapter',
+            name='completed_lessons',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='generatedchapter',
+            name='total_lessons',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
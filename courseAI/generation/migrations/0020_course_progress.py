@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_lessons(apps, schema_editor):
+    GeneratedLesson = apps.get_model('generation', 'GeneratedLesson')
+    next_ordinal = {}
+    lessons = (GeneratedLesson.objects
+               .order_by('chapter__course_generation_id', 'chapter__chapter_number', 'lesson_number')
+               .values_list('id', 'chapter__course_generation_id'))
+    for lesson_id, course_id in lessons:
+        ordinal = next_ordinal.get(course_id, 0)
+        GeneratedLesson.objects.filter(id=lesson_id).update(ordinal=ordinal)
+        next_ordinal[course_id] = ordinal + 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0019_course_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='coursegeneration',
+            name='completed_lessons',
+        ),
+        migrations.RemoveField(
+            model_name='generatedchapter',
+            name='completed_lessons',
+        ),
+        migrations.AlterField(
+            model_name='generatedlesson',
+            name='is_complete',
+            field=models.BooleanField(default=False, help_text='Legacy course-wide flag; learner progress lives in CourseProgress'),
+        ),
+        migrations.AddField(
+            model_name='generatedlesson',
+            name='ordinal',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CourseProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_key', models.CharField(blank=True, max_length=40)),
+                ('completed', models.BinaryField(default=b'', help_text='Bit n set = lesson with ordinal n completed')),
+                ('completed_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='generation.coursegeneration')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='course_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('course', 'user'), name='unique_course_progress_per_user'), models.UniqueConstraint(condition=models.Q(('session_key', ''), _negated=True), fields=('course', 'session_key'), name='unique_course_progress_per_session')],
+            },
+        ),
+        migrations.RunPython(number_lessons, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0020_course_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursegeneration',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='coursegeneration',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='course_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0021_generation_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='coursegeneration',
+            name='course_pending_idx',
+        ),
+        migrations.AddIndex(
+            model_name='coursegeneration',
+            index=models.Index(fields=['status', 'created_at'], name='course_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursegeneration',
+            index=models.Index(fields=['status', '-completed_at'], name='course_status_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generationlog',
+            index=models.Index(fields=['course_generation', '-created_at'], name='genlog_course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', 'user', '-created_at'], name='quizattempt_quiz_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='textresponsesubmission',
+            index=models.Index(fields=['lesson', 'user', '-submitted_at'], name='textsub_lesson_user_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:47
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_to_snapshots(apps, schema_editor):
+    CourseGeneration = apps.get_model('generation', 'CourseGeneration')
+    CourseSnapshot = apps.get_model('generation', 'CourseSnapshot')
+    rows = (CourseGeneration.objects
+            .filter(course_data_json__isnull=False)
+            .values_list('id', 'course_data_json')
+            .iterator(chunk_size=200))
+    batch = []
+    for course_id, data in rows:
+        raw = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        batch.append(CourseSnapshot(course_id=course_id, data=zlib.compress(raw, 6), raw_size=len(raw)))
+        if len(batch) >= 200:
+            CourseSnapshot.objects.bulk_create(batch)
+            batch = []
+    CourseSnapshot.objects.bulk_create(batch)
+
+
+def move_back(apps, schema_editor):
+    CourseGeneration = apps.get_model('generation', 'CourseGeneration')
+    CourseSnapshot = apps.get_model('generation', 'CourseSnapshot')
+    for course_id, data in CourseSnapshot.objects.values_list('course_id', 'data').iterator(chunk_size=200):
+        CourseGeneration.objects.filter(id=course_id).update(
+            course_data_json=json.loads(zlib.decompress(bytes(data)).decode('utf-8')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0023_list_pagination'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(help_text='zlib-compressed UTF-8 JSON')),
+                ('raw_size', models.IntegerField(default=0, help_text='Size of the uncompressed JSON in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='generation.coursegeneration')),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.RunPython(move_to_snapshots, move_back),
+        migrations.RemoveField(
+            model_name='coursegeneration',
+            name='course_data_json',
+        ),
+    ]
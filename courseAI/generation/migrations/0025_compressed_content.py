@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-19 08:49
+
+import generation.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0024_course_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompressionDictionary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, help_text='Dictionary name used by compressed fields', max_length=50)),
+                ('data', models.BinaryField()),
+                ('sample_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='articlecontent',
+            name='content',
+            field=generation.fields.CompressedTextField(dictionary='article', help_text='Generated article content'),
+        ),
+        migrations.AlterField(
+            model_name='quizattempt',
+            name='results',
+            field=generation.fields.CompressedJSONField(dictionary='quiz_results', help_text='Results showing which answers were correct/incorrect'),
+        ),
+        migrations.AlterField(
+            model_name='textresponsesubmission',
+            name='grades',
+            field=generation.fields.CompressedJSONField(dictionary='text_grades', help_text='Grades and feedback for each question in JSON format'),
+        ),
+    ]
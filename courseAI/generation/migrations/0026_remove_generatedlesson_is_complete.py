@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:12
+
+from django.db import migrations
+
+
+def carry_over_completion(apps, schema_editor):
+    # The old flag was shared by everyone viewing a course; the closest learner it
+    # belonged to is the course's owner. Courses without an owner have nobody to keep it for.
+    GeneratedLesson = apps.get_model('generation', 'GeneratedLesson')
+    CourseProgress = apps.get_model('generation', 'CourseProgress')
+    completed = {}
+    lessons = (GeneratedLesson.objects
+               .filter(is_complete=True, ordinal__isnull=False, chapter__course_generation__user__isnull=False)
+               .values_list('chapter__course_generation_id', 'chapter__course_generation__user_id', 'ordinal'))
+    for course_id, user_id, ordinal in lessons:
+        completed.setdefault((course_id, user_id), set()).add(ordinal)
+    for (course_id, user_id), ordinals in completed.items():
+        progress, _created = CourseProgress.objects.get_or_create(course_id=course_id, user_id=user_id)
+        bits = bytearray(progress.completed)
+        for ordinal in ordinals:
+            if ordinal // 8 >= len(bits):
+                bits.extend(b'\x00' * (ordinal // 8 + 1 - len(bits)))
+            bits[ordinal // 8] |= 1 << (ordinal % 8)
+        progress.completed = bytes(bits)
+        progress.completed_count = sum(bin(byte).count('1') for byte in bits)
+        progress.save(update_fields=['completed', 'completed_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('generation', '0025_compressed_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(carry_over_completion, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='generatedlesson',
+            name='is_complete',
+        ),
+    ]
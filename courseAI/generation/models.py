@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 import json
 
+from .fields import CompressedJSONField, CompressedTextField
+
 class CourseGeneration(models.Model):
     """Main course generation record."""
     STATUS_CHOICES = [
@@ -16,20 +18,31 @@ class CourseGeneration(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_chapters = models.IntegerField(default=0)
     total_lessons = models.IntegerField(default=0)
+    # Maintained by generation/course_stats.py
+    lesson_type_counts = models.JSONField(default=dict, blank=True, help_text="Lesson type -> number of lessons")
     
-    # Store the complete course data as JSON
-    course_data_json = models.JSONField(null=True, blank=True, help_text="Complete course structure as JSON")
+    # The complete course data (outline and lesson plans) lives in CourseSnapshot
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+    # Set when a generation worker claims a pending course (generation/jobs.py)
+    claimed_at = models.DateTimeField(null=True, blank=True)
     
     # Optional user association
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Workers claim the oldest pending course
+            models.Index(fields=['status', 'created_at'], name='course_status_created_idx'),
+            # Recently completed courses on the generation form
+            models.Index(fields=['status', '-completed_at'], name='course_status_completed_idx'),
+            # Course list pages (generation/pagination.py)
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+        ]
         
     def __str__(self):
         return f"Course: {self.user_prompt[:50]}... ({self.status})"
@@ -42,6 +55,8 @@ class GeneratedChapter(models.Model):
     chapter_name = models.CharField(max_length=200)
     chapter_description = models.TextField()
     difficulty_rating = models.IntegerField(help_text="Difficulty from 1-10", default=-1)
+    # Maintained by generation/course_stats.py
+    total_lessons = models.IntegerField(default=0)
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -80,8 +95,8 @@ class GeneratedLesson(models.Model):
     lesson_details = models.TextField()
     lesson_goals = models.TextField(help_text="Learning objectives")
     lesson_guidelines = models.TextField(help_text="Guidelines for creating the lesson", blank=True)
-    # Completion tracking
-    is_complete = models.BooleanField(default=False, help_text="Whether the learner has completed this lesson")
+    # Stable position within the course; bit index in CourseProgress.completed
+    ordinal = models.IntegerField(null=True, blank=True)
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -122,6 +137,9 @@ class GenerationLog(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course_generation', '-created_at'], name='genlog_course_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.step} - {self.status} ({self.level})"
@@ -148,7 +166,7 @@ class QuizAttempt(models.Model):
     user_answers = models.JSONField(help_text="User's answers to quiz questions in JSON format")
     
     # Store results as JSON (correct/incorrect for each question)
-    results = models.JSONField(help_text="Results showing which answers were correct/incorrect")
+    results = CompressedJSONField(dictionary="quiz_results", help_text="Results showing which answers were correct/incorrect")
     
     # Overall score
     score = models.IntegerField(help_text="Number of correct answers")
@@ -161,6 +179,11 @@ class QuizAttempt(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['quiz', 'user', '-created_at'], name='quizattempt_quiz_user_idx'),
+        ]
+    
     def __str__(self):
         return f"Quiz attempt for {self.quiz.lesson.lesson_name} - Score: {self.score}/{self.total_questions}"
     
@@ -169,27 +192,69 @@ class ArticleContent(models.Model):
     lesson = models.OneToOneField(GeneratedLesson, on_delete=models.CASCADE, related_name='article')
     
     # Store article content
-    content = models.TextField(help_text="Generated article content")
+    content = CompressedTextField(dictionary="article", help_text="Generated article content")
+    
+    # Set when the article was copied or adapted from an earlier one instead of generated
+    reused_from = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='reuses')
+    reuse_score = models.FloatField(null=True, blank=True, help_text="Match score against the reused article")
     
     def __str__(self):
         return f"Article for {self.lesson.lesson_name}"
 
-class YouTubeVideo(models.Model):
-    """Store YouTube video info for a lesson."""
-    lesson = models.ForeignKey(GeneratedLesson, on_delete=models.CASCADE, related_name='youtube_videos')
-    video_id = models.CharField(max_length=50)
-    title = models.CharField(max_length=300)
-    description = models.TextField(blank=True)
+class VideoCatalog(models.Model):
+    """One row per YouTube video: compact metadata plus the latest videos.list statistics."""
+    video_id = models.CharField(max_length=50, unique=True)
+    title = models.CharField(max_length=300, blank=True)
+    description = models.TextField(blank=True, help_text="Snippet description, truncated")
     thumbnail_url = models.URLField(blank=True)
     channel_title = models.CharField(max_length=200, blank=True)
     published_at = models.DateTimeField(null=True, blank=True)
-    video_url = models.URLField(blank=True)
-    # Store the full API response for flexibility
-    raw_data = models.JSONField(null=True, blank=True)
-
+    
+    # Statistics from videos.list; refreshed when older than YOUTUBE_STATS_TTL
+    statistics = models.JSONField(default=dict)
+    stats_fetched_at = models.DateTimeField(null=True, blank=True)
+    # False once videos.list stops returning the video (removed or made private)
+    available = models.BooleanField(default=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        
+    @property
+    def video_url(self):
+        return f'https://www.youtube.com/watch?v={self.video_id}'
+    
     def __str__(self):
         return f"YouTube: {self.title} ({self.video_id})"
 
+
+class VideoQueryMatch(models.Model):
+    """The video picked for a YouTube search query, so the same query can skip the API."""
+    key = models.CharField(max_length=64, unique=True, help_text="sha256 of the normalized query and filters")
+    query = models.CharField(max_length=200)
+    video = models.ForeignKey(VideoCatalog, on_delete=models.CASCADE, related_name='query_matches')
+    
+    matched_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-matched_at']
+        
+    def __str__(self):
+        return f"{self.query} -> {self.video.video_id}"
+
+
+class YouTubeVideo(models.Model):
+    """A catalog video selected for a lesson."""
+    lesson = models.ForeignKey(GeneratedLesson, on_delete=models.CASCADE, related_name='youtube_videos')
+    video = models.ForeignKey(VideoCatalog, on_delete=models.PROTECT, related_name='lesson_videos')
+    
+    class Meta:
+        unique_together = ['lesson', 'video']
+
+    def __str__(self):
+        return f"YouTube: {self.video.title} ({self.video.video_id})"
+
 class Project(models.Model):
     """Programming project for interactive lessons."""
     lesson = models.OneToOneField(GeneratedLesson, on_delete=models.CASCADE, related_name='project')
@@ -252,7 +317,7 @@ class TextResponseSubmission(models.Model):
     user_answers = models.JSONField(help_text="User's answers to all questions in JSON format")
     
     # Store grades as JSON (question_number -> grade_data)
-    grades = models.JSONField(help_text="Grades and feedback for each question in JSON format")
+    grades = CompressedJSONField(dictionary="text_grades", help_text="Grades and feedback for each question in JSON format")
     
     # Overall scoring
     total_score = models.FloatField(help_text="Overall score as percentage (0-100)")
@@ -264,6 +329,169 @@ class TextResponseSubmission(models.Model):
     
     class Meta:
         ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['lesson', 'user', '-submitted_at'], name='textsub_lesson_user_idx'),
+        ]
+        
+    def __str__(self):
+        return f"Submission for {self.lesson.lesson_name} - Score: {self.total_score:.1f}%"
+
+class LLMCallSample(models.Model):
+    """Observed completion length and latency for one LLM call, used to size token budgets."""
+    task = models.CharField(max_length=50, db_index=True)
+    model = models.CharField(max_length=100)
+    completion_tokens = models.IntegerField()
+    latency_ms = models.IntegerField(default=0)
+    truncated = models.BooleanField(default=False, help_text="Whether the completion hit its token cap")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"{self.task} ({self.model}): {self.completion_tokens} tokens"
+
+
+class TaskTokenBudget(models.Model):
+    """Learned max_completion_tokens for an LLM task (p99 of observed lengths plus headroom)."""
+    task = models.CharField(max_length=50, unique=True)
+    max_tokens = models.IntegerField()
+    p99_tokens = models.IntegerField(default=0)
+    sample_count = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['task']
+        
+    def __str__(self):
+        return f"{self.task}: {self.max_tokens} tokens"
+
+
+class WebSearchCache(models.Model):
+    """Persisted web search step: a question's condensed query, or a query's Tavily results."""
+    KIND_CHOICES = [
+        ('question', 'Question to search query'),
+        ('search', 'Search query to results'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    key = models.CharField(max_length=64, unique=True, help_text="sha256 of kind + normalised text")
+    text = models.TextField(help_text="Normalised question or query")
+    payload = models.JSONField()
+    hits = models.IntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"{self.kind}: {self.text[:60]}"
+
+
+class LessonDigest(models.Model):
+    """Condensed form of a lesson computed once and shared by the Pinecone, Tavily and YouTube lookups."""
+    lesson = models.OneToOneField(GeneratedLesson, on_delete=models.CASCADE, related_name='digest')
+    
+    main_ideas = models.TextField(help_text="A few short main ideas, used as the vector search query")
+    keywords = models.JSONField(default=list)
+    search_query = models.CharField(max_length=300, help_text="Web search question")
+    video_query = models.CharField(max_length=200, blank=True, help_text="YouTube search query")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"Digest for {self.lesson.lesson_name}"
+
+
+class YouTubeSearchCache(models.Model):
+    """Cached search.list result for one full set of search parameters."""
+    key = models.CharField(max_length=64, unique=True, help_text="sha256 of the search parameters (API key excluded)")
+    params = models.JSONField()
+    items = models.JSONField(default=list)
+    
+    fetched_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-fetched_at']
+        
+    def __str__(self):
+        return f"YouTube search: {self.params.get('q', '')}"
+
+
+class YouTubeQuotaUsage(models.Model):
+    """YouTube Data API quota units spent per quota day (Pacific time, as Google counts it)."""
+    day = models.DateField(unique=True)
+    units = models.IntegerField(default=0)
+    search_calls = models.IntegerField(default=0)
+    videos_calls = models.IntegerField(default=0)
+    refused_calls = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-day']
+        
+    def __str__(self):
+        return f"YouTube quota {self.day}: {self.units} units"
+
+
+class CourseProgress(models.Model):
+    """One learner's completed lessons in a course, as a bitset indexed by lesson ordinal."""
+    course = models.ForeignKey(CourseGeneration, on_delete=models.CASCADE, related_name='progress')
+    # Signed-in learners are keyed by user, anonymous ones by session
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='course_progress')
+    session_key = models.CharField(max_length=40, blank=True)
+    
+    completed = models.BinaryField(default=b'', help_text="Bit n set = lesson with ordinal n completed")
+    completed_count = models.IntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'user'], condition=models.Q(user__isnull=False),
+                                    name='unique_course_progress_per_user'),
+            models.UniqueConstraint(fields=['course', 'session_key'], condition=~models.Q(session_key=''),
+                                    name='unique_course_progress_per_session'),
+        ]
+        
+    def __str__(self):
+        learner = self.user or f"session {self.session_key[:8]}"
+        return f"Progress of {learner} in course {self.course_id}: {self.completed_count} lessons"
+
+
+class CourseSnapshot(models.Model):
+    """Complete course data (outline and every chapter's lesson plan) as compressed JSON, loaded only on request."""
+    course = models.OneToOneField(CourseGeneration, on_delete=models.CASCADE, related_name='snapshot')
+    data = models.BinaryField(help_text="zlib-compressed UTF-8 JSON")
+    raw_size = models.IntegerField(default=0, help_text="Size of the uncompressed JSON in bytes")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-updated_at']
+        
+    def __str__(self):
+        return f"Snapshot of course {self.course_id} ({len(self.data)} of {self.raw_size} bytes)"
+
+
+class CompressionDictionary(models.Model):
+    """zlib preset dictionary trained on stored values of one kind (see generation/fields.py)."""
+    name = models.CharField(max_length=50, db_index=True, help_text="Dictionary name used by compressed fields")
+    data = models.BinaryField()
+    sample_count = models.IntegerField(default=0)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
         
     def __str__(self):
-        return f"Submission for {self.lesson.lesson_name} - Score: {self.total_score:.1f}%"
\ No newline at end of file
+        return f"{self.name} dictionary {self.id} ({len(self.data)} bytes, {self.sample_count} samples)"
@@ -0,0 +1,78 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# --------------- Keyset pagination ---------------
+# Course and project listings page by position rather than by OFFSET: a page is the
+# rows after the last one shown, in (-field, -id) order. That makes every page one
+# index range scan (Meta.indexes on the same columns), however deep it is. The cursor
+# in the URL is the last row's (field, id), base64-encoded. Totals come from a count
+# cached per listing and dropped by signals when rows are added or removed.
+
+DEFAULT_PAGE_SIZE = 24
+DEFAULT_COUNT_TTL = 5 * 60
+
+
+def page_size():
+    return getattr(settings, "LIST_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat(), pk]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """(datetime, id) from a cursor, or None when it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, pk = json.loads(raw)
+        value = parse_datetime(value)
+        return (value, int(pk)) if value is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def after_cursor(queryset, field, cursor=None):
+    """queryset ordered newest first by (field, id), starting after the cursor's row."""
+    rows = queryset.order_by(f"-{field}", "-id")
+    position = decode_cursor(cursor)
+    if position is not None:
+        value, pk = position
+        # The plain bound on field lets the database start the index scan at the cursor
+        rows = rows.filter(Q(**{f"{field}__lte": value}), Q(**{f"{field}__lt": value}) | Q(id__lt=pk))
+    return rows
+
+
+def keyset_page(queryset, field, cursor=None, size=None):
+    """One page of queryset ordered newest first by field, and the cursor of the next page (None on the last)."""
+    size = size or page_size()
+    rows = list(after_cursor(queryset, field, cursor)[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    last = rows[size - 1]
+    return rows[:size], encode_cursor(getattr(last, field), last.id)
+
+
+def count_key(name):
+    return f"list_count:{name}"
+
+
+def cached_count(name, queryset):
+    """Row count of a listing, cached for LIST_COUNT_TTL seconds."""
+    count = cache.get(count_key(name))
+    if count is None:
+        count = queryset.count()
+        cache.set(count_key(name), count, getattr(settings, "LIST_COUNT_TTL", DEFAULT_COUNT_TTL))
+    return count
+
+
+def invalidate_count(name):
+    transaction.on_commit(lambda: cache.delete(count_key(name)))
@@ -0,0 +1,113 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .course_tree import invalidate_course
+from .models import CourseProgress, GeneratedLesson
+
+# --------------- Learner progress ---------------
+# Completion is tracked per learner (user, or session when signed out), not on the
+# shared GeneratedLesson rows. A learner's progress in a course is one
+# CourseProgress row whose `completed` bytes are a bitset indexed by lesson ordinal
+# (bit n = byte n // 8, bit n % 8). Reading it is one query; completing a lesson is
+# one compare-and-swap UPDATE, and nothing is written when the bit is already set.
+
+MAX_ATTEMPTS = 5
+
+
+def is_set(bits, n):
+    byte = n // 8
+    return byte < len(bits) and bool(bits[byte] & (1 << (n % 8)))
+
+
+def with_bit(bits, n):
+    data = bytearray(bits)
+    if n // 8 >= len(data):
+        data.extend(b'\x00' * (n // 8 + 1 - len(data)))
+    data[n // 8] |= 1 << (n % 8)
+    return bytes(data)
+
+
+def learner(request, create=False):
+    """Lookup for the current learner's CourseProgress rows, or None (no session and not creating one)."""
+    if request.user.is_authenticated:
+        return {'user': request.user}
+    if not request.session.session_key:
+        if not create:
+            return None
+        request.session.save()
+    return {'user': None, 'session_key': request.session.session_key}
+
+
+def number_lessons(course_id):
+    """Give ordinals to lessons of a course that have none, after the highest one in use."""
+    lessons = (GeneratedLesson.objects
+               .filter(chapter__course_generation_id=course_id)
+               .order_by('chapter__chapter_number', 'lesson_number'))
+    next_ordinal = lessons.aggregate(top=Max('ordinal'))['top']
+    next_ordinal = 0 if next_ordinal is None else next_ordinal + 1
+    numbered = 0
+    for lesson_id in lessons.filter(ordinal__isnull=True).values_list('id', flat=True):
+        numbered += GeneratedLesson.objects.filter(id=lesson_id, ordinal__isnull=True).update(ordinal=next_ordinal)
+        next_ordinal += 1
+    # update() sends no signals, and the cached tree maps bits to lessons by ordinal
+    if numbered:
+        invalidate_course(course_id)
+
+
+def _remember(request, course_id, bits):
+    # A view that just marked a lesson complete renders the sidebar from the same bits
+    if not hasattr(request, '_progress_bits'):
+        request._progress_bits = {}
+    request._progress_bits[course_id] = bits
+    return bits
+
+
+def completed_bits(request, course_id):
+    """The learner's completion bitset for a course (b'' when nothing is completed)."""
+    known = getattr(request, '_progress_bits', {})
+    if course_id in known:
+        return known[course_id]
+    lookup = learner(request)
+    if lookup is None:
+        return b''
+    bits = CourseProgress.objects.filter(course_id=course_id, **lookup).values_list('completed', flat=True).first()
+    return _remember(request, course_id, bytes(bits) if bits is not None else b'')
+
+
+def completed_lesson_ids(bits, tree):
+    """Ids of the course tree's lessons whose bit is set."""
+    return {lesson.id for lesson in tree.lessons if lesson.ordinal is not None and is_set(bits, lesson.ordinal)}
+
+
+def mark_complete(request, lesson):
+    """Record that the current learner completed a lesson; True if this changed anything."""
+    course_id = lesson.chapter.course_generation_id
+    if lesson.ordinal is None:
+        number_lessons(course_id)
+        lesson.ordinal = GeneratedLesson.objects.values_list('ordinal', flat=True).get(id=lesson.id)
+    lookup = learner(request, create=True)
+    rows = CourseProgress.objects.filter(course_id=course_id, **lookup)
+    for _ in range(MAX_ATTEMPTS):
+        row = rows.values_list('id', 'completed').first()
+        if row is None:
+            bits = with_bit(b'', lesson.ordinal)
+            try:
+                with transaction.atomic():
+                    CourseProgress.objects.create(course_id=course_id, completed=bits, completed_count=1, **lookup)
+                _remember(request, course_id, bits)
+                return True
+            except IntegrityError:
+                continue
+        progress_id, bits = row[0], bytes(row[1])
+        if is_set(bits, lesson.ordinal):
+            _remember(request, course_id, bits)
+            return False
+        updated = with_bit(bits, lesson.ordinal)
+        # Only applies if nobody else changed this learner's bits since we read them
+        if CourseProgress.objects.filter(id=progress_id, completed=bits).update(
+                completed=updated, completed_count=F('completed_count') + 1, updated_at=timezone.now()):
+            _remember(request, course_id, updated)
+            return True
+    print(f"⚠️ Could not record completion of lesson {lesson.id} after {MAX_ATTEMPTS} attempts")
+    return False
@@ -0,0 +1,123 @@
+import os
+import threading
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# --------------- Provider registry ---------------
+# SDK clients (Cerebras, Pinecone, Tavily) and HTTP sessions are built on first use instead of at
+# import time, and the SDK modules themselves are only imported inside the
+# factories. Importing the views, running migrations or `manage.py check` therefore
+# neither pays for the SDK imports nor needs the API keys to be set.
+
+POOL_SIZE = 16
+
+_factories = {}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register(name, factory):
+    """Register a zero-argument factory for a provider client."""
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+
+def get(name):
+    """The client for a provider, built on first call and shared afterwards."""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def reset(name=None):
+    """Drop built clients (e.g. after rotating a key) so the next use rebuilds them."""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def loaded():
+    """Names of the providers that have been built in this process."""
+    with _lock:
+        return sorted(_instances)
+
+
+class LazyProvider:
+    """Stand-in for a provider client that builds the real one on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyProvider {self._name}>"
+
+
+def lazy(name):
+    return LazyProvider(name)
+
+
+# --------------- Factories ---------------
+def _cerebras(env_var):
+    def factory():
+        from cerebras.cloud.sdk import Cerebras
+        # No SDK retries: 429s and 5xx must reach the AIMD limiter, and llm_utils._route
+        # retries them with backoff
+        return Cerebras(api_key=os.getenv(env_var), max_retries=0)
+    return factory
+
+
+def _vector_index():
+    from django.conf import settings
+
+    if settings.VECTOR_BACKEND == 'local':
+        # Memory-mapped copy of the Pinecone namespaces (python manage.py sync_vector_index)
+        from .vector_index import LocalVectorIndex
+        return LocalVectorIndex(settings.VECTOR_INDEX_DIR)
+    from pinecone import Pinecone
+    return Pinecone(api_key=os.getenv('PINECONE_API_KEY')).Index(host=os.getenv('PINECONE_HOST'))
+
+
+def _tavily():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from tavily import TavilyClient
+
+    # One keep-alive pool shared by every search in the process
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return TavilyClient(api_key=os.getenv('TAVILY_API_KEY'), session=session)
+
+
+def _youtube_http():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # Keep-alive pool for the YouTube Data API; only connection failures are retried
+    # here, throttling is left to the AIMD limiter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE,
+                          max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2))
+    session.mount("https://", adapter)
+    return session
+
+
+register("cerebras", _cerebras('CEREBRAS_API_KEY'))
+register("cerebras_secondary", _cerebras('SECOND_CEREBRAS_API_KEY'))
+register("vector_index", _vector_index)
+register("tavily", _tavily)
+register("youtube_http", _youtube_http)
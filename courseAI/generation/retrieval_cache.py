@@ -0,0 +1,80 @@
+import hashlib
+import json
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+# --------------- Retrieval result cache ---------------
+# Vector searches for the same main ideas repeat across lessons and courses. Results
+# are cached in the Django cache under a key built from the normalised query text,
+# namespace, top_k and fields plus a per-namespace version. Re-syncing a namespace
+# bumps the version, so stale entries are never read again and simply expire.
+
+DEFAULT_TTL = 24 * 60 * 60
+
+_WHITESPACE = re.compile(r"\s+")
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query string."""
+    return _WHITESPACE.sub(" ", (text or "").lower()).strip()
+
+
+def _version_key(namespace):
+    return f"retrieval:version:{namespace}"
+
+
+def namespace_version(namespace, index=None):
+    """Current cache generation for a namespace (includes the local index's own version)."""
+    version = cache.get_or_set(_version_key(namespace), 1, None)
+    # The local index exposes its on-disk version, which other processes see after a sync
+    local = getattr(index, "namespace_version", None)
+    return f"{version}.{local(namespace)}" if local else str(version)
+
+
+def invalidate_namespace(namespace):
+    """Make every cached result for a namespace unreachable."""
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.set(_version_key(namespace), 2, None)
+    _count("invalidations")
+
+
+def _as_dict(result):
+    # SDK response models are converted so the cache only ever pickles plain data
+    to_dict = getattr(result, "to_dict", None)
+    return to_dict() if callable(to_dict) else result
+
+
+def cached_search(index, namespace, text, top_k, fields, search):
+    """Return search results for a text query, calling ``search()`` only on a cache miss."""
+    payload = json.dumps([normalize_query(text), top_k, sorted(fields or [])])
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    key = f"retrieval:{namespace}:{namespace_version(namespace, index)}:{digest}"
+    result = cache.get(key)
+    if result is not None:
+        _count("hits")
+        return result
+    _count("misses")
+    result = _as_dict(search())
+    cache.set(key, result, getattr(settings, "RETRIEVAL_CACHE_TTL", DEFAULT_TTL))
+    return result
+
+
+def retrieval_cache_stats():
+    """Hit, miss and invalidation counts for this process, with the hit rate."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+    return stats
@@ -0,0 +1,193 @@
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import dotenv
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import providers
+from .concurrency import key_id, limiter
+from .db_utils import write
+from .llm_utils import complete_text
+from .models import WebSearchCache
+from .singleflight import call_key, flight
+
+dotenv.load_dotenv()
+
+client = providers.lazy("cerebras")
+
+# --------------- Web search (Tavily) ---------------
+# One Tavily client and HTTP session per process. Both steps of a lookup are
+# persisted: question -> condensed search query, and query -> Tavily results, so the
+# same external lesson topic never costs an LLM call or a search twice.
+
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_PARALLEL = 4
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def tavily_client():
+    """Shared TavilyClient over a pooled keep-alive session (None without TAVILY_API_KEY)."""
+    if not os.getenv('TAVILY_API_KEY'):
+        return None
+    return providers.get("tavily")
+
+
+def _normalize(text):
+    return _WHITESPACE.sub(" ", (text or "").lower()).strip()
+
+
+def _cache_key(kind, text):
+    return hashlib.sha256(f"{kind}:{text}".encode("utf-8")).hexdigest()
+
+
+def _cached(kind, text):
+    ttl = getattr(settings, "TAVILY_CACHE_TTL", DEFAULT_CACHE_TTL)
+    key = _cache_key(kind, text)
+    entry = (WebSearchCache.objects
+             .filter(key=key, created_at__gte=timezone.now() - timedelta(seconds=ttl))
+             .only('payload')
+             .first())
+    if entry is None:
+        return None
+    try:
+        write(WebSearchCache.objects.filter(pk=entry.pk).update, hits=F('hits') + 1)
+    except DatabaseError:
+        pass
+    return entry.payload
+
+
+def _store(kind, text, payload):
+    key = _cache_key(kind, text)
+
+    def save():
+        updated = WebSearchCache.objects.filter(key=key).update(
+            payload=payload, created_at=timezone.now(), hits=0)
+        if not updated:
+            WebSearchCache.objects.create(kind=kind, key=key, text=text, payload=payload)
+
+    try:
+        # Searches run on worker threads, so entries are saved by the shared writer (generation/db_utils.py)
+        write(save)
+    except DatabaseError as e:
+        # The cache is best effort: a lost write (duplicate key, busy database) only costs a future miss
+        print(f"⚠️ Could not store {kind} cache entry: {e}")
+
+
+def search_query_for(question):
+    """Condense a lesson description into a short search query (cached per question)."""
+    normalized = _normalize(question)
+    cached = _cached('question', normalized)
+    if cached is not None:
+        return cached['query']
+    query = complete_text(
+        "search_question",
+        [
+            {
+                "role": "user",
+                "content": f"""
+                    Please take the following information and simplify it down to a simple question containing the main ideas.
+                    Input: {question}
+                    DO NOT return anything other than the main ideas, do not explain anything, do not add any extra information.
+                """
+            }
+        ],
+        client,
+        stream=False,
+        temperature=0.7,
+        top_p=0.8
+    ).strip()
+    if query:
+        _store('question', normalized, {'query': query})
+    return query
+
+
+def search(query):
+    """Tavily results for a query: persistent cache, then one coalesced, rate-limited request."""
+    normalized = _normalize(query)
+    cached = _cached('search', normalized)
+    if cached is not None:
+        print(f"🔍 Tavily cache hit for: {normalized[:60]}")
+        return cached
+    tavily = tavily_client()
+    if tavily is None:
+        print("❌ No TAVILY_API_KEY found in environment variables!")
+        return {'results': []}
+
+    def fetch():
+        with limiter("tavily", key_id(os.getenv('TAVILY_API_KEY'))).slot():
+            return tavily.search(query)
+
+    response = flight("tavily").do(call_key(normalized), fetch)
+    _store('search', normalized, response)
+    return response
+
+
+def pick_best_result(results, min_score=0.5):
+    """Highest-scoring result with a URL at or above min_score, or None."""
+    best_result = None
+    best_score = 0
+    for i, result in enumerate(results):
+        score = result.get('score', 0)
+        url = result.get('url', '')
+        print(f"🔍 Result {i+1}: score={score}, url={url[:50]}...")
+        if score >= min_score and url and score > best_score:
+            best_result = {
+                'url': url,
+                'title': result.get('title', 'No title available'),
+                'content': result.get('content', 'No content available'),
+                'score': score
+            }
+            best_score = score
+    return best_result
+
+
+def get_best_source(question, min_score=0.5, query=None):
+    """Find the best external source for a lesson description.
+
+    Pass ``query`` (e.g. from the lesson digest) to skip condensing the question.
+    """
+    print(f"🔍 get_best_source called with question: {question[:100]}...")
+    print(f"🔍 Tavily API key found: {bool(os.getenv('TAVILY_API_KEY'))}")
+    if not os.getenv('TAVILY_API_KEY'):
+        print("❌ No TAVILY_API_KEY found in environment variables!")
+        return None
+    try:
+        query = query or search_query_for(question)
+        print(query)
+        response = search(query)
+        print(f"🔍 Tavily search response received: {len(response.get('results', []))} results")
+        best_result = pick_best_result(response.get('results', []), min_score)
+        print(f"🔍 Final best result: {best_result}")
+        return best_result
+    except Exception as e:
+        print(f"❌ Error during search: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def get_best_sources(questions, min_score=0.5, queries=None):
+    """get_best_source for several questions at once, with bounded parallelism; results keep input order."""
+    if not questions:
+        return []
+    workers = min(len(questions), getattr(settings, "TAVILY_MAX_PARALLEL", DEFAULT_MAX_PARALLEL))
+
+    queries = queries or [None] * len(questions)
+
+    def worker(args):
+        question, query = args
+        try:
+            return get_best_source(question, min_score, query)
+        finally:
+            # Pool threads are short-lived; do not leave their DB connections open
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(worker, zip(questions, queries)))
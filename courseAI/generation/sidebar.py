@@ -0,0 +1,46 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .course_tree import build_course_tree, cache_ttl, sidebar_key, tree_key
+from .progress import completed_lesson_ids
+
+# --------------- Lesson sidebar ---------------
+# Every lesson page of a course shares one rendered sidebar, cached next to the
+# course tree (generation/course_tree.py) and dropped with it. Nothing in it depends
+# on the current lesson or learner: that lesson is highlighted and the learner's
+# completed lessons are ticked with string replaces, and the previous/next links are
+# rendered per request into the footer placeholder.
+
+_LESSON_ITEM = '<li class="lesson" data-lesson-id="%d">'
+_ACTIVE_LESSON_ITEM = '<li class="lesson active" data-lesson-id="%d">'
+NAV_PLACEHOLDER = '<!-- lesson-nav -->'
+_DONE_PLACEHOLDER = '<!-- done:%d -->'
+_DONE_INDICATOR = '<span class="complete-indicator" title="Completed">✓</span>'
+
+
+def sidebar_html(course_id, current_lesson_id=None, bits=b''):
+    """Rendered sidebar for a course with the current lesson highlighted and linked to its neighbours.
+
+    ``bits`` is the learner's completion bitset (generation/progress.py).
+    """
+    # Fragment and tree come back in one cache round trip
+    cached = cache.get_many([sidebar_key(course_id), tree_key(course_id)])
+    html = cached.get(sidebar_key(course_id))
+    tree = cached.get(tree_key(course_id))
+    if tree is None:
+        tree = build_course_tree(course_id)
+        cache.set(tree_key(course_id), tree, cache_ttl())
+    if html is None:
+        html = render_to_string('generation/_sidebar_tree.html', {'tree': tree})
+        cache.set(sidebar_key(course_id), html, cache_ttl())
+    for lesson_id in completed_lesson_ids(bits, tree):
+        html = html.replace(_DONE_PLACEHOLDER % lesson_id, _DONE_INDICATOR, 1)
+    if current_lesson_id is not None:
+        html = html.replace(_LESSON_ITEM % current_lesson_id, _ACTIVE_LESSON_ITEM % current_lesson_id, 1)
+        nav = render_to_string('generation/_lesson_nav.html', {
+            'previous_lesson': tree.previous(current_lesson_id),
+            'next_lesson': tree.next(current_lesson_id),
+        })
+        html = html.replace(NAV_PLACEHOLDER, nav, 1)
+    return mark_safe(html)
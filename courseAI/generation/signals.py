@@ -0,0 +1,76 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ArticleContent, CourseGeneration, ExternalArticles, GeneratedChapter, GeneratedLesson, MultipleChoiceQuiz
+from .course_stats import recount_course
+from .course_tree import TREE_FIELDS, invalidate_course
+from .pagination import invalidate_count
+from courses.models import Project
+
+
+# --------------- Course tree invalidation ---------------
+@receiver([post_save, post_delete], sender=CourseGeneration)
+def course_changed(sender, instance, **kwargs):
+    invalidate_course(instance.id)
+
+
+@receiver([post_save, post_delete], sender=GeneratedChapter)
+def chapter_changed(sender, instance, **kwargs):
+    invalidate_course(instance.course_generation_id)
+
+
+@receiver([post_save, post_delete], sender=GeneratedLesson)
+def lesson_changed(sender, instance, update_fields=None, **kwargs):
+    # Saves that only touch fields the tree does not hold leave it cached
+    if update_fields and not TREE_FIELDS.intersection(update_fields):
+        return
+    invalidate_course(_course_for_lesson(instance))
+
+
+@receiver([post_save, post_delete], sender=MultipleChoiceQuiz)
+@receiver([post_save, post_delete], sender=ArticleContent)
+@receiver([post_save, post_delete], sender=ExternalArticles)
+def lesson_asset_changed(sender, instance, created=None, **kwargs):
+    # The tree only records whether the asset exists, so edits to it do not count
+    if created is False:
+        return
+    invalidate_course(GeneratedLesson.objects
+                      .filter(id=instance.lesson_id)
+                      .values_list('chapter__course_generation_id', flat=True)
+                      .first())
+
+
+# --------------- Course counters ---------------
+@receiver(post_delete, sender=GeneratedChapter)
+def recount_after_chapter_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, CourseGeneration) or getattr(origin, 'model', None) is CourseGeneration:
+        return
+    course = CourseGeneration.objects.filter(id=instance.course_generation_id).first()
+    if course is not None:
+        recount_course(course)
+
+
+@receiver(post_delete, sender=GeneratedLesson)
+def recount_after_delete(sender, instance, origin=None, **kwargs):
+    # Lessons removed as part of deleting their chapter or course need no recount
+    if isinstance(origin, (CourseGeneration, GeneratedChapter)) or getattr(origin, 'model', None) in (CourseGeneration, GeneratedChapter):
+        return
+    course = CourseGeneration.objects.filter(id=_course_for_lesson(instance)).first()
+    if course is not None:
+        recount_course(course)
+
+
+def _course_for_lesson(lesson):
+    if GeneratedLesson.chapter.is_cached(lesson):
+        return lesson.chapter.course_generation_id
+    return GeneratedChapter.objects.filter(id=lesson.chapter_id).values_list('course_generation_id', flat=True).first()
+
+
+# --------------- Listing counts ---------------
+@receiver([post_save, post_delete], sender=CourseGeneration)
+@receiver([post_save, post_delete], sender=Project)
+def listing_changed(sender, instance, created=None, **kwargs):
+    # Edits leave the number of rows alone
+    if created is False:
+        return
+    invalidate_count('courses' if sender is CourseGeneration else 'projects')
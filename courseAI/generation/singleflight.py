@@ -0,0 +1,96 @@
+import copy
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import Future
+
+# --------------- Single-flight request coalescing ---------------
+# Concurrent callers asking for the same thing (same prompt, same search query)
+# share one upstream call: the first caller runs it, later callers wait on its
+# future and receive a copy of the result (or the same exception).
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def call_key(*parts, **kwargs):
+    """Stable key for a call signature; whitespace differences in text do not matter."""
+    payload = json.dumps(_normalize([parts, kwargs]), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _snapshot(value):
+    # SDK response objects are not always deep-copyable; share those as-is
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return value
+
+
+class SingleFlight:
+    """Run at most one in-flight call per key and share its result."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.stats["coalesced"] += 1
+        if not leader:
+            # Followers get their own copy so callers can mutate results freely
+            return _snapshot(future.result())
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            # Publish a snapshot so the leader mutating its result cannot race the followers' copies
+            future.set_result(_snapshot(result))
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def flight(name):
+    """Return the shared SingleFlight group for a provider (llm, tavily, youtube, pinecone)."""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def flight_stats():
+    """Per-group call and coalesced counts."""
+    with _flights_lock:
+        groups = list(_flights.values())
+    return {group.name: {**group.stats, "in_flight": group.in_flight()} for group in groups}
@@ -0,0 +1,55 @@
+import json
+import zlib
+
+from .models import CourseSnapshot
+
+# --------------- Course snapshots ---------------
+# The full course data from generation (prompt, name, chapter outline, every
+# chapter's lesson plan) is written once and rarely read. It is kept as zlib-compressed
+# JSON in CourseSnapshot rather than on CourseGeneration, so loading a course for a page,
+# list or sidebar never pulls it. load_snapshot() parses it for code that needs it;
+# stream_snapshot() hands the JSON text back in chunks without parsing it.
+
+COMPRESSION_LEVEL = 6
+# Compressed bytes decompressed per streamed chunk
+STREAM_CHUNK = 16 * 1024
+
+
+def save_snapshot(course_id, data):
+    """Store (or replace) a course's snapshot; returns its CourseSnapshot."""
+    raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    snapshot, _ = CourseSnapshot.objects.update_or_create(
+        course_id=course_id,
+        defaults={"data": zlib.compress(raw, COMPRESSION_LEVEL), "raw_size": len(raw)},
+    )
+    return snapshot
+
+
+def _compressed(course_id):
+    data = CourseSnapshot.objects.filter(course_id=course_id).values_list("data", flat=True).first()
+    return None if data is None else bytes(data)
+
+
+def load_snapshot(course_id):
+    """A course's snapshot as parsed JSON, or None when it has none."""
+    data = _compressed(course_id)
+    return None if data is None else json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def stream_snapshot(course_id):
+    """Iterator over a course's snapshot as UTF-8 JSON byte chunks, or None when it has none."""
+    data = _compressed(course_id)
+    if data is None:
+        return None
+
+    def chunks():
+        decompressor = zlib.decompressobj()
+        for start in range(0, len(data), STREAM_CHUNK):
+            chunk = decompressor.decompress(data[start:start + STREAM_CHUNK])
+            if chunk:
+                yield chunk
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    return chunks()
@@ -1,3 +1,1351 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from courses.models import File, Project
+
+from . import (article_reuse, db_bench, digest_utils, fields, llm_utils, providers, retrieval_cache, search_utils,
+               snapshots, vector_index, views, youtube_utils)
+from .article_reuse import ArticleReuseIndex, find_reusable_article
+from .concurrency import AIMDLimiter
+from .course_stats import recount_course
+from .course_tree import build_course_tree, course_tree
+from .db_utils import writer
+from .digest_utils import lesson_digests
+from .fields import ESCAPE, MARKER, compress_text, decompress_text, forget_dictionaries, train_dictionary
+from .llm_utils import MAX_REPAIRS, StructuredOutputError, _parse_structured, _split_elements
+from .models import (ArticleContent, CompressionDictionary, CourseGeneration, CourseProgress, CourseSnapshot,
+                     GeneratedChapter, GeneratedLesson, GenerationLog, LessonDigest, LLMCallSample, MultipleChoiceQuiz,
+                     QuizAttempt, TextResponseSubmission, VideoCatalog, WebSearchCache, YouTubeQuotaUsage,
+                     YouTubeSearchCache, YouTubeVideo)
+from .pagination import after_cursor, encode_cursor, keyset_page
+from .progress import completed_bits, mark_complete, number_lessons
+from .sidebar import sidebar_html
+from .search_utils import get_best_sources
+from .singleflight import SingleFlight
+from .snapshots import load_snapshot, save_snapshot
+from .vector_index import LocalVectorIndex, write_namespace
+from .views import search_youtube_for_lessons
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+                           usage=SimpleNamespace(completion_tokens=10))
+
+
+class FakeClient:
+    """Stands in for a Cerebras client, answering each chat completion from canned replies."""
+    api_key = None
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return _completion(reply)
+
+
+class StatusError(Exception):
+    """Provider error carrying an HTTP status, like the SDK's APIStatusError."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _chapter(n):
+    return {"chapter_number": n, "chapter_name": f"Chapter {n}", "chapter_description": "About it", "chapter_difficulty": 1}
+
+
+def _grade(n):
+    return {"question_number": n, "score": 80, "feedback": "Good"}
+
+
+def _course(chapters=1, lessons=2, lesson_type="txt", **fields):
+    """A course with `chapters` chapters of `lessons` lessons each; returns (course, lessons in course order)."""
+    course = CourseGeneration.objects.create(**{"user_prompt": "Python", "status": "completed", **fields})
+    created = []
+    for c in range(1, chapters + 1):
+        chapter = GeneratedChapter.objects.create(course_generation=course, chapter_number=c,
+                                                  chapter_name=f"Chapter {c}", chapter_description="About it")
+        for l in range(1, lessons + 1):
+            created.append(GeneratedLesson.objects.create(chapter=chapter, lesson_number=l, lesson_type=lesson_type,
+                                                          lesson_name=f"Lesson {c}.{l}", lesson_description="d",
+                                                          lesson_details="d", lesson_goals="g"))
+    return course, created
+
+
+# name -> (raw JSON array text, elements _split_elements should return)
+SPLIT_CASES = {
+    "flat": ('[1, 2, 3]', ['1', ' 2', ' 3']),
+    "empty": ('[]', ['']),
+    "commas and brackets in strings": ('["a, b", "c]", "{d"]', ['"a, b"', ' "c]"', ' "{d"']),
+    "escaped quotes": ('["say \\"hi\\", ok", 2]', ['"say \\"hi\\", ok"', ' 2']),
+    "nested": ('[{"a": [1, 2]}, [3, {"b": 4}]]', ['{"a": [1, 2]}', ' [3, {"b": 4}]']),
+    "truncated": ('[1, {"a": "x', ['1', ' {"a": "x']),
+}
+
+# name -> (task, model response, repair replies, expected document, repairs, dropped)
+PARSE_CASES = {
+    "valid": (
+        "chapter_list", json.dumps([_chapter(1), _chapter(2)]), [], [_chapter(1), _chapter(2)], 0, 0),
+    "fenced": (
+        "chapter_list", "```json\n" + json.dumps([_chapter(1)]) + "\n```", [], [_chapter(1)], 0, 0),
+    "list wrapped in an object": (
+        "chapter_list", json.dumps({"chapters": [_chapter(1)]}), [], [_chapter(1)], 0, 0),
+    "truncated": (
+        "chapter_list", json.dumps([_chapter(1), _chapter(2)])[:-20], [json.dumps(_chapter(2))],
+        [_chapter(1), _chapter(2)], 1, 0),
+    "one bad item": (
+        "chapter_list", json.dumps([_chapter(1), {"chapter_number": 2}, _chapter(3)]), [json.dumps(_chapter(2))],
+        [_chapter(1), _chapter(2), _chapter(3)], 1, 0),
+    "one malformed item": (
+        "chapter_list", '[' + json.dumps(_chapter(1)) + ', {"chapter_number": 2,, }, ' + json.dumps(_chapter(3)) + ']',
+        [json.dumps(_chapter(2))], [_chapter(1), _chapter(2), _chapter(3)], 1, 0),
+    "repair fails": (
+        "chapter_list", json.dumps([_chapter(1), {"chapter_number": 2}]), ["not json"], [_chapter(1)], 1, 1),
+    "over budget": (
+        "chapter_list", json.dumps([{"chapter_number": n} for n in range(1, MAX_REPAIRS + 3)]),
+        [json.dumps(_chapter(n)) for n in range(1, MAX_REPAIRS + 1)],
+        [_chapter(n) for n in range(1, MAX_REPAIRS + 1)], MAX_REPAIRS, 2),
+    # Items and top-level fields draw on one budget: overall_score is not asked for
+    "budget shared with fields": (
+        "text_grades", json.dumps({"grades": [{"question_number": n} for n in range(1, MAX_REPAIRS + 1)]}),
+        [json.dumps(_grade(n)) for n in range(1, MAX_REPAIRS + 1)],
+        {"grades": [_grade(n) for n in range(1, MAX_REPAIRS + 1)]}, MAX_REPAIRS, 0),
+    "bad field": (
+        "final_project_content", json.dumps({"details": "d", "goals": 3, "guidelines": "g"}), ['{"goals": "Build it"}'],
+        {"details": "d", "goals": "Build it", "guidelines": "g"}, 1, 0),
+}
+
+# name -> (task, model response, repair replies) that cannot be recovered
+UNRECOVERABLE_CASES = {
+    "no JSON": ("chapter_list", "Sorry, I cannot help with that.", []),
+    "truncated object": ("programming_exercise", '{"starter_files": {"main.py": "print(', []),
+    "no usable items": ("chapter_list", json.dumps([{"chapter_number": 1}]), ["still wrong"]),
+}
+
+
+class StructuredOutputTests(SimpleTestCase):
+    """Parsing and per-item repair of structured model output (llm_utils)."""
+
+    def test_split_elements(self):
+        for name, (text, expected) in SPLIT_CASES.items():
+            with self.subTest(name):
+                self.assertEqual(_split_elements(text, 0), expected)
+
+    def test_parse_and_repair(self):
+        for name, (task, content, replies, expected, repairs, dropped) in PARSE_CASES.items():
+            with self.subTest(name):
+                client = FakeClient(*replies)
+                document, state = _parse_structured(client, "test-model", task, content, "context")
+                self.assertEqual(document, expected)
+                self.assertEqual(state["repairs"], repairs)
+                self.assertEqual(state["dropped"], dropped)
+                self.assertEqual(len(client.calls), repairs)
+
+    def test_unrecoverable(self):
+        for name, (task, content, replies) in UNRECOVERABLE_CASES.items():
+            with self.subTest(name):
+                with self.assertRaises(StructuredOutputError):
+                    _parse_structured(FakeClient(*replies), "test-model", task, content, "context")
+
+
+@override_settings(LLM_TIER_MODELS={"standard": ["model-a", "model-b", "model-c"]}, LLM_TASK_TIERS={}, LLM_TASK_MODELS={})
+class ModelRoutingTests(SimpleTestCase):
+    """select_model: warm-up in tier order, the quality floor and exploration."""
+    task = "quiz"
+
+    def setUp(self):
+        llm_utils._model_stats.clear()
+        self.addCleanup(llm_utils._model_stats.clear)
+        explore = mock.patch.object(llm_utils, "EXPLORE_RATE", 0.0)
+        explore.start()
+        self.addCleanup(explore.stop)
+
+    def record(self, model, latency, quality=1.0, calls=llm_utils.MIN_SAMPLES):
+        for _ in range(calls):
+            llm_utils.record_call(self.task, model, latency, completion_tokens=100, quality=quality)
+
+    def test_warm_up_keeps_tier_order(self):
+        self.assertEqual(llm_utils.select_model(self.task), "model-a")
+        self.record("model-a", 9.0)
+        self.record("model-b", 1.0)
+        self.record("model-c", 0.5, calls=llm_utils.MIN_SAMPLES - 1)
+        # model-c is still warming up, so the tier's first choice wins despite being slowest
+        self.assertEqual(llm_utils.select_model(self.task), "model-a")
+        self.record("model-c", 0.5, calls=1)
+        self.assertEqual(llm_utils.select_model(self.task), "model-c")
+
+    def test_quality_floor_falls_back_to_next_model(self):
+        self.record("model-a", 0.5, quality=llm_utils.QUALITY_FLOOR / 2)
+        self.record("model-b", 1.0)
+        self.record("model-c", 2.0)
+        self.assertEqual(llm_utils.select_model(self.task), "model-b")
+        self.record("model-b", 1.0, quality=0.0)
+        self.assertEqual(llm_utils.select_model(self.task), "model-c")
+        # Nothing meets the floor: the tier's first choice
+        self.record("model-c", 2.0, quality=0.0)
+        self.assertEqual(llm_utils.select_model(self.task), "model-a")
+
+    def test_exploration_is_seeded(self):
+        self.record("model-a", 0.5)
+        self.record("model-b", 1.0)
+        self.record("model-c", 2.0)
+        rate = 0.25
+        candidates = llm_utils.candidate_models(self.task)
+        replay = random.Random(1234)
+        expected = [replay.choice(candidates) if replay.random() < rate else "model-a" for _ in range(200)]
+        llm_utils._rng.seed(1234)
+        with mock.patch.object(llm_utils, "EXPLORE_RATE", rate):
+            picks = [llm_utils.select_model(self.task) for _ in range(200)]
+        self.assertEqual(picks, expected)
+        self.assertTrue({"model-b", "model-c"} & set(picks))
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Two concurrent callers with one key share one run of the work."""
+
+    def run_pair(self, fn):
+        group = SingleFlight("test")
+        started, release = threading.Event(), threading.Event()
+        runs, outcomes = [], {}
+
+        def work():
+            runs.append(1)
+            started.set()
+            release.wait(5)
+            return fn()
+
+        def caller(name):
+            try:
+                outcomes[name] = group.do("key", work)
+            except Exception as e:
+                outcomes[name] = e
+
+        leader = threading.Thread(target=caller, args=("leader",))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=caller, args=("follower",))
+        follower.start()
+        while group.stats["coalesced"] < 1:
+            time.sleep(0.001)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(group.in_flight(), 0)
+        return outcomes["leader"], outcomes["follower"]
+
+    def test_result_is_shared_as_independent_copies(self):
+        leader, follower = self.run_pair(lambda: {"items": [1, 2]})
+        self.assertEqual(leader, follower)
+        self.assertIsNot(leader, follower)
+        leader["items"].append(3)
+        self.assertEqual(follower, {"items": [1, 2]})
+
+    def test_exception_reaches_every_caller(self):
+        def fail():
+            raise ValueError("upstream down")
+        leader, follower = self.run_pair(fail)
+        self.assertIsInstance(leader, ValueError)
+        self.assertIsInstance(follower, ValueError)
+        self.assertEqual(str(follower), "upstream down")
+
+
+class AIMDLimiterTests(SimpleTestCase):
+    """A coroutine cancelled while waiting for a slot does not keep it."""
+
+    def test_cancelled_waiter_hands_back_its_slot(self):
+        limiter = AIMDLimiter("test", initial=1)
+        limiter.acquire()
+
+        async def wait_then_cancel():
+            async def use():
+                async with limiter.aslot():
+                    pass
+            task = asyncio.create_task(use())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The waiting thread only gets the slot now, after its coroutine has gone
+            limiter.release()
+            for _ in range(500):
+                if limiter.stats["calls"] == 2 and limiter.snapshot()["in_flight"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+
+        asyncio.run(wait_then_cancel())
+        self.assertEqual(limiter.stats["calls"], 2)
+        self.assertEqual(limiter.snapshot()["in_flight"], 0)
+        limiter.acquire()
+        self.assertEqual(limiter.snapshot()["in_flight"], 1)
+
+
+class RouteRetryTests(TestCase):
+    """Throttling reaches the limiter and is retried by _route, not by the SDK."""
+    messages = [{"role": "user", "content": "Hello"}]
+
+    def setUp(self):
+        saved = dict(llm_utils._budgets)
+        self.addCleanup(llm_utils._budgets.update, saved)
+        llm_utils._budgets["loaded_at"] = time.monotonic()
+        backoff = mock.patch.object(llm_utils, "ROUTE_BACKOFF", 0.0)
+        backoff.start()
+        self.addCleanup(backoff.stop)
+
+    def test_throttled_calls_are_retried(self):
+        primary, secondary = FakeClient(StatusError(429), "Hi"), FakeClient(StatusError(503))
+        throttled = llm_utils.limiter("cerebras").stats["throttled"]
+        llm, _model, completion, _latency = llm_utils._route(
+            "chat", self.messages, [primary, secondary], lambda m: {}, model="model-a")
+        self.assertIs(llm, primary)
+        self.assertEqual(completion.choices[0].message.content, "Hi")
+        self.assertEqual(llm_utils.limiter("cerebras").stats["throttled"], throttled + 2)
+
+    def test_other_errors_are_not_retried(self):
+        primary = FakeClient(StatusError(401), "Hi")
+        with self.assertRaises(Exception):
+            llm_utils._route("chat", self.messages, [primary], lambda m: {}, model="model-a")
+        self.assertEqual(len(primary.calls), 1)
+
+
+IMPORT_PROBE = """
+import json, sys
+import django
+django.setup()
+from generation import providers, search_utils, views
+sdks = lambda: sorted(name for name in ("cerebras.cloud.sdk", "pinecone", "tavily") if name in sys.modules)
+report = {"loaded": providers.loaded(), "sdks": sdks()}
+search_utils.tavily_client()
+report.update(after=providers.loaded(), sdks_after=sdks())
+print(json.dumps(report))
+"""
+
+
+class ProviderRegistryTests(SimpleTestCase):
+    """SDK clients are built on first use, not when the views are imported."""
+
+    def test_import_builds_no_clients(self):
+        # A fresh interpreter, since this one has already imported everything
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "courseAI.settings", "TAVILY_API_KEY": "test-key"}
+        result = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual((report["loaded"], report["sdks"]), ([], []))
+        self.assertEqual((report["after"], report["sdks_after"]), (["tavily"], ["tavily"]))
+
+
+class MetricsTests(TestCase):
+    """The metrics endpoint is for staff only."""
+
+    def test_staff_only(self):
+        url = reverse("generation:provider_metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create(username="learner"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create(username="admin", is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("limiters", response.json())
+
+
+class LocalVectorIndexTests(SimpleTestCase):
+    """Re-syncing a namespace swaps versions without breaking queries or leaking mappings."""
+    query = {"inputs": {"text": "python loops"}, "top_k": 3}
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def sync(self, tag):
+        records = [{"_id": f"{tag}-{i}", "fields": {"chunk_text": f"python loops lesson {i}"}} for i in range(20)]
+        write_namespace(self.root, "docs", records)
+
+    def first_hit(self, index):
+        return index.search("docs", self.query)["result"]["hits"][0]["_id"]
+
+    def test_queries_during_resync(self):
+        self.sync("old")
+        index = LocalVectorIndex(self.root)
+        self.assertTrue(self.first_hit(index).startswith("old-"))
+        held = index._checkout("docs")
+        errors, done = [], threading.Event()
+
+        def query():
+            while not done.is_set():
+                try:
+                    self.first_hit(index)
+                except Exception as e:
+                    errors.append(e)
+
+        readers = [threading.Thread(target=query) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        for n in range(5):
+            self.sync(f"new{n}")
+        done.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(self.first_hit(index).startswith("new4-"))
+        # The replaced version stays usable until its last search checks in, then is unmapped
+        self.assertTrue(held.retired)
+        self.assertEqual(held.record(0)["_id"], "old-0")
+        index._checkin(held)
+        self.assertIsNone(held.vectors)
+        self.assertTrue(held.meta.closed)
+
+    def test_version_pruned_before_it_is_opened(self):
+        self.sync("old")
+        stale = vector_index.current_version(self.root, "docs")
+        self.sync("new0")
+        self.sync("new1")
+        self.assertFalse(stale[0].exists())
+        index = LocalVectorIndex(self.root)
+        real = vector_index.current_version
+        calls = iter([stale])
+        with mock.patch.object(vector_index, "current_version", lambda *a: next(calls, None) or real(*a)):
+            self.assertTrue(self.first_hit(index).startswith("new1-"))
+
+
+class SearchResponse:
+    """Stands in for a Pinecone SDK response model."""
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def to_dict(self):
+        return {"result": {"hits": self.hits}}
+
+
+class RetrievalCacheTests(SimpleTestCase):
+    """Vector results are cached per normalised query and dropped when their namespace changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def search(self, index, text, fields=("chunk_text", "category"), namespace="docs"):
+        def run():
+            self.calls.append(text)
+            if index is not None:
+                return index.search(namespace, {"inputs": {"text": text}, "top_k": 3})
+            return SearchResponse([{"_id": f"hit-{len(self.calls)}"}])
+        return retrieval_cache.cached_search(index, namespace, text, 3, list(fields), run)
+
+    def test_case_and_whitespace_share_an_entry(self):
+        hits = retrieval_cache.retrieval_cache_stats()["hits"]
+        first = self.search(None, "Python  list\ncomprehensions")
+        for text in ["python list comprehensions", "  PYTHON List Comprehensions "]:
+            self.assertEqual(self.search(None, text, fields=("category", "chunk_text")), first)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(retrieval_cache.retrieval_cache_stats()["hits"], hits + 2)
+        self.search(None, "python list comprehensions", fields=("chunk_text",))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_invalidate_namespace(self):
+        self.search(None, "python loops")
+        self.search(None, "python loops", namespace="other")
+        retrieval_cache.invalidate_namespace("docs")
+        self.assertEqual(self.search(None, "python loops"), {"result": {"hits": [{"_id": "hit-3"}]}})
+        self.search(None, "python loops", namespace="other")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_local_resync_changes_the_version(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+
+        def records(tag):
+            return [{"_id": f"{tag}-{i}", "fields": {"chunk_text": f"python loops {i}"}} for i in range(5)]
+
+        write_namespace(root, "docs", records("old"))
+        index = LocalVectorIndex(root)
+        self.search(index, "python loops")
+        self.assertTrue(self.search(index, "python loops")["result"]["hits"][0]["_id"].startswith("old-"))
+        write_namespace(root, "docs", records("new"))
+        self.assertTrue(self.search(index, "python loops")["result"]["hits"][0]["_id"].startswith("new-"))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_sdk_responses_are_cached_as_dicts(self):
+        for _ in range(2):
+            result = self.search(None, "python loops")
+            self.assertIs(type(result), dict)
+            self.assertEqual(result, {"result": {"hits": [{"_id": "hit-1"}]}})
+        self.assertEqual(len(self.calls), 1)
+
+
+class StubTavily:
+    """Counts the clients built and the searches sent; searches are slow enough to overlap."""
+    built = 0
+
+    def __init__(self):
+        StubTavily.built += 1
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query)
+        time.sleep(0.2)
+        slug = "-".join(query.lower().split())
+        return {"results": [{"url": f"https://example.com/{slug}", "title": query, "score": 0.9}]}
+
+
+@mock.patch.dict(os.environ, {"TAVILY_API_KEY": "test-key"})
+class TavilySearchTests(TransactionTestCase):
+    """Lesson source lookups share one client, coalesce identical queries and reuse cached results."""
+
+    def setUp(self):
+        StubTavily.built = 0
+        saved = providers._factories["tavily"]
+        providers.register("tavily", StubTavily)
+        self.addCleanup(providers.register, "tavily", saved)
+
+    def test_pooled_batched_and_cached(self):
+        queries = ["Python loops", "python  LOOPS", "python loops ", "Python sets"]
+        sources = get_best_sources(["q"] * len(queries), queries=queries)
+        stub = providers.get("tavily")
+        self.assertEqual(StubTavily.built, 1)
+        # The three spellings of one query ran together and shared a single request
+        self.assertEqual(len(stub.queries), 2)
+        self.assertEqual(len({source["url"] for source in sources[:3]}), 1)
+        self.assertNotEqual(sources[3]["url"], sources[0]["url"])
+
+        again = get_best_sources(["q"] * 2, queries=["PYTHON LOOPS", "python sets"])
+        self.assertEqual(again, [sources[0], sources[3]])
+        self.assertEqual(len(stub.queries), 2)
+        self.assertEqual(StubTavily.built, 1)
+        self.assertEqual(WebSearchCache.objects.get(text="python loops").hits, 1)
+
+
+@mock.patch.dict(os.environ, {"TAVILY_API_KEY": "test-key"})
+class LessonDigestTests(TransactionTestCase):
+    """The article, web source and video lookups for a lesson share one main-idea extraction."""
+
+    def setUp(self):
+        cache.clear()
+        saved = providers._factories["tavily"]
+        providers.register("tavily", StubTavily)
+        self.addCleanup(providers.register, "tavily", saved)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        write_namespace(self.root, "pennapps", [{"_id": "doc-0", "fields": {"chunk_text": "python list comprehensions"}}])
+        self.calls = []
+
+    def llm(self, task, messages, client, **kwargs):
+        self.calls.append(task)
+        if task == "lesson_digest":
+            return {"main_ideas": "list comprehensions, filtering", "keywords": ["lists"],
+                    "search_query": "how do python list comprehensions work",
+                    "video_query": "python list comprehensions tutorial"}
+        return f"{task} text"
+
+    def test_lookups_share_one_digest(self):
+        _, (lesson,) = _course(lessons=1, lesson_type="art")
+        index = LocalVectorIndex(self.root)
+        with mock.patch.object(digest_utils, "complete_structured", self.llm), \
+                mock.patch.object(search_utils, "complete_text", self.llm), \
+                mock.patch.object(views, "complete_text", self.llm), \
+                mock.patch.object(views, "generate_youtube_query", lambda lesson: self.llm("youtube_query", [], None)), \
+                mock.patch.object(views, "index", index), \
+                mock.patch.object(index, "search", wraps=index.search) as search:
+            digest = lesson_digests([lesson])[lesson.id]
+            self.assertEqual(views.ai_gen_article(lesson), "article text")
+            sources = get_best_sources(["Comprehensions"], queries=[digest.search_query])
+            video_query = views.youtube_query_for_lesson(lesson)
+        self.assertEqual(self.calls, ["lesson_digest", "article"])
+        self.assertEqual(search.call_args.kwargs["query"]["inputs"]["text"], "list comprehensions, filtering")
+        self.assertEqual(providers.get("tavily").queries, ["how do python list comprehensions work"])
+        self.assertTrue(sources[0]["url"])
+        self.assertEqual(video_query, {"query": "python list comprehensions tutorial"})
+        self.assertEqual(LessonDigest.objects.filter(lesson=lesson).count(), 1)
+
+
+class TokenBudgetTests(TestCase):
+    """Budgets and samples stay off the LLM call path."""
+
+    def setUp(self):
+        saved = dict(llm_utils._budgets)
+        self.addCleanup(llm_utils._budgets.update, saved)
+        llm_utils._samples["pending"].clear()
+        llm_utils._samples["flushed_at"] = time.monotonic()
+
+    def test_stale_budgets_refresh_in_background(self):
+        llm_utils._budgets.update(values={}, loaded_at=0.0)
+        with mock.patch.object(llm_utils, "_refresh_in_background") as refresh:
+            with self.assertNumQueries(0):
+                first = llm_utils.token_budget("quiz")
+                second = llm_utils.token_budget("quiz")
+            for thread in threading.enumerate():
+                if thread.name == "token-budget-refresh":
+                    thread.join()
+        self.assertEqual(first, second)
+        self.assertEqual(first, llm_utils.DEFAULT_TOKEN_BUDGETS["quiz"])
+        refresh.assert_called_once_with()
+
+    def test_samples_are_written_in_batches(self):
+        for _ in range(llm_utils.SAMPLE_FLUSH_SIZE - 1):
+            llm_utils._record_sample("quiz", "model-a", 100, 0.5, False)
+        self.assertEqual(LLMCallSample.objects.count(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            llm_utils._record_sample("quiz", "model-a", 100, 0.5, False)
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("INSERT")]), 1)
+        self.assertEqual(LLMCallSample.objects.count(), llm_utils.SAMPLE_FLUSH_SIZE)
+
+
+class FakeYouTube:
+    """Answers search.list and videos.list like the YouTube Data API and records the calls."""
+
+    def __init__(self):
+        self.searches, self.videos_calls = [], []
+
+    def get(self, url, params):
+        if url == youtube_utils.YOUTUBE_SEARCH_URL:
+            self.searches.append(params["q"])
+            ids = [f"{params['q']}-{i}" for i in range(3)] + ["shared"]
+            return {"items": [{"id": {"kind": "youtube#video", "videoId": vid}, "snippet": {"title": vid}} for vid in ids]}
+        ids = params["id"].split(",")
+        self.videos_calls.append(ids)
+        return {"items": [{"id": vid, "statistics": {"likeCount": "9" if vid.endswith("-1") else "1", "viewCount": "5"}}
+                          for vid in ids]}
+
+
+@override_settings(YOUTUBE_DAILY_QUOTA=250, YOUTUBE_QUOTA_RESERVE=50)
+class YouTubeQuotaTests(TestCase):
+    """Searches and statistics are served from their caches within the TTL and refused past the daily budget."""
+
+    def setUp(self):
+        self.youtube = FakeYouTube()
+        patcher = mock.patch.object(youtube_utils, "_get", self.youtube.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, q):
+        return youtube_utils._cached_search({"part": "snippet", "q": q})
+
+    def test_search_refused_once_quota_is_spent(self):
+        self.assertTrue(self.search("python lists"))
+        self.assertTrue(self.search("python loops"))
+        # 200 of 250 units used; the rest is the reserve
+        self.assertEqual(self.search("python sets"), [])
+        self.assertEqual(len(self.youtube.searches), 2)
+        usage = youtube_utils.quota_usage()
+        self.assertEqual((usage["units"], usage["refused_calls"]), (200, 1))
+        # Out of quota, an expired entry is still better than nothing
+        YouTubeSearchCache.objects.update(fetched_at=timezone.now() - timedelta(days=30))
+        self.assertEqual([item["id"]["videoId"] for item in self.search("python lists")][0], "python lists-0")
+        self.assertEqual(len(self.youtube.searches), 2)
+
+    def test_search_cache_ttl(self):
+        first = self.search("python lists")
+        self.assertEqual(self.search("python lists"), first)
+        self.assertEqual(len(self.youtube.searches), 1)
+        YouTubeSearchCache.objects.update(
+            fetched_at=timezone.now() - timedelta(seconds=youtube_utils.DEFAULT_SEARCH_TTL + 1))
+        self.search("python lists")
+        self.assertEqual(len(self.youtube.searches), 2)
+
+    def test_statistics_cache_ttl(self):
+        stats = youtube_utils.video_statistics(["a-1", "b-2"])
+        self.assertEqual(youtube_utils.video_statistics(["a-1", "b-2"]), stats)
+        self.assertEqual(len(self.youtube.videos_calls), 1)
+        VideoCatalog.objects.update(
+            stats_fetched_at=timezone.now() - timedelta(seconds=youtube_utils.DEFAULT_STATS_TTL + 1))
+        youtube_utils.video_statistics(["a-1", "b-2"])
+        self.assertEqual(len(self.youtube.videos_calls), 2)
+
+
+class QuotaRaceTests(TransactionTestCase):
+    """Concurrent charges never take the day's spending past the limit."""
+
+    @override_settings(YOUTUBE_DAILY_QUOTA=350, YOUTUBE_QUOTA_RESERVE=50, SQLITE_WRITE_QUEUE=False)
+    def test_concurrent_charges_stop_at_the_limit(self):
+        start = threading.Barrier(8)
+        charged = []
+
+        def charge():
+            try:
+                start.wait(5)
+                charged.append(youtube_utils.charge_quota(youtube_utils.SEARCH_COST, "search"))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=charge) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(sorted(charged), [False] * 5 + [True] * 3)
+        usage = YouTubeQuotaUsage.objects.get()
+        self.assertEqual((usage.units, usage.search_calls, usage.refused_calls), (300, 3, 5))
+
+
+class VideoSearchTests(TransactionTestCase):
+    """A course's video lessons are searched first and ranked from one deduplicated statistics call."""
+
+    def _video_lessons(self):
+        _, lessons = _course(chapters=2, lessons=2, lesson_type="vid", status="generating")
+        for lesson in lessons:
+            LessonDigest.objects.create(lesson=lesson, main_ideas="m", search_query="s",
+                                        video_query=f"python topic {lesson.chapter.chapter_number}.{lesson.lesson_number}")
+        return lessons
+
+    def test_statistics_are_fetched_once_for_all_lessons(self):
+        lessons = self._video_lessons()
+        youtube = FakeYouTube()
+        batches = writer.snapshot()["batches"]
+        with mock.patch.object(youtube_utils, "_get", youtube.get):
+            results = search_youtube_for_lessons(lessons)
+        # Catalog, cache, quota and link writes from the search threads all went through the writer
+        self.assertGreater(writer.snapshot()["batches"], batches)
+        self.assertEqual(len(youtube.searches), 4)
+        self.assertEqual(len(youtube.videos_calls), 1)
+        ids = youtube.videos_calls[0]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(len(ids), 4 * 3 + 1)
+        for lesson in lessons:
+            picked = results[lesson.id]["items"][0]["id"]["videoId"]
+            self.assertEqual(picked, f"python topic {lesson.chapter.chapter_number}.{lesson.lesson_number}-1")
+            self.assertEqual(YouTubeVideo.objects.filter(lesson=lesson).count(), 1)
+
+    def test_failed_link_is_retried(self):
+        lessons = self._video_lessons()
+        link, failed = views.link_lesson_videos, set()
+
+        def flaky_link(lesson, yt_results):
+            if lesson.id not in failed:
+                failed.add(lesson.id)
+                raise OperationalError("database is locked")
+            link(lesson, yt_results)
+
+        with mock.patch.object(youtube_utils, "_get", FakeYouTube().get), \
+                mock.patch.object(views, "link_lesson_videos", flaky_link), \
+                mock.patch.object(views, "LINK_BACKOFF", 0.0):
+            results = search_youtube_for_lessons(lessons)
+        self.assertEqual(set(results), {lesson.id for lesson in lessons})
+        for lesson in lessons:
+            self.assertEqual(YouTubeVideo.objects.filter(lesson=lesson).count(), 1)
+
+    def test_shared_video_is_stored_once(self):
+        _, lessons = _course(lessons=2, lesson_type="vid")
+        item = {"id": {"kind": "youtube#video", "videoId": "abc"}, "snippet": {"title": "Python loops"}}
+        for lesson in lessons + lessons[:1]:
+            views.link_lesson_videos(lesson, {"items": [item]})
+        entry = VideoCatalog.objects.get()
+        self.assertEqual((entry.video_id, entry.title), ("abc", "Python loops"))
+        self.assertEqual(sorted(entry.lesson_videos.values_list("lesson_id", flat=True)), [l.id for l in lessons])
+
+        self.client.force_login(User.objects.create(username="admin", is_staff=True, is_superuser=True))
+        response = self.client.get(reverse("admin:generation_videocatalog_changelist"))
+        self.assertContains(response, '<td class="field-lesson_count">2</td>', html=True)
+        self.assertEqual(self.client.get(reverse("admin:generation_youtubevideo_changelist")).status_code, 200)
+
+
+class CourseTreeTests(TestCase):
+    """The cached course tree walks lessons in course order across chapters."""
+
+    def setUp(self):
+        cache.clear()
+        self.course, lessons = _course(chapters=3, lessons=2)
+        # An empty chapter in the middle is stepped over
+        GeneratedLesson.objects.filter(chapter__chapter_number=2).delete()
+        self.lessons = [lesson for lesson in lessons if lesson.chapter.chapter_number != 2]
+        number_lessons(self.course.id)
+
+    def test_previous_and_next(self):
+        tree = course_tree(self.course.id)
+        ids = [lesson.id for lesson in self.lessons]
+        self.assertEqual([lesson.id for lesson in tree.lessons], ids)
+        self.assertIsNone(tree.previous(ids[0]))
+        self.assertIsNone(tree.next(ids[-1]))
+        self.assertEqual(tree.next(ids[1]).id, ids[2])
+        self.assertEqual(tree.previous(ids[2]).id, ids[1])
+        self.assertEqual((tree.next(ids[1]).chapter_number, tree.previous(ids[2]).chapter_number), (3, 1))
+        unknown = max(ids) + 1
+        self.assertEqual((tree.lesson(unknown), tree.previous(unknown), tree.next(unknown)), (None, None, None))
+
+    def test_lookup_by_id(self):
+        with self.assertNumQueries(1):
+            tree = build_course_tree(self.course.id)
+        self.assertEqual((tree.total_chapters, tree.total_lessons), (3, 4))
+        self.assertEqual([len(chapter.lessons) for chapter in tree.chapters], [2, 0, 2])
+        ordinals = dict(GeneratedLesson.objects.filter(chapter__course_generation=self.course)
+                        .values_list("id", "ordinal"))
+        for position, lesson in enumerate(self.lessons):
+            node = tree.lesson(lesson.id)
+            self.assertEqual((node.position, node.ordinal, node.name), (position, ordinals[lesson.id], lesson.lesson_name))
+        self.assertFalse(hasattr(tree.lessons[0], "__dict__"))
+        self.assertFalse(hasattr(tree.chapters[0], "__dict__"))
+
+
+def _learner_request(user=None, session=None):
+    request = RequestFactory().get("/")
+    request.user = user or AnonymousUser()
+    request.session = session or SessionStore()
+    return request
+
+
+class ProgressTests(TestCase):
+    """Per-learner completion bitsets (generation/progress.py) and what is shown from them."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tick_after_lessons_are_numbered(self):
+        course, lessons = _course()
+        # The tree is cached while every ordinal is still None
+        self.assertNotIn('class="complete-indicator"', sidebar_html(course.id, lessons[1].id))
+        request = _learner_request()
+        lesson = GeneratedLesson.objects.select_related("chapter").get(id=lessons[1].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(mark_complete(request, lesson))
+        html = sidebar_html(course.id, lesson.id, completed_bits(request, course.id))
+        self.assertEqual(html.count('class="complete-indicator"'), 1)
+        self.assertIn(f'data-lesson-id="{lesson.id}">', html.split('class="complete-indicator"')[0].rsplit("<li", 1)[-1])
+
+    def test_revisiting_a_completed_lesson_writes_nothing(self):
+        course, lessons = _course()
+        number_lessons(course.id)
+        user = User.objects.create(username="learner")
+        lesson = GeneratedLesson.objects.select_related("chapter").get(id=lessons[0].id)
+        self.assertTrue(mark_complete(_learner_request(user), lesson))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(mark_complete(_learner_request(user), lesson))
+        self.assertEqual([q["sql"] for q in queries if not q["sql"].startswith("SELECT")], [])
+        self.assertEqual(CourseProgress.objects.get(user=user).completed_count, 1)
+
+    def test_anonymous_learners_are_keyed_by_session(self):
+        course, lessons = _course()
+        number_lessons(course.id)
+        first, second = SessionStore(), SessionStore()
+        lesson = GeneratedLesson.objects.select_related("chapter").get(id=lessons[1].id)
+        self.assertEqual(completed_bits(_learner_request(session=first), course.id), b"")
+        self.assertTrue(mark_complete(_learner_request(session=first), lesson))
+        self.assertTrue(mark_complete(_learner_request(session=second), lesson))
+        self.assertEqual(CourseProgress.objects.filter(course=course, user=None).count(), 2)
+        progress = CourseProgress.objects.get(session_key=first.session_key)
+        self.assertEqual(bytes(progress.completed), b"\x02")
+        self.assertEqual(completed_bits(_learner_request(session=first), course.id), b"\x02")
+        self.assertEqual(completed_bits(_learner_request(), course.id), b"")
+
+    def test_course_detail_percentage_is_per_learner(self):
+        course, lessons = _course(chapters=2, lessons=2)
+        recount_course(course)
+        number_lessons(course.id)
+        user = User.objects.create(username="learner")
+        self.client.force_login(user)
+        self.client.get(reverse("generation:lesson_article", args=[lessons[2].id]))
+        self.assertEqual(self.client.get(reverse("generation:course_detail", args=[course.id]))
+                         .context["completion_percentage"], 25)
+        self.client.logout()
+        response = self.client.get(reverse("generation:course_detail", args=[course.id]))
+        self.assertEqual(response.context["completion_percentage"], 0)
+        self.assertEqual(response.context["completed_lesson_ids"], set())
+
+
+class ConcurrentProgressTests(TransactionTestCase):
+    """Learners completing lessons from several threads at once keep every bit."""
+
+    def test_concurrent_completions_keep_every_bit(self):
+        course, lessons = _course(chapters=2, lessons=8)
+        number_lessons(course.id)
+        user = User.objects.create(username="learner")
+        lessons = list(GeneratedLesson.objects.select_related("chapter").filter(chapter__course_generation=course))
+        start = threading.Barrier(2)
+        errors = []
+
+        def complete(share):
+            try:
+                start.wait(5)
+                for lesson in share:
+                    mark_complete(_learner_request(user), lesson)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=complete, args=(lessons[n::2],)) for n in (0, 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(errors, [])
+        progress = CourseProgress.objects.get(course=course, user=user)
+        self.assertEqual(bytes(progress.completed), b"\xff\xff")
+        self.assertEqual(progress.completed_count, 16)
+
+
+class CourseCounterTests(TestCase):
+    """Course and chapter totals stored by recount_course and kept current by signals."""
+
+    def setUp(self):
+        cache.clear()
+        self.course, self.lessons = _course(chapters=2, lessons=3)
+        for lesson, lesson_type in zip(self.lessons, ["txt", "vid", "mcq", "txt", "vid", "txt"]):
+            GeneratedLesson.objects.filter(id=lesson.id).update(lesson_type=lesson_type)
+        # What generate_course does once every chapter is saved
+        recount_course(self.course)
+
+    def detail(self):
+        context = self.client.get(reverse("generation:course_detail", args=[self.course.id])).context
+        return context["total_chapters"], context["total_lessons"], context["lesson_type_counts"]
+
+    def test_totals_after_generation(self):
+        self.assertEqual(self.detail(), (2, 6, {"txt": 3, "vid": 2, "mcq": 1}))
+        self.assertEqual(list(self.course.chapters.order_by("chapter_number").values_list("total_lessons", flat=True)),
+                         [3, 3])
+
+    def test_totals_after_deletes(self):
+        GeneratedLesson.objects.get(id=self.lessons[1].id).delete()
+        self.assertEqual(self.detail(), (2, 5, {"txt": 3, "vid": 1, "mcq": 1}))
+        self.assertEqual(self.course.chapters.get(chapter_number=1).total_lessons, 2)
+        self.course.chapters.get(chapter_number=2).delete()
+        self.assertEqual(self.detail(), (1, 2, {"txt": 1, "mcq": 1}))
+
+    def test_recount_queries_do_not_grow_with_chapters(self):
+        counts = []
+        for chapters in (1, 5):
+            course, _lessons = _course(chapters=chapters)
+            with CaptureQueriesContext(connection) as queries:
+                recount_course(course)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Builds rows with the models as of one migration, then applies the next."""
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([("generation", target)])
+        return executor.loader.project_state([("generation", target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class CounterBackfillTests(MigrationTestCase):
+    """0019 fills every course's counters, including courses that never finished generating."""
+
+    def test_backfill(self):
+        apps = self.migrate("0018_video_catalog")
+        Course = apps.get_model("generation", "CourseGeneration")
+        Chapter = apps.get_model("generation", "GeneratedChapter")
+        Lesson = apps.get_model("generation", "GeneratedLesson")
+        course = Course.objects.create(user_prompt="Python", status="failed")
+        for number, types in [(1, ["txt", "vid"]), (2, ["txt"]), (3, [])]:
+            chapter = Chapter.objects.create(course_generation=course, chapter_number=number,
+                                             chapter_name=f"Chapter {number}", chapter_description="About it")
+            for n, lesson_type in enumerate(types, 1):
+                Lesson.objects.create(chapter=chapter, lesson_number=n, lesson_type=lesson_type, lesson_name="l",
+                                      lesson_description="d", lesson_details="d", lesson_goals="g", is_complete=n == 1)
+        apps = self.migrate("0019_course_counters")
+        course = apps.get_model("generation", "CourseGeneration").objects.get(id=course.id)
+        self.assertEqual((course.total_chapters, course.total_lessons, course.completed_lessons), (3, 3, 2))
+        self.assertEqual(course.lesson_type_counts, {"txt": 2, "vid": 1})
+        chapters = apps.get_model("generation", "GeneratedChapter").objects.filter(course_generation_id=course.id)
+        self.assertEqual(sorted(chapters.values_list("chapter_number", "total_lessons", "completed_lessons")),
+                         [(1, 2, 1), (2, 1, 1), (3, 0, 0)])
+
+
+class VideoCatalogMigrationTests(MigrationTestCase):
+    """0018 folds the per-lesson copies of a video into one catalog row and keeps the cached statistics."""
+
+    def test_copies_are_folded(self):
+        apps = self.migrate("0017_youtube_cache_quota")
+        Chapter = apps.get_model("generation", "GeneratedChapter")
+        Lesson = apps.get_model("generation", "GeneratedLesson")
+        Video = apps.get_model("generation", "YouTubeVideo")
+        course = apps.get_model("generation", "CourseGeneration").objects.create(user_prompt="Python")
+        chapter = Chapter.objects.create(course_generation=course, chapter_number=1,
+                                         chapter_name="Chapter 1", chapter_description="About it")
+        first, second = [Lesson.objects.create(chapter=chapter, lesson_number=n, lesson_type="vid", lesson_name="l",
+                                               lesson_description="d", lesson_details="d", lesson_goals="g")
+                         for n in (1, 2)]
+        for lesson, vid in [(first, "abc"), (first, "abc"), (second, "abc"), (second, "xyz")]:
+            Video.objects.create(lesson=lesson, video_id=vid, title=f"Title {vid}", channel_title="Channel")
+        fetched_at = timezone.now()
+        Stats = apps.get_model("generation", "YouTubeStatsCache")
+        Stats.objects.create(video_id="abc", statistics={"viewCount": "10"}, fetched_at=fetched_at)
+        Stats.objects.create(video_id="old", statistics={"viewCount": "3"}, fetched_at=fetched_at)
+
+        apps = self.migrate("0018_video_catalog")
+        catalog = {entry.video_id: entry for entry in apps.get_model("generation", "VideoCatalog").objects.all()}
+        self.assertEqual(set(catalog), {"abc", "xyz", "old"})
+        self.assertEqual((catalog["abc"].title, catalog["abc"].channel_title), ("Title abc", "Channel"))
+        self.assertEqual((catalog["abc"].statistics, catalog["abc"].stats_fetched_at), ({"viewCount": "10"}, fetched_at))
+        self.assertIsNone(catalog["xyz"].stats_fetched_at)
+        links = apps.get_model("generation", "YouTubeVideo").objects.values_list("lesson_id", "video__video_id")
+        self.assertEqual(sorted(links), [(first.id, "abc"), (second.id, "abc"), (second.id, "xyz")])
+
+
+class ArticleReuseTests(TestCase):
+    """Earlier articles are copied, adapted or ignored by score, and never reused within their own course."""
+    decorators = "Python decorators wrap a function to extend its behaviour without changing its code"
+
+    def setUp(self):
+        self.index = ArticleReuseIndex()
+        patcher = mock.patch.object(article_reuse, "_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.source_course, self.source = self.article_lesson(self.decorators)
+        self.article = ArticleContent.objects.create(lesson=self.source, content="# Decorators\n" + ARTICLE)
+
+    def article_lesson(self, description, course=None):
+        if course is None:
+            course, (lesson,) = _course(lessons=1, lesson_type="art")
+        else:
+            lesson = GeneratedLesson.objects.create(chapter=course.chapters.get(), lesson_number=2, lesson_type="art",
+                                                    lesson_name="x", lesson_description="d", lesson_details="d",
+                                                    lesson_goals="g")
+        GeneratedLesson.objects.filter(id=lesson.id).update(lesson_name="Decorators", lesson_description=description,
+                                                           lesson_details="Writing and applying decorators",
+                                                           lesson_goals="Write a timing decorator")
+        return course, GeneratedLesson.objects.select_related("chapter").get(id=lesson.id)
+
+    def score(self, lesson):
+        text = article_reuse.lesson_text(lesson.lesson_name, lesson.lesson_description, lesson.lesson_details,
+                                         lesson.lesson_goals)
+        return self.index.best_match(text, exclude_course=lesson.chapter.course_generation_id)[1]
+
+    def test_identical_lesson_is_copied_at_default_thresholds(self):
+        _, lesson = self.article_lesson(self.decorators)
+        with mock.patch.object(article_reuse, "complete_text") as complete:
+            content, source, score = find_reusable_article(lesson)
+        self.assertGreaterEqual(score, article_reuse.DEFAULT_REUSE_THRESHOLD)
+        self.assertEqual((content, source), (self.article.content, self.article))
+        complete.assert_not_called()
+
+    def test_thresholds_fire_at_their_scores(self):
+        _, lesson = self.article_lesson("Decorators in Python add behaviour to an existing function")
+        score = self.score(lesson)
+        with mock.patch.object(article_reuse, "complete_text", return_value="How this fits your lesson.") as complete:
+            with self.subTest("copy"), override_settings(ARTICLE_REUSE_THRESHOLD=score, ARTICLE_ADAPT_THRESHOLD=score):
+                self.assertEqual(find_reusable_article(lesson), (self.article.content, self.article, score))
+                complete.assert_not_called()
+            with self.subTest("adapt"), override_settings(ARTICLE_REUSE_THRESHOLD=score + 0.01,
+                                                          ARTICLE_ADAPT_THRESHOLD=score):
+                content, source, _score = find_reusable_article(lesson)
+                self.assertEqual(content, "How this fits your lesson.\n\n" + self.article.content)
+                self.assertEqual(source, self.article)
+                complete.assert_called_once()
+            with self.subTest("regenerate"), override_settings(ARTICLE_REUSE_THRESHOLD=score + 0.02,
+                                                               ARTICLE_ADAPT_THRESHOLD=score + 0.01):
+                self.assertIsNone(find_reusable_article(lesson))
+
+    def test_unrelated_lesson_is_generated(self):
+        _, lesson = self.article_lesson("Bake sourdough bread with a long cold fermentation")
+        GeneratedLesson.objects.filter(id=lesson.id).update(lesson_name="Sourdough", lesson_details="Starter and dough",
+                                                            lesson_goals="Bake a loaf")
+        lesson.refresh_from_db()
+        self.assertIsNone(find_reusable_article(lesson))
+
+    def test_same_course_is_never_reused(self):
+        _, lesson = self.article_lesson(self.decorators, course=self.source_course)
+        self.assertIsNone(self.index.best_match(self.decorators, exclude_course=self.source_course.id))
+        self.assertIsNone(find_reusable_article(lesson))
+
+    def test_index_keeps_newest_articles_only(self):
+        index = ArticleReuseIndex(max_articles=2)
+        for description in ["Generators yield values lazily", "Context managers clean up resources"]:
+            _, lesson = self.article_lesson(description)
+            ArticleContent.objects.create(lesson=lesson, content=" ".join(f"word{n}" for n in range(1000)))
+        index.refresh()
+        self.assertEqual(len(index), 2)
+        self.assertNotIn(self.article.id, index._snapshot.ids)
+        self.assertLessEqual(max(len(terms) for terms in index._snapshot.doc_terms),
+                             article_reuse.MAX_BODY_TERMS + 20)
+
+    def test_lookups_do_not_wait_for_a_refresh(self):
+        self.index.refresh()
+        _, lesson = self.article_lesson("Generators yield values lazily")
+        newer = ArticleContent.objects.create(lesson=lesson, content=ARTICLE)
+        # Another thread is refreshing: the current snapshot answers straight away
+        self.index._refreshing.acquire()
+        match = self.index.best_match("Generators yield values lazily")
+        self.index._refreshing.release()
+        self.assertEqual(match[0], self.article.id)
+        self.assertEqual(self.index.best_match("Generators yield values lazily")[0], newer.id)
+
+
+class DatabaseCompatibilityTests(TransactionTestCase):
+    """The bench_db workload at a small size; run under each DB_ENGINE profile to compare backends."""
+
+    def test_load_workload(self):
+        results = db_bench.run(courses=6, chapters=2, lessons=4, learners=4, threads=4)
+        for phase in ["seed", "read", "progress", "claim"]:
+            self.assertEqual(results[phase]["errors"], 0, results[phase]["first_error"])
+        self.assertEqual(results["progress"]["lost_updates"], 0)
+        self.assertEqual(results["claim"]["claimed"], 6)
+        self.assertEqual(results["claim"]["duplicates"], 0)
+
+
+# Hot queries -> (index they must use, SQLite EXPLAIN QUERY PLAN output). A change to a
+# query or to Meta.indexes that makes one scan or sort again fails here.
+HOT_QUERIES = {
+    "recent completed courses (generation_form)": (
+        lambda: CourseGeneration.objects.filter(status='completed').order_by('-completed_at')[:5],
+        "course_status_completed_idx",
+        "SEARCH generation_coursegeneration USING INDEX course_status_completed_idx (status=?)",
+    ),
+    "pending course claim (generation/jobs.py)": (
+        lambda: CourseGeneration.objects.filter(status='pending').order_by('created_at')[:1],
+        "course_status_created_idx",
+        "SEARCH generation_coursegeneration USING INDEX course_status_created_idx (status=?)",
+    ),
+    "course generation logs": (
+        lambda: GenerationLog.objects.filter(course_generation_id=1).order_by('-created_at'),
+        "genlog_course_created_idx",
+        "SEARCH generation_generationlog USING INDEX genlog_course_created_idx (course_generation_id=?)",
+    ),
+    "quiz attempts of a user": (
+        lambda: QuizAttempt.objects.filter(quiz_id=1, user_id=1).order_by('-created_at'),
+        "quizattempt_quiz_user_idx",
+        "SEARCH generation_quizattempt USING INDEX quizattempt_quiz_user_idx (quiz_id=? AND user_id=?)",
+    ),
+    "text response submissions of a user": (
+        lambda: TextResponseSubmission.objects.filter(lesson_id=1, user_id=1).order_by('-submitted_at'),
+        "textsub_lesson_user_idx",
+        "SEARCH generation_textresponsesubmission USING INDEX textsub_lesson_user_idx (lesson_id=? AND user_id=?)",
+    ),
+    "course list page (generation/pagination.py)": (
+        lambda: after_cursor(CourseGeneration.objects.all(), 'created_at', encode_cursor(timezone.now(), 1))[:25],
+        "course_created_idx",
+        "SEARCH generation_coursegeneration USING INDEX course_created_idx (created_at<?)",
+    ),
+    "project list page (courses.views.list_projects)": (
+        lambda: after_cursor(Project.objects.all(), 'updated_at', encode_cursor(timezone.now(), 1))[:25],
+        "project_updated_idx",
+        "SEARCH courses_project USING INDEX project_updated_idx (updated_at<?)",
+    ),
+}
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN of every hot query uses its index and needs no separate sort."""
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor == "postgresql":
+            # Empty test tables are cheaper to scan; ask what the planner would do at size
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, (query, index, sqlite_plan) in HOT_QUERIES.items():
+            with self.subTest(name):
+                plan = query().explain()
+                self.assertIn(index, plan)
+                if connection.vendor == "sqlite":
+                    self.assertIn(sqlite_plan, plan)
+                    self.assertNotIn("TEMP B-TREE", plan)
+                elif connection.vendor == "postgresql":
+                    self.assertNotIn("Sort", plan)
+
+
+class KeysetPaginationTests(TestCase):
+    """Walking every page visits each row once, including rows that share a timestamp."""
+
+    def test_pages_with_equal_timestamps(self):
+        now = timezone.now()
+        for n, created_at in enumerate([now] * 3 + [now - timedelta(hours=1)] * 3 + [now - timedelta(days=1)]):
+            course = CourseGeneration.objects.create(user_prompt=f"Course {n}")
+            CourseGeneration.objects.filter(id=course.id).update(created_at=created_at)
+        expected = list(CourseGeneration.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+        for size in range(1, len(expected) + 2):
+            with self.subTest(size=size):
+                seen, cursor, pages = [], None, 0
+                while True:
+                    page, cursor = keyset_page(CourseGeneration.objects.all(), "created_at", cursor, size)
+                    seen.extend(course.id for course in page)
+                    pages += 1
+                    if cursor is None:
+                        break
+                self.assertEqual(seen, expected)
+                self.assertEqual(pages, max(1, -(-len(expected) // size)))
+
+
+ARTICLE = "\n".join(f"## Step {n}\nA list comprehension builds a new list from an existing iterable." for n in range(20))
+
+
+class CompressedFieldTests(TestCase):
+    """Compressed text and JSON fields read back exactly what was saved."""
+
+    def setUp(self):
+        forget_dictionaries()
+        self.addCleanup(forget_dictionaries)
+        _, (self.lesson,) = _course(lessons=1)
+
+    def stored(self, model, pk, column):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM {model._meta.db_table} WHERE id = %s", [pk])
+            return cursor.fetchone()[0]
+
+    def set_stored(self, model, pk, column, value):
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {model._meta.db_table} SET {column} = %s WHERE id = %s", [value, pk])
+
+    def attempt(self, results):
+        quiz = MultipleChoiceQuiz.objects.create(lesson=self.lesson, quiz_data={"questions": []})
+        return QuizAttempt.objects.create(quiz=quiz, user_answers={}, results=results, score=1, total_questions=2)
+
+    def test_round_trip(self):
+        article = ArticleContent.objects.create(lesson=self.lesson, content=ARTICLE)
+        stored = self.stored(ArticleContent, article.id, "content")
+        self.assertTrue(stored.startswith(MARKER + "0:"))
+        self.assertLess(len(stored), len(ARTICLE))
+        self.assertEqual(ArticleContent.objects.get(id=article.id).content, ARTICLE)
+        results = {"answers": [{"question": n, "correct": n % 2 == 0, "feedback": "See the section on loops."}
+                               for n in range(20)]}
+        attempt = self.attempt(results)
+        self.assertTrue(self.stored(QuizAttempt, attempt.id, "results").startswith(MARKER))
+        self.assertEqual(QuizAttempt.objects.get(id=attempt.id).results, results)
+
+    def test_legacy_rows_without_marker(self):
+        article = ArticleContent.objects.create(lesson=self.lesson, content="short")
+        self.set_stored(ArticleContent, article.id, "content", ARTICLE)
+        self.assertEqual(ArticleContent.objects.get(id=article.id).content, ARTICLE)
+        attempt = self.attempt({})
+        self.set_stored(QuizAttempt, attempt.id, "results", '{"score": 1}')
+        self.assertEqual(QuizAttempt.objects.get(id=attempt.id).results, {"score": 1})
+
+    def test_short_and_incompressible_values_are_stored_plain(self):
+        rng = random.Random(0)
+        noise = "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(300))
+        for content in ["A short article.", noise]:
+            with self.subTest(content=content[:10]):
+                ArticleContent.objects.filter(lesson=self.lesson).delete()
+                article = ArticleContent.objects.create(lesson=self.lesson, content=content)
+                self.assertEqual(self.stored(ArticleContent, article.id, "content"), content)
+                self.assertEqual(ArticleContent.objects.get(id=article.id).content, content)
+
+    def test_trained_dictionary(self):
+        texts = [ARTICLE.replace("Step", f"Part {n}") for n in range(5)]
+        dictionary = CompressionDictionary.objects.create(name="article", data=train_dictionary(texts), sample_count=5)
+        forget_dictionaries()
+        article = ArticleContent.objects.create(lesson=self.lesson, content=ARTICLE)
+        stored = self.stored(ArticleContent, article.id, "content")
+        self.assertTrue(stored.startswith(f"{MARKER}{dictionary.id}:"))
+        self.assertLess(len(stored), len(compress_text(ARTICLE)))
+        # Decoding loads the dictionary by the id in the stored value
+        with mock.patch.dict(fields._dictionaries, clear=True):
+            self.assertEqual(ArticleContent.objects.get(id=article.id).content, ARTICLE)
+
+    def test_json_conversions(self):
+        field = QuizAttempt._meta.get_field("results")
+        self.assertEqual(field.to_python('{"score": 1}'), {"score": 1})
+        self.assertEqual(field.to_python("not json"), "not json")
+        self.assertEqual(field.to_python({"score": 1}), {"score": 1})
+        stored = field.get_prep_value({"feedback": ARTICLE})
+        self.assertEqual(field.to_python(stored), stored)
+        attempt = self.attempt({"feedback": ARTICLE})
+        self.assertEqual(json.loads(field.value_to_string(attempt)), {"feedback": ARTICLE})
+
+    def test_text_that_looks_compressed_stays_readable(self):
+        project = Project.objects.create(name="Exercise")
+        for content in [MARKER + "hello " + "x" * 200, MARKER + "3:" + "x" * 200, MARKER + "3:AAAA", ESCAPE + "a"]:
+            with self.subTest(content=content[:8]):
+                File.objects.filter(project=project).delete()
+                file = File.objects.create(project=project, name="main.py", relative_path="main.py", content=content)
+                self.assertEqual(File.objects.get(id=file.id).content, content)
+                self.assertEqual(decompress_text(compress_text(content)), content)
+        # Rows written before escaping existed are read as they are
+        self.assertEqual(decompress_text(MARKER + "hello"), MARKER + "hello")
+        self.assertEqual(decompress_text(MARKER + "0:not base64!"), MARKER + "0:not base64!")
+
+    def test_compress_content_dry_run(self):
+        articles = []
+        for n, lesson in enumerate(_course(lessons=3)[1]):
+            article = ArticleContent.objects.create(lesson=lesson, content="short")
+            self.set_stored(ArticleContent, article.id, "content", ARTICLE + str(n))
+            articles.append(article)
+        saved = sum(len(ARTICLE + str(n)) - len(compress_text(ARTICLE + str(n), "article")) for n in range(3))
+        out = io.StringIO()
+        call_command("compress_content", "--dry-run", stdout=out)
+        report = out.getvalue()
+        self.assertRegex(report, r"generation\.ArticleContent\.content\s+rows=3\s+rewritten=3 ")
+        self.assertIn(f"Total: {saved / 1024:.1f}KB saved (dry run, nothing written)", report)
+        for n, article in enumerate(articles):
+            self.assertEqual(self.stored(ArticleContent, article.id, "content"), ARTICLE + str(n))
+
+
+class CourseSnapshotTests(TestCase):
+    """The generated course data is stored compressed and streamed back unchanged."""
+    chapters = [{"chapter_number": 1, "chapter_name": "Bases", "chapter_description": "Données et types",
+                 "chapter_difficulty": 2}]
+
+    def generate(self, course):
+        plan = {"lessons": [{"lesson_name": f"Leçon {n}", "lesson_details": "d" * 200} for n in range(30)]}
+        chapter = {"chapter_number": 1, "lesson_plan": plan, "lessons_count": 30, "error": None}
+        with mock.patch.object(views, "chapter_list_create", return_value=self.chapters), \
+                mock.patch.object(views, "process_single_chapter", return_value=chapter), \
+                mock.patch.object(views, "create_final_project_chapter", return_value={"success": False, "error": "-"}), \
+                mock.patch.object(views, "generate_course_name", return_value="Python pour débutants"):
+            return views.generate_course(course)
+
+    def test_save_and_load(self):
+        course, _lessons = _course(chapters=0)
+        data = {"course_name": "Café", "overall_lesson_plan": self.chapters}
+        snapshot = save_snapshot(course.id, data)
+        self.assertEqual(snapshot.raw_size, len(json.dumps(data, ensure_ascii=False).encode("utf-8")))
+        self.assertEqual(load_snapshot(course.id), data)
+        # Saving again replaces the course's one snapshot
+        save_snapshot(course.id, {"course_name": "Tea"})
+        self.assertEqual(CourseSnapshot.objects.filter(course=course).count(), 1)
+        self.assertEqual(load_snapshot(course.id), {"course_name": "Tea"})
+        self.assertIsNone(load_snapshot(course.id + 1))
+
+    def test_streamed_response_matches_generated_data(self):
+        course, _lessons = _course(chapters=0, user_prompt="Python pour débutants", status="generating")
+        final_course_data = self.generate(course)
+        self.assertEqual(final_course_data["course_name"], "Python pour débutants")
+        with mock.patch.object(snapshots, "STREAM_CHUNK", 256):
+            response = self.client.get(reverse("generation:course_snapshot", args=[course.id]))
+            self.assertEqual(response["Content-Type"], "application/json")
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(b"".join(chunks)), final_course_data)
+        missing = self.client.get(reverse("generation:course_snapshot", args=[course.id + 1]))
+        self.assertEqual(missing.status_code, 404)
+
+
+class SnapshotMigrationTests(MigrationTestCase):
+    """0024 moves the course data kept inline on CourseGeneration into snapshots."""
+
+    def test_inline_course_data_is_moved(self):
+        apps = self.migrate("0023_list_pagination")
+        Course = apps.get_model("generation", "CourseGeneration")
+        data = {"course_name": "Café", "chapter_lesson_plans": {"chapter_1": {"lessons": []}}}
+        legacy = Course.objects.create(user_prompt="Python", course_data_json=data)
+        empty = Course.objects.create(user_prompt="Rust")
+        self.migrate("0024_course_snapshots")
+        self.assertEqual(load_snapshot(legacy.id), data)
+        self.assertIsNone(load_snapshot(empty.id))
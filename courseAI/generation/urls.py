@@ -19,4 +19,6 @@ urlpatterns = [
     path('lesson/<int:lesson_id>/project/', views.load_lesson_project, name='load_lesson_project'),
     path('lesson/<int:lesson_id>/correct/', views.submit_code_correction, name='submit_code_correction'),
     path('api/ai-feedback/', views.get_ai_feedback, name='get_ai_feedback'),
+    path('api/metrics/', views.provider_metrics, name='provider_metrics'),
+    path('api/course/<int:course_id>/snapshot/', views.course_snapshot, name='course_snapshot'),
 ]
\ No newline at end of file
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# --------------- Local vector index ---------------
+# A drop-in for the Pinecone index used by ai_gen_article. Each namespace lives in
+# its own directory, with one subdirectory per synced version:
+#   CURRENT             name of the live version directory
+#   v<n>/vectors.f32    float32 matrix (rows x dim), L2-normalised, memory-mapped
+#   v<n>/meta.jsonl     one JSON line per row: {"_id": ..., "fields": {...}}
+#   v<n>/offsets.npy    byte offset of each meta line, so hits are read without loading the file
+#   v<n>/ivf.npz        optional: centroids plus rows grouped by nearest centroid
+#   v<n>/manifest.json  row count, dimension, embedder and IVF settings
+# A sync writes a new version directory and then replaces CURRENT in one atomic
+# rename, so a query always finds a complete version. The previous version is kept
+# for queries that already resolved it; older ones are deleted, and a query that
+# finds its version gone reads CURRENT again.
+# Queries are embedded locally, so lookups need no network at all.
+
+DEFAULT_DIM = 512
+SEARCH_BATCH_ROWS = 65536
+IVF_MIN_ROWS = 20000
+IVF_ITERATIONS = 8
+IVF_NPROBE = 8
+CURRENT = "CURRENT"
+# Files of a namespace written before versions existed, directly in its directory
+_LEGACY_FILES = ("manifest.json", "vectors.f32", "meta.jsonl", "offsets.npy", "ivf.npz")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# --------------- Embedding ---------------
+class HashingEmbedder:
+    """Feature-hashed unigram + bigram embedding; deterministic across processes and machines."""
+
+    name = "hashing-v1"
+
+    def __init__(self, dim=DEFAULT_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        tokens = _TOKEN.findall((text or "").lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                matrix[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        # Sublinear term frequency, then unit length so a dot product is cosine similarity
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+EMBEDDERS = {HashingEmbedder.name: HashingEmbedder}
+
+
+# --------------- IVF partitioning ---------------
+def build_ivf(vectors, n_lists=None, iterations=IVF_ITERATIONS, seed=0):
+    """Spherical k-means over the rows; returns (centroids, row order grouped by list, list offsets)."""
+    rows = vectors.shape[0]
+    n_lists = n_lists or max(1, int(np.sqrt(rows)))
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(rows, size=n_lists, replace=False)], dtype=np.float32)
+    assignment = np.zeros(rows, dtype=np.int32)
+    for _ in range(iterations):
+        for start in range(0, rows, SEARCH_BATCH_ROWS):
+            block = np.asarray(vectors[start:start + SEARCH_BATCH_ROWS])
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        for start in range(0, rows, SEARCH_BATCH_ROWS):
+            block = np.asarray(vectors[start:start + SEARCH_BATCH_ROWS])
+            np.add.at(sums, assignment[start:start + len(block)], block)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        sums[empty] = centroids[empty]
+        norms[empty] = 1.0
+        centroids = sums / norms
+    order = np.argsort(assignment, kind="stable").astype(np.int64)
+    offsets = np.searchsorted(assignment[order], np.arange(n_lists + 1)).astype(np.int64)
+    return centroids, order, offsets
+
+
+def current_version(root, namespace):
+    """(directory, version) of a namespace's live version, or (None, None) when it was never synced."""
+    directory = Path(root) / namespace
+    try:
+        version = (directory / CURRENT).read_text().strip()
+    except FileNotFoundError:
+        manifest = directory / "manifest.json"
+        if not manifest.exists():
+            return None, None
+        # Synced before versions existed
+        return directory, f"legacy-{manifest.stat().st_mtime_ns}"
+    return directory / version, version
+
+
+def write_namespace(root, namespace, records, embedder=None, ivf=None):
+    """Embed and write records ({"_id", "fields"}) for a namespace as a new version, then switch to it.
+
+    ``ivf`` forces partitioning on or off; by default it is built for large namespaces.
+    """
+    embedder = embedder or HashingEmbedder()
+    directory = Path(root) / namespace
+    version = f"v{time.time_ns()}"
+    staging = directory / f".{version}.tmp"
+    staging.mkdir(parents=True)
+
+    records = list(records)
+    (staging / "vectors.f32").touch()
+    vectors = np.memmap(staging / "vectors.f32", dtype=np.float32, mode="w+",
+                        shape=(len(records), embedder.dim)) if records else None
+    offsets = np.zeros(len(records), dtype=np.int64)
+    with open(staging / "meta.jsonl", "wb") as meta:
+        for start in range(0, len(records), 1024):
+            batch = records[start:start + 1024]
+            vectors[start:start + len(batch)] = embedder.embed(
+                [r["fields"].get("chunk_text", "") for r in batch])
+            for i, record in enumerate(batch):
+                offsets[start + i] = meta.tell()
+                meta.write(json.dumps({"_id": record["_id"], "fields": record["fields"]}).encode("utf-8") + b"\n")
+    if vectors is not None:
+        vectors.flush()
+        del vectors
+    np.save(staging / "offsets.npy", offsets)
+
+    use_ivf = len(records) >= IVF_MIN_ROWS if ivf is None else (ivf and len(records) > 1)
+    if use_ivf:
+        matrix = np.memmap(staging / "vectors.f32", dtype=np.float32, mode="r",
+                           shape=(len(records), embedder.dim))
+        centroids, order, list_offsets = build_ivf(matrix)
+        np.savez(staging / "ivf.npz", centroids=centroids, order=order, offsets=list_offsets)
+        del matrix
+
+    manifest = {"rows": len(records), "dim": embedder.dim, "embedder": embedder.name, "ivf": bool(use_ivf)}
+    (staging / "manifest.json").write_text(json.dumps(manifest))
+
+    staging.rename(directory / version)
+    _, previous = current_version(root, namespace)
+    pointer = directory / f".{CURRENT}.{version}.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, directory / CURRENT)
+
+    # Keep the previous version for queries that already resolved it
+    for path in directory.iterdir():
+        if path.is_dir() and path.name.startswith("v") and path.name not in (version, previous):
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.name in _LEGACY_FILES:
+            path.unlink(missing_ok=True)
+    return manifest
+
+
+# --------------- Search ---------------
+class _Namespace:
+    """Read-only, memory-mapped view of one namespace version."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.manifest = json.loads((path / "manifest.json").read_text())
+        rows, dim = self.manifest["rows"], self.manifest["dim"]
+        self.embedder = EMBEDDERS[self.manifest["embedder"]](dim)
+        self.vectors = np.memmap(path / "vectors.f32", dtype=np.float32, mode="r",
+                                 shape=(rows, dim)) if rows else np.zeros((0, dim), dtype=np.float32)
+        self.offsets = np.load(path / "offsets.npy")
+        with open(path / "meta.jsonl", "rb") as meta_file:
+            # The mapping keeps its own handle, so the file is closed straight away
+            self.meta = mmap.mmap(meta_file.fileno(), 0, access=mmap.ACCESS_READ) if rows else b""
+        self.ivf = dict(np.load(path / "ivf.npz")) if self.manifest.get("ivf") else None
+        # Searches running on this version, and whether a newer one replaced it
+        self.users = 0
+        self.retired = False
+
+    def close(self):
+        if isinstance(self.meta, mmap.mmap):
+            self.meta.close()
+        # np.memmap has no close(); dropping the last reference unmaps the vectors
+        self.vectors = self.offsets = self.ivf = None
+
+    def record(self, row):
+        start = int(self.offsets[row])
+        end = self.meta.find(b"\n", start)
+        return json.loads(self.meta[start:end])
+
+    def _candidates(self, query, nprobe):
+        if self.ivf is None:
+            return None
+        lists = np.argsort(-(self.ivf["centroids"] @ query))[:nprobe]
+        offsets, order = self.ivf["offsets"], self.ivf["order"]
+        return np.sort(np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists]))
+
+    def search(self, text, top_k, nprobe=IVF_NPROBE):
+        query = self.embedder.embed([text])[0]
+        candidates = self._candidates(query, nprobe)
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        total = len(self.vectors) if candidates is None else len(candidates)
+        for start in range(0, total, SEARCH_BATCH_ROWS):
+            if candidates is None:
+                rows = np.arange(start, min(total, start + SEARCH_BATCH_ROWS))
+                block = self.vectors[start:start + SEARCH_BATCH_ROWS]
+            else:
+                rows = candidates[start:start + SEARCH_BATCH_ROWS]
+                block = self.vectors[rows]
+            scores = block @ query
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k)[:top_k]
+                rows, scores = rows[keep], scores[keep]
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+        order = np.argsort(-best_scores, kind="stable")[:top_k]
+        return [(int(best_rows[i]), float(best_scores[i])) for i in order]
+
+
+class LocalVectorIndex:
+    """Same ``search`` call shape as ``pinecone.Index`` for text queries, served from local files."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self._namespaces = {}
+
+    def namespace_version(self, name):
+        """On-disk version of a namespace; changes whenever it is re-synced."""
+        _, version = current_version(self.root, name)
+        return version or 0
+
+    def _checkout(self, name):
+        """The live version of a namespace, (re)opened after a sync and held until _checkin."""
+        while True:
+            path, version = current_version(self.root, name)
+            if path is None:
+                raise FileNotFoundError(
+                    f"Local vector namespace '{name}' not found in {self.root}; run `python manage.py sync_vector_index`.")
+            try:
+                return self._checkout_version(name, path, version)
+            except FileNotFoundError:
+                # Two syncs landed between reading CURRENT and opening it, so this version
+                # was pruned; the newer one it points at now is there to open instead
+                if current_version(self.root, name)[1] == version:
+                    raise
+
+    def _checkout_version(self, name, path, version):
+        with self._lock:
+            current = self._namespaces.get(name)
+            if current is None or current.version != version:
+                opened = _Namespace(path, version)
+                if current is not None:
+                    # Unmapped once the searches still running on it finish
+                    current.retired = True
+                    if not current.users:
+                        current.close()
+                current = opened
+                self._namespaces[name] = current
+            current.users += 1
+            return current
+
+    def _checkin(self, ns):
+        with self._lock:
+            ns.users -= 1
+            if ns.retired and not ns.users:
+                ns.close()
+
+    def search(self, namespace, query, fields=None, **kwargs):
+        ns = self._checkout(namespace)
+        try:
+            text = query.get("inputs", {}).get("text", "")
+            hits = []
+            for row, score in ns.search(text, int(query.get("top_k", 10))):
+                record = ns.record(row)
+                record_fields = record["fields"]
+                if fields:
+                    record_fields = {k: v for k, v in record_fields.items() if k in fields}
+                hits.append({"_id": record["_id"], "_score": score, "fields": record_fields})
+        finally:
+            self._checkin(ns)
+        return {"result": {"hits": hits}, "usage": {"read_units": 0}}
+
@@ -1,47 +1,54 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 from datetime import datetime
-from cerebras.cloud.sdk import Cerebras
-from pinecone import Pinecone
-from tavily import TavilyClient
 import dotenv  
 import os
 import shutil
 import threading
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import traceback
 from .models import CourseGeneration, GeneratedChapter, GeneratedLesson, LessonType, GenerationLog, MultipleChoiceQuiz, QuizAttempt, QuizAttempt, ArticleContent, YouTubeVideo, ExternalArticles, TextResponseQuestion, TextResponseSubmission
-from django.db import transaction
+from django.db import DatabaseError, transaction, connection
 from django.utils import timezone
-from .youtube_utils import generate_youtube_query, search_youtube
+from .youtube_utils import generate_youtube_query, search_youtube, find_videos, candidate_ids, rank_videos, video_statistics, catalog_entry, quota_usage, batching_stats
+from .search_utils import get_best_sources
+from .digest_utils import lesson_digest, lesson_digests
+from .llm_utils import complete_structured, complete_text, model_stats, StructuredOutputError
+from .singleflight import call_key, flight, flight_stats
+from .concurrency import key_id, limiter, limiter_stats
+from . import providers
+from .retrieval_cache import cached_search, retrieval_cache_stats
+from .course_stats import percent_complete, recount_course
+from .course_tree import course_tree
+from .sidebar import sidebar_html
+from .progress import completed_bits, completed_lesson_ids, mark_complete, number_lessons
+from .db_utils import db_stats, write
+from .pagination import cached_count, keyset_page
+from .snapshots import save_snapshot, stream_snapshot
+from .article_reuse import find_reusable_article
 from courses.models import Project, File
 
 # --------------- Sidebar helpers ---------------
-def _sidebar_context_for_lesson(lesson: GeneratedLesson):
+def _sidebar_context_for_lesson(lesson: GeneratedLesson, request=None):
     """Build common context for sidebar navigation given a current lesson."""
-    course = lesson.chapter.course_generation
-    chapters = (GeneratedChapter.objects
-                .filter(course_generation=course)
-                .prefetch_related('lessons', 'lessons__quiz', 'lessons__article', 'lessons__external_article'))
+    # Views load lessons with select_related('chapter'), so on a cache hit this only reads progress
+    course_id = lesson.chapter.course_generation_id
+    bits = completed_bits(request, course_id) if request is not None else b''
     return {
-        'course_generation': course,
-        'sidebar_chapters': chapters,
+        'sidebar_html': sidebar_html(course_id, lesson.id, bits),
         'current_lesson_id': lesson.id,
     }
 
 dotenv.load_dotenv()  # Load environment variables from .env file
-client = Cerebras(
-    api_key=os.getenv('CEREBRAS_API_KEY'),
-    max_retries=5
-)
+# Built on first use by generation/providers.py
+client = providers.lazy("cerebras")
 
-second_client = Cerebras(
-    api_key=os.getenv('SECOND_CEREBRAS_API_KEY'),
-    max_retries=5
-)
+second_client = providers.lazy("cerebras_secondary")
 
 
 def generation_form(request):
@@ -103,54 +110,17 @@ def chapter_list_create(input_prompt, exp):
         }
     ]
     
-    # Try primary client first
-    try:
-        print("🔄 Attempting chapter generation with primary Cerebras client...")
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="qwen-3-coder-480b",
-        )
-        response_content = chat_completion.choices[0].message.content
-        print("✅ Primary client succeeded for chapter generation")
-    except Exception as e:
-        print(f"❌ Primary client failed for chapter generation: {str(e)}")
-        try:
-            print("🔄 Retrying with secondary Cerebras client...")
-            chat_completion = second_client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-coder-480b",
-            )
-            response_content = chat_completion.choices[0].message.content
-            print("✅ Secondary client succeeded for chapter generation")
-        except Exception as e2:
-            print(f"❌ Secondary client also failed for chapter generation: {str(e2)}")
-            raise Exception(f"Both Cerebras clients failed for chapter generation. Primary: {str(e)}, Secondary: {str(e2)}")
-
-    response_content = chat_completion.choices[0].message.content
-    try:
-        chapter_list = json.loads(response_content.strip())
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in chapter_list_create: {e}")
-        print(f"Response content length: {len(response_content)}")
-        # Try to extract JSON between first [ and last ]
-        start = response_content.find('[')
-        end = response_content.rfind(']')
-        if start != -1 and end > start:
-            json_str = response_content[start:end+1].strip()
-            try:
-                chapter_list = json.loads(json_str)
-            except json.JSONDecodeError as e2:
-                print(f"Failed to parse extracted JSON: {e2}")
-                raise ValueError("Unable to parse chapter list JSON")
-        else:
-            raise ValueError("No JSON array found in response")
+    print("🔄 Generating chapter list...")
+    chapter_list = complete_structured("chapter_list", messages, [client, second_client])
+    print("✅ Chapter generation succeeded")
     
     return chapter_list
 
 def create_lesson(chapter_item, course_structure, prompt):
     """Create a lesson plan for a single chapter."""
-    chat_completion = client.chat.completions.create(
-        messages=[
+    lesson_plan = complete_structured(
+        "lesson_plan",
+        [
             {
                 "role": "user",
                 "content": f"""
@@ -213,7 +183,7 @@ def create_lesson(chapter_item, course_structure, prompt):
                         """,
             }
         ],
-        model="qwen-3-coder-480b",
+        client,
     )
 
     # Video - Name: vid, ID: 1,
@@ -225,24 +195,6 @@ def create_lesson(chapter_item, course_structure, prompt):
     #                     external resource review - Name: ext, ID: 7
     #                     code - Name: code, ID: 8
 
-    try:
-        lesson_plan = json.loads(chat_completion.choices[0].message.content.strip())
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in create_lesson: {e}")
-        print(f"Response content length: {len(chat_completion.choices[0].message.content)}")
-        # Try to extract JSON between first [ and last ]
-        response_content = chat_completion.choices[0].message.content
-        start = response_content.find('[')
-        end = response_content.rfind(']')
-        if start != -1 and end > start:
-            json_str = response_content[start:end+1].strip()
-            try:
-                lesson_plan = json.loads(json_str)
-            except json.JSONDecodeError as e2:
-                print(f"Failed to parse extracted JSON: {e2}")
-                raise ValueError("Unable to parse lesson plan JSON")
-        else:
-            raise ValueError("No JSON array found in response")
     return lesson_plan
 
 def ensure_lesson_types_exist():
@@ -269,77 +221,7 @@ def ensure_lesson_types_exist():
         )
 
 
-pc = Pinecone(api_key=os.getenv('PINECONE_API_KEY'))
-
-index = pc.Index(host=os.getenv('PINECONE_HOST'))
-
-def get_best_source(question, min_score=0.5):
-    print(f"🔍 get_best_source called with question: {question[:100]}...")
-    try:
-        # Initialize Tavily client
-        tavily_api_key = os.getenv('TAVILY_API_KEY')
-        print(f"🔍 Tavily API key found: {bool(tavily_api_key)}")
-        if not tavily_api_key:
-            print("❌ No TAVILY_API_KEY found in environment variables!")
-            return None
-            
-        tavily_client = TavilyClient(api_key=tavily_api_key)
-
-        completion_create_response12 = client.chat.completions.create(
-            messages=[
-                    {
-                        "role": "user",
-                        "content": f"""
-                            Please take the following information and simplify it down to a simple question containing the main ideas. 
-                            Input: {question}
-                            DO NOT return anything other than the main ideas, do not explain anything, do not add any extra information.
-                        """
-                    }
-                ],
-                model="qwen-3-235b-a22b-instruct-2507",
-                stream=False,
-                max_completion_tokens=20000,
-                temperature=0.7,
-                top_p=0.8
-            )
-        print(completion_create_response12)
-    
-    # Extract the text content from the response
-        main_ideas = completion_create_response12.choices[0].message.content
-
-        # Perform search
-        print(f"🔍 Performing Tavily search...")
-        response = tavily_client.search(main_ideas)
-        print(f"🔍 Tavily search response received: {len(response.get('results', []))} results")
-        
-        # Find the best result above the score threshold
-        results = response.get('results', [])
-        best_result = None
-        best_score = 0
-        
-        for i, result in enumerate(results):
-            score = result.get('score', 0)
-            url = result.get('url', '')
-            print(f"🔍 Result {i+1}: score={score}, url={url[:50]}...")
-            
-            if score >= min_score and url and score > best_score:
-                best_result = {
-                    'url': url,
-                    'title': result.get('title', 'No title available'),
-                    'content': result.get('content', 'No content available'),
-                    'score': score
-                }
-                best_score = score
-                print(f"🔍 New best result found with score {score}")
-        
-        print(f"🔍 Final best result: {best_result}")
-        return best_result
-        
-    except Exception as e:
-        print(f"❌ Error during search: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+index = providers.lazy("vector_index")
 
 def ai_gen_article(input):
 
@@ -349,42 +231,36 @@ def ai_gen_article(input):
         Guidelines: {input.lesson_guidelines}
         """
 
-    completion_create_response1 = client.chat.completions.create(
-    messages=[
-            {
-                "role": "user",
-                "content": f"""
-                    Please take the following information and simplify it down to a few main ideas. They should be a few words at most.
-                    Input: {articontext}
-                    DO NOT return anything other than the main ideas, do not explain anything, do not add any extra information.
-                """
-            }
-        ],
-        model="qwen-3-235b-a22b-instruct-2507",
-        stream=False,
-        max_completion_tokens=20000,
-        temperature=0.7,
-        top_p=0.8
-    )
-
-    print(completion_create_response1)
-    
-    # Extract the text content from the response
-    main_ideas = completion_create_response1.choices[0].message.content
-
-    filtered_results = index.search(
-        namespace="pennapps", 
-        query={
-            "inputs": {"text": main_ideas}, 
-            "top_k": 3,
-        },
-        fields=["category", "chunk_text"]
+    # Shared with the Tavily and YouTube lookups for this lesson
+    main_ideas = lesson_digest(input).main_ideas
+
+    print(main_ideas)
+
+    def pinecone_search(**kwargs):
+        if settings.VECTOR_BACKEND == 'local':
+            return index.search(**kwargs)
+        with limiter("pinecone", key_id(os.getenv('PINECONE_API_KEY'))).slot():
+            return index.search(**kwargs)
+
+    filtered_results = cached_search(
+        index, "pennapps", main_ideas, 3, ["category", "chunk_text"],
+        lambda: flight("pinecone").do(
+            call_key("pennapps", main_ideas, 3),
+            pinecone_search,
+            namespace="pennapps", 
+            query={
+                "inputs": {"text": main_ideas}, 
+                "top_k": 3,
+            },
+            fields=["category", "chunk_text"]
+        )
     )
     print(filtered_results)
 
 
-    completion_create_response = client.chat.completions.create(
-    messages=[
+    article = complete_text(
+        "article",
+        [
             {
                 "role": "system",
                 "content": f"""You are a renowned article writer celebrated for producing high-quality, detailed, and comprehensive articles on a wide range of topics. Your strengths include breaking down complex concepts into clear, engaging explanations, providing accurate and up-to-date information, and adjusting your tone from formal to conversational as needed. You cite sources when relevant and always ensure clarity and depth.
@@ -399,21 +275,19 @@ def ai_gen_article(input):
                 """
             }
         ],
-        model="qwen-3-235b-a22b-instruct-2507",
+        client,
         stream=False,
-        max_completion_tokens=20000,
         temperature=0.7,
         top_p=0.8
     )
 
-    # Extract and return the article content as a string
-    article = completion_create_response.choices[0].message.content
     return article
 
 def generate_quiz(lesson):
     """Generate a multiple choice quiz for a given lesson using Cerebras API."""
-    chat_completion = client.chat.completions.create(
-        messages=[
+    quiz_data = complete_structured(
+        "quiz",
+        [
             {
                 "role": "system",
                 "content": """
@@ -459,30 +333,12 @@ def generate_quiz(lesson):
                 """,
             }
         ],
-        model="qwen-3-coder-480b",
+        client,
     )
-
-    response_content = chat_completion.choices[0].message.content
-    try:
-        quiz_data = json.loads(response_content.strip())
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in generate_quiz: {e}")
-        print(f"Response content length: {len(response_content)}")
-        # Try to extract JSON between first { and last }
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        if start != -1 and end > start:
-            json_str = response_content[start:end+1].strip()
-            try:
-                quiz_data = json.loads(json_str)
-            except json.JSONDecodeError as e2:
-                print(f"Failed to parse extracted JSON: {e2}")
-                raise ValueError("Unable to parse quiz JSON")
-        else:
-            raise ValueError("No JSON object found in response")
     
     # Create the MultipleChoiceQuiz object
-    quiz = MultipleChoiceQuiz.objects.create(
+    quiz = write(
+        MultipleChoiceQuiz.objects.create,
         lesson=lesson,
         quiz_data=quiz_data
     )
@@ -502,7 +358,9 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
     try:
         print(f"🔄 Generating lessons for Chapter {chapter.chapter_number}...")
         
-        GenerationLog.objects.create(
+        # Chapters run in parallel, so their writes go through the shared writer (generation/db_utils.py)
+        write(
+            GenerationLog.objects.create,
             course_generation=course_generation,
             step=f"lesson_generation_chapter_{chapter.chapter_number}",
             status="in_progress",
@@ -514,7 +372,7 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
         chapter_result['lesson_plan'] = lesson_plan
         
         # Save lessons to database
-        with transaction.atomic():
+        def save_lessons():
             for lesson_data in lesson_plan:
                 GeneratedLesson.objects.create(
                     chapter=chapter,
@@ -527,7 +385,6 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
                     lesson_goals=lesson_data.get("lesson_goals", ""),
                     lesson_guidelines=lesson_data.get("lesson_guidlines", "")
                 )
-                chapter_lessons_count += 1
             
             GenerationLog.objects.create(
                 course_generation=course_generation,
@@ -535,9 +392,26 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
                 status="completed",
                 message=f"Generated {len(lesson_plan)} lessons for Chapter {chapter.chapter_number}"
             )
+            return len(lesson_plan)
+        
+        chapter_lessons_count = write(save_lessons)
         
         # Process each lesson type
-        lessons = GeneratedLesson.objects.filter(chapter=chapter)
+        lessons = list(GeneratedLesson.objects.filter(chapter=chapter))
+        
+        # One digest per article/external/video lesson feeds all of its lookups
+        digests = lesson_digests(lessons)
+        
+        # External resources only need web searches, so run the chapter's ones together up front
+        ext_lessons = [lesson for lesson in lessons if lesson.lesson_type == "ext"]
+        ext_sources = dict(zip(
+            [lesson.id for lesson in ext_lessons],
+            get_best_sources(
+                [f"{lesson.lesson_name}. {lesson.lesson_description} {lesson.lesson_details}" for lesson in ext_lessons],
+                queries=[digests[lesson.id].search_query if lesson.id in digests else None for lesson in ext_lessons]
+            )
+        ))
+        
         for lesson in lessons:
             print(f"🔍 Processing lesson {lesson.lesson_number} with type: '{lesson.lesson_type}' in Chapter {chapter.chapter_number}")
             try:
@@ -548,16 +422,17 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
                     generate_programming_exercise(lesson)
                     print(f"✅ Generated programming exercise for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
                 elif lesson.lesson_type == "vid":
-                    search_youtube_for_lesson(lesson)  
-                    print(f"✅ Prepared YouTube search for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
+                    # Searched with the rest of the course's video lessons once all chapters are done
+                    print(f"⏳ Queued YouTube search for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
                 elif lesson.lesson_type == "txt":
                     generate_text_response_questions(lesson)
                     print(f"✅ Generated text response questions for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
                 elif lesson.lesson_type == "ext":
                     print(f"🔍 Found EXT lesson type! Processing external article for lesson {lesson.lesson_number}")
-                    source = get_best_source(f"{lesson.lesson_name}. {lesson.lesson_description} {lesson.lesson_details}")
+                    source = ext_sources.get(lesson.id)
                     if source and source.get('url'):
-                        ExternalArticles.objects.create(
+                        write(
+                            ExternalArticles.objects.create,
                             lesson=lesson,
                             url=source['url']
                         )
@@ -565,12 +440,19 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
                     else:
                         print(f"⚠️ No suitable external article found for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
                 elif lesson.lesson_type == "art":
-                    article = ai_gen_article(lesson)
-                    ArticleContent.objects.create(
+                    reuse = find_reusable_article(lesson)
+                    if reuse:
+                        article, source, score = reuse
+                    else:
+                        article, source, score = ai_gen_article(lesson), None, None
+                    write(
+                        ArticleContent.objects.create,
                         lesson=lesson,
-                        content=article
+                        content=article,
+                        reused_from=source,
+                        reuse_score=score
                     )
-                    print(f"✅ Generated article for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
+                    print(f"✅ {'Reused' if source else 'Generated'} article for Lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}")
             except Exception as lesson_error:
                 print(f"❌ Error processing lesson {lesson.lesson_number} in Chapter {chapter.chapter_number}: {str(lesson_error)}")
                 # Continue processing other lessons even if one fails
@@ -585,7 +467,8 @@ def process_single_chapter(chapter, chapter_item, course_structure_text, user_te
         
         # Log the error
         try:
-            GenerationLog.objects.create(
+            write(
+                GenerationLog.objects.create,
                 course_generation=course_generation,
                 step=f"lesson_generation_chapter_{chapter.chapter_number}",
                 status="failed",
@@ -602,27 +485,33 @@ def create_final_project_chapter(course_generation, user_prompt, chapter_number)
     try:
         print(f"🔄 Creating final project chapter {chapter_number}...")
         
-        # Create the final project chapter
-        final_chapter = GeneratedChapter.objects.create(
-            course_generation=course_generation,
-            chapter_number=chapter_number,
-            chapter_name="Final Project",
-            chapter_description=f"Comprehensive project that applies all concepts learned throughout the course to build: {user_prompt}",
-            difficulty_rating=10  # Maximum difficulty as it's the final project
-        )
+        # Other courses may be generating at the same time, so writes go through the shared writer
+        def save_chapter():
+            # Create the final project chapter
+            final_chapter = GeneratedChapter.objects.create(
+                course_generation=course_generation,
+                chapter_number=chapter_number,
+                chapter_name="Final Project",
+                chapter_description=f"Comprehensive project that applies all concepts learned throughout the course to build: {user_prompt}",
+                difficulty_rating=10  # Maximum difficulty as it's the final project
+            )
+            
+            GenerationLog.objects.create(
+                course_generation=course_generation,
+                step=f"final_project_chapter_{chapter_number}",
+                status="in_progress",
+                message=f"Creating final project chapter {chapter_number}"
+            )
+            return final_chapter
         
-        GenerationLog.objects.create(
-            course_generation=course_generation,
-            step=f"final_project_chapter_{chapter_number}",
-            status="in_progress",
-            message=f"Creating final project chapter {chapter_number}"
-        )
+        final_chapter = write(save_chapter)
         
         # Generate a comprehensive programming exercise using AI
         lesson_content = generate_final_project_lesson_content(user_prompt)
         
         # Create the interactive programming exercise lesson
-        final_lesson = GeneratedLesson.objects.create(
+        final_lesson = write(
+            GeneratedLesson.objects.create,
             chapter=final_chapter,
             lesson_number=1,
             lesson_type="int",  # Interactive programming exercise
@@ -637,7 +526,8 @@ def create_final_project_chapter(course_generation, user_prompt, chapter_number)
         # Generate the programming exercise for this lesson
         project = generate_comprehensive_final_project(final_lesson, user_prompt)
         
-        GenerationLog.objects.create(
+        write(
+            GenerationLog.objects.create,
             course_generation=course_generation,
             step=f"final_project_chapter_{chapter_number}",
             status="completed",
@@ -671,7 +561,8 @@ def create_final_project_chapter(course_generation, user_prompt, chapter_number)
         traceback.print_exc()
         
         try:
-            GenerationLog.objects.create(
+            write(
+                GenerationLog.objects.create,
                 course_generation=course_generation,
                 step=f"final_project_chapter_{chapter_number}",
                 status="failed",
@@ -728,54 +619,29 @@ def generate_final_project_lesson_content(user_prompt):
         }
     ]
     
-    # Try primary client first
-    try:
-        print("🔄 Generating final project lesson content with primary Cerebras client...")
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="qwen-3-coder-480b",
-        )
-        print("✅ Primary client succeeded for final project lesson content")
-    except Exception as e:
-        print(f"❌ Primary client failed for final project lesson content: {str(e)}")
-        try:
-            print("🔄 Retrying final project lesson content with secondary Cerebras client...")
-            chat_completion = second_client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-coder-480b",
-            )
-            print("✅ Secondary client succeeded for final project lesson content")
-        except Exception as e2:
-            print(f"❌ Secondary client also failed for final project lesson content: {str(e2)}")
-            # Provide fallback content
-            return {
-                'details': f"Create a comprehensive implementation of: {user_prompt}. This final project should demonstrate mastery of all concepts learned throughout the course, including proper code structure, error handling, user interface design, and real-world applicability.",
-                'goals': "Demonstrate complete understanding and application of all course concepts; Create a fully functional, production-ready implementation; Showcase problem-solving and software design skills",
-                'guidelines': "1. Plan your project architecture and design; 2. Implement core functionality step by step; 3. Add advanced features and optimizations; 4. Test thoroughly and handle edge cases; 5. Document your code and create user instructions; 6. Prepare a presentation of your final work"
-            }
-    
     try:
-        response_content = chat_completion.choices[0].message.content.strip()
-        lesson_content = json.loads(response_content)
-        return lesson_content
-    except json.JSONDecodeError as e:
+        print("🔄 Generating final project lesson content...")
+        lesson_content = complete_structured("final_project_content", messages, [client, second_client])
+        print("✅ Generated final project lesson content")
+    except StructuredOutputError as e:
         print(f"JSON decode error in final project lesson content: {e}")
-        # Try to extract JSON
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        if start != -1 and end > start:
-            try:
-                lesson_content = json.loads(response_content[start:end+1])
-                return lesson_content
-            except json.JSONDecodeError:
-                pass
-        
-        # Fallback content if JSON parsing fails
+        lesson_content = {}
+    except Exception as e:
+        print(f"❌ All clients failed for final project lesson content: {str(e)}")
+        # Provide fallback content
         return {
-            'details': f"Create a comprehensive implementation of: {user_prompt}. This final project should demonstrate mastery of all concepts learned throughout the course.",
-            'goals': "Demonstrate complete understanding and application of all course concepts",
-            'guidelines': "Plan, implement, test, and document your complete solution step by step"
+            'details': f"Create a comprehensive implementation of: {user_prompt}. This final project should demonstrate mastery of all concepts learned throughout the course, including proper code structure, error handling, user interface design, and real-world applicability.",
+            'goals': "Demonstrate complete understanding and application of all course concepts; Create a fully functional, production-ready implementation; Showcase problem-solving and software design skills",
+            'guidelines': "1. Plan your project architecture and design; 2. Implement core functionality step by step; 3. Add advanced features and optimizations; 4. Test thoroughly and handle edge cases; 5. Document your code and create user instructions; 6. Prepare a presentation of your final work"
         }
+    
+    # Fallback content for any field that could not be recovered
+    fallback = {
+        'details': f"Create a comprehensive implementation of: {user_prompt}. This final project should demonstrate mastery of all concepts learned throughout the course.",
+        'goals': "Demonstrate complete understanding and application of all course concepts",
+        'guidelines': "Plan, implement, test, and document your complete solution step by step"
+    }
+    return {key: lesson_content.get(key) or value for key, value in fallback.items()}
 
 def generate_comprehensive_final_project(lesson, user_prompt):
     """Generate a comprehensive programming project for the final lesson."""
@@ -824,109 +690,57 @@ def generate_comprehensive_final_project(lesson, user_prompt):
         }
     ]
     
-    # Try primary client first
-    try:
-        print(f"🔄 Generating comprehensive final project with primary Cerebras client...")
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model="qwen-3-coder-480b",
-        )
-        print(f"✅ Primary client succeeded for comprehensive final project")
-    except Exception as e:
-        print(f"❌ Primary client failed for comprehensive final project: {str(e)}")
-        try:
-            print(f"🔄 Retrying comprehensive final project with secondary Cerebras client...")
-            chat_completion = second_client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-coder-480b",
-            )
-            print(f"✅ Secondary client succeeded for comprehensive final project")
-        except Exception as e2:
-            print(f"❌ Secondary client also failed for comprehensive final project: {str(e2)}")
-            # Create fallback project structure
-            project_data = {
-                "starter_files": {
-                    "main.py": f"# Final Project: {user_prompt}\n# TODO: Implement the main functionality\n\ndef main():\n    # Your implementation here\n    pass\n\nif __name__ == '__main__':\n    main()",
-                    "README.md": f"# Final Project: {user_prompt}\n\n## Description\nTODO: Describe your project\n\n## Requirements\nTODO: List requirements\n\n## Usage\nTODO: Explain how to use your project"
-                },
-                "grading_method": "ai_review",
-                "expected_output": ""
-            }
-            
-            # Create the Project object with fallback data
-            project = Project.objects.create(
-                lesson=lesson,
-                name=f"Final Project: {user_prompt[:50]}...",
-                description=f"Comprehensive final project: {lesson.lesson_description}",
-                grading_method=project_data.get('grading_method', 'ai_review'),
-                expected_output=project_data.get('expected_output', ''),
-                is_final_project=True
-            )
-            
-            # Create File objects for starter files
-            starter_files = project_data.get('starter_files', {})
-            for filename, content in starter_files.items():
-                File.objects.create(
-                    project=project,
-                    name=filename,
-                    relative_path=filename,
-                    content=content
-                )
-            
-            print(f"✅ Created fallback comprehensive final project with {len(starter_files)} starter files")
-            return project
-
     try:
-        response_content = chat_completion.choices[0].message.content.strip()
-        project_data = json.loads(response_content)
-    except json.JSONDecodeError as e:
+        print(f"🔄 Generating comprehensive final project...")
+        project_data = complete_structured("programming_exercise", messages, [client, second_client])
+        print(f"✅ Generated comprehensive final project structure")
+    except StructuredOutputError as e:
         print(f"JSON decode error in comprehensive final project: {e}")
-        # Try to extract JSON between first { and last }
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        if start != -1 and end > start:
-            try:
-                project_data = json.loads(response_content[start:end+1])
-            except json.JSONDecodeError:
-                # Use fallback data
-                project_data = {
-                    "starter_files": {
-                        "main.py": f"# Final Project: {user_prompt}\n# TODO: Implement the main functionality",
-                        "README.md": f"# Final Project: {user_prompt}\n\n## Description\nComprehensive final project"
-                    },
-                    "grading_method": "ai_review",
-                    "expected_output": ""
-                }
-        else:
-            # Use fallback data
-            project_data = {
-                "starter_files": {
-                    "main.py": f"# Final Project: {user_prompt}\n# TODO: Implement the main functionality",
-                    "README.md": f"# Final Project: {user_prompt}\n\n## Description\nComprehensive final project"
-                },
-                "grading_method": "ai_review",
-                "expected_output": ""
-            }
-    
-    # Create the Project object
-    project = Project.objects.create(
-        lesson=lesson,
-        name=f"Final Project: {user_prompt[:50]}...",
-        description=f"Comprehensive final project: {lesson.lesson_description}",
-        grading_method=project_data.get('grading_method', 'ai_review'),
-        expected_output=project_data.get('expected_output', ''),
-        is_final_project=True
-    )
+        # Use fallback data
+        project_data = {
+            "starter_files": {
+                "main.py": f"# Final Project: {user_prompt}\n# TODO: Implement the main functionality",
+                "README.md": f"# Final Project: {user_prompt}\n\n## Description\nComprehensive final project"
+            },
+            "grading_method": "ai_review",
+            "expected_output": ""
+        }
+    except Exception as e:
+        print(f"❌ All clients failed for comprehensive final project: {str(e)}")
+        # Create fallback project structure
+        project_data = {
+            "starter_files": {
+                "main.py": f"# Final Project: {user_prompt}\n# TODO: Implement the main functionality\n\ndef main():\n    # Your implementation here\n    pass\n\nif __name__ == '__main__':\n    main()",
+                "README.md": f"# Final Project: {user_prompt}\n\n## Description\nTODO: Describe your project\n\n## Requirements\nTODO: List requirements\n\n## Usage\nTODO: Explain how to use your project"
+            },
+            "grading_method": "ai_review",
+            "expected_output": ""
+        }
     
-    # Create File objects for starter files
     starter_files = project_data.get('starter_files', {})
-    for filename, content in starter_files.items():
-        File.objects.create(
-            project=project,
-            name=filename,
-            relative_path=filename,
-            content=content
+    
+    def save_project():
+        # Create the Project object
+        project = Project.objects.create(
+            lesson=lesson,
+            name=f"Final Project: {user_prompt[:50]}...",
+            description=f"Comprehensive final project: {lesson.lesson_description}",
+            grading_method=project_data.get('grading_method', 'ai_review'),
+            expected_output=project_data.get('expected_output', ''),
+            is_final_project=True
         )
+        
+        # Create File objects for starter files
+        for filename, content in starter_files.items():
+            File.objects.create(
+                project=project,
+                name=filename,
+                relative_path=filename,
+                content=content
+            )
+        return project
+    
+    project = write(save_project)
 
     print(f"✅ Generated comprehensive final project with {len(starter_files)} starter files")
     return project
@@ -960,20 +774,8 @@ def generate_course_name(user_prompt, chapter_list=None):
             },
         ]
 
-        # Try primary client
-        try:
-            chat = client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-235b-a22b-instruct-2507",
-            )
-        except Exception:
-            # Fallback to secondary client
-            chat = second_client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-235b-a22b-instruct-2507",
-            )
-
-        raw = chat.choices[0].message.content.strip()
+        # Try primary client, then fall back to secondary
+        raw = complete_text("course_name", messages, [client, second_client]).strip()
         # Clean common wrappers
         title = raw.strip().strip('"').strip("'")
         # Keep single line, reasonable length
@@ -996,6 +798,7 @@ def generate_course_name(user_prompt, chapter_list=None):
 def process_generation(request):
     """Process the form submission and save all workflow data to database."""
     course_generation = None
+    queued = getattr(settings, "GENERATION_QUEUE", False)
     
     try:
         # Ensure lesson types exist
@@ -1030,7 +833,7 @@ def process_generation(request):
             course_generation = CourseGeneration.objects.create(
                 user_prompt=user_text,
                 experience_level=experience_description,
-                status='generating'
+                status='pending' if queued else 'generating'
             )
             
             # Log start
@@ -1041,6 +844,52 @@ def process_generation(request):
                 message="Course generation process initiated"
             )
         
+        if queued:
+            # A generation worker (manage.py run_generation_worker) claims it
+            print(f"📥 [{timestamp}] Queued course generation ID: {course_generation.id}")
+            return JsonResponse({
+                'success': True,
+                'queued': True,
+                'message': 'Course generation queued',
+                'course_generation_id': course_generation.id,
+                'total_chapters': 0,
+                'total_lessons': 0,
+                'result': "Your course is queued and will be generated shortly"
+            })
+        
+        final_course_data = generate_course(course_generation)
+        
+        return JsonResponse({
+            'success': True,
+            'message': 'Course generated successfully!',
+            'course_generation_id': course_generation.id,
+            'total_chapters': course_generation.total_chapters,
+            'total_lessons': course_generation.total_lessons,
+            'result': f"Generated {course_generation.total_chapters} chapters with {course_generation.total_lessons} lessons",
+            'course_data': final_course_data  # Still send to frontend
+        })
+        
+    except Exception as e:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        print(f"❌ [{timestamp}] Error processing request: {str(e)}")
+        
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            'course_generation_id': course_generation.id if course_generation else None
+        }, status=400)
+
+def generate_course(course_generation):
+    """Generate chapters, lessons and their assets for a course record and mark it completed.
+    
+    Runs inline from process_generation, or in a generation worker for queued courses
+    (generation/jobs.py). On error the course is marked failed and the error re-raised.
+    """
+    user_text = course_generation.user_prompt
+    experience_description = course_generation.experience_level
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    try:
         print(f"🚀 [{timestamp}] Starting course generation for ID: {course_generation.id}")
         
         # Generate chapters
@@ -1094,8 +943,10 @@ def process_generation(request):
         
         print(f"� Starting parallel processing of {len(created_chapters)} chapters...")
         
-        # Use ThreadPoolExecutor for parallel processing
-        with ThreadPoolExecutor(max_workers=min(len(created_chapters), 4)) as executor:
+        # Use ThreadPoolExecutor for parallel processing. Every chapter gets a thread;
+        # how many provider calls actually run at once is decided by the adaptive
+        # per-provider limiters in generation/concurrency.py.
+        with ThreadPoolExecutor(max_workers=max(len(created_chapters), 1)) as executor:
             # Submit all chapter processing tasks
             future_to_chapter = {}
             for i, chapter in enumerate(created_chapters):
@@ -1131,6 +982,17 @@ def process_generation(request):
         
         print(f"🎉 Parallel processing completed! Total lessons generated: {total_lessons}")
         
+        # Every video lesson of the course is searched first, then all candidates' statistics
+        # are fetched together (one videos.list call per 50 ids) before each lesson is ranked
+        video_lessons = list(GeneratedLesson.objects.filter(chapter__course_generation=course_generation, lesson_type="vid"))
+        video_results = search_youtube_for_lessons(video_lessons)
+        # Lessons whose search or link failed get one more pass (cached searches make it cheap)
+        missing = [lesson for lesson in video_lessons if lesson.id not in video_results]
+        if missing:
+            print(f"🔁 Retrying YouTube search for {len(missing)} video lessons")
+            video_results.update(search_youtube_for_lessons(missing))
+        print(f"✅ Linked videos for {len(video_results)} of {len(video_lessons)} video lessons")
+        
         # Create final project chapter
         final_project_result = create_final_project_chapter(course_generation, user_text, len(created_chapters) + 1)
         if final_project_result['success']:
@@ -1187,12 +1049,13 @@ def process_generation(request):
             except Exception:
                 # If anything goes wrong, keep existing prompt
                 pass
-            course_generation.total_lessons = total_lessons
-            course_generation.total_chapters = len(created_chapters) + (1 if final_project_result['success'] else 0)  # Include final project chapter if successful
+            # Chapter, lesson and type counters from the stored lessons; ordinals for progress bitsets
+            recount_course(course_generation)
+            number_lessons(course_generation.id)
             course_generation.status = 'completed'
             course_generation.completed_at = timezone.now()
-            course_generation.course_data_json = final_course_data
             course_generation.save()
+            save_snapshot(course_generation.id, final_course_data)
             
             GenerationLog.objects.create(
                 course_generation=course_generation,
@@ -1203,49 +1066,34 @@ def process_generation(request):
         
         print(f"✅ [{timestamp}] Course generation completed successfully! ID: {course_generation.id}")
         
-        return JsonResponse({
-            'success': True,
-            'message': 'Course generated successfully!',
-            'course_generation_id': course_generation.id,
-            'total_chapters': course_generation.total_chapters,
-            'total_lessons': course_generation.total_lessons,
-            'result': f"Generated {course_generation.total_chapters} chapters with {course_generation.total_lessons} lessons",
-            'course_data': final_course_data  # Still send to frontend
-        })
+        return final_course_data
         
     except Exception as e:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"❌ [{timestamp}] Error processing request: {str(e)}")
+        print(f"❌ [{timestamp}] Course generation {course_generation.id} failed: {str(e)}")
         
-        # Log the error if we have a course_generation object
-        if course_generation:
-            try:
-                with transaction.atomic():
-                    course_generation.status = 'failed'
-                    course_generation.save()
-                    
-                    GenerationLog.objects.create(
-                        course_generation=course_generation,
-                        step="generation_error",
-                        status="failed",
-                        level="error",
-                        message=f"Course generation failed: {str(e)}"
-                    )
-            except Exception as log_error:
-                print(f"❌ Failed to log error: {str(log_error)}")
-            
-        return JsonResponse({
-            'success': False,
-            'error': str(e),
-            'course_generation_id': course_generation.id if course_generation else None
-        }, status=400)
+        try:
+            with transaction.atomic():
+                course_generation.status = 'failed'
+                course_generation.save()
+                
+                GenerationLog.objects.create(
+                    course_generation=course_generation,
+                    step="generation_error",
+                    status="failed",
+                    level="error",
+                    message=f"Course generation failed: {str(e)}"
+                )
+        except Exception as log_error:
+            print(f"❌ Failed to log error: {str(log_error)}")
+        raise
 
 
 def take_quiz(request, quiz_id):
     """Display the quiz for the user to take."""
     try:
-        quiz = MultipleChoiceQuiz.objects.get(id=quiz_id)
-        sidebar_ctx = _sidebar_context_for_lesson(quiz.lesson)
+        quiz = MultipleChoiceQuiz.objects.select_related('lesson__chapter').get(id=quiz_id)
+        sidebar_ctx = _sidebar_context_for_lesson(quiz.lesson, request)
         ctx = {
             'quiz': quiz,
             'questions': quiz.quiz_data.get('questions', [])
@@ -1262,7 +1110,7 @@ def take_quiz(request, quiz_id):
 def submit_quiz(request, quiz_id):
     """Process quiz submission and store results."""
     try:
-        quiz = MultipleChoiceQuiz.objects.get(id=quiz_id)
+        quiz = MultipleChoiceQuiz.objects.select_related('lesson__chapter').get(id=quiz_id)
         user_answers = {}
         
         # Collect user answers from POST data
@@ -1308,8 +1156,7 @@ def submit_quiz(request, quiz_id):
         # Mark lesson complete if score >= 70%
         try:
             if len(questions) > 0 and (correct_count / len(questions)) >= 0.1:
-                quiz.lesson.is_complete = True
-                quiz.lesson.save(update_fields=['is_complete'])
+                mark_complete(request, quiz.lesson)
         except Exception:
             pass
 
@@ -1321,7 +1168,7 @@ def submit_quiz(request, quiz_id):
             'total': len(questions),
             'percentage': percentage
         }
-        ctx.update(_sidebar_context_for_lesson(quiz.lesson))
+        ctx.update(_sidebar_context_for_lesson(quiz.lesson, request))
         return render(request, 'generation/quiz_results.html', ctx)
         
     except MultipleChoiceQuiz.DoesNotExist:
@@ -1334,49 +1181,96 @@ def submit_quiz(request, quiz_id):
         })
 
 
+# A video link that fails to save (e.g. the database stays locked past the busy
+# timeout) is retried a few times before the lesson is left for the next pass
+LINK_ATTEMPTS = 3
+LINK_BACKOFF = 0.5
+
+def youtube_query_for_lesson(lesson):
+    """YouTube search parameters for a lesson: its digest's video query, else an AI-generated one."""
+    digest = lesson_digest(lesson)
+    if digest.video_query:
+        return {'query': digest.video_query}
+    return generate_youtube_query({
+        'lesson_name': lesson.lesson_name,
+        'lesson_description': lesson.lesson_description,
+        'lesson_details': lesson.lesson_details,
+    })
+
+def link_lesson_videos(lesson, yt_results):
+    """Link the videos of a search result to a lesson from the shared catalog."""
+    def link():
+        for item in yt_results.get('items', []):
+            if not item['id'].get('videoId'):
+                continue
+            YouTubeVideo.objects.get_or_create(lesson=lesson, video=catalog_entry(item))
+    
+    # Called from generation threads, so the links are saved by the shared writer (generation/db_utils.py)
+    write(link)
+
 def search_youtube_for_lesson(lesson):
-    from .models import YouTubeVideo  
     try:
         if lesson.lesson_type != 'vid':
             print('YouTube search only available for learning lesson types.')
             return
-        lesson_dict = {
-            'lesson_name': lesson.lesson_name,
-            'lesson_description': lesson.lesson_description,
-            'lesson_details': lesson.lesson_details,
-        }
-        query = generate_youtube_query(lesson_dict)
-        yt_results = search_youtube(query)
+        yt_results = search_youtube(youtube_query_for_lesson(lesson))
         print(f"YouTube search completed for lesson {lesson.id}")
-        # Store top videos
-        items = yt_results.get('items', [])
-        for item in items:
-            vid = item['id'].get('videoId')
-            snippet = item.get('snippet', {})
-            if not vid:
-                continue
-            YouTubeVideo.objects.update_or_create(
-                lesson=lesson,
-                video_id=vid,
-                defaults={
-                    'title': snippet.get('title', ''),
-                    'description': snippet.get('description', ''),
-                    'thumbnail_url': snippet.get('thumbnails', {}).get('default', {}).get('url', ''),
-                    'channel_title': snippet.get('channelTitle', ''),
-                    'published_at': snippet.get('publishedAt', None),
-                    'video_url': f'https://www.youtube.com/watch?v={vid}',
-                    'raw_data': item
-                }
-            )
+        link_lesson_videos(lesson, yt_results)
         return yt_results
     except Exception as e:
         print(f"Error in YouTube search: {str(e)}")
         return None
     
+def search_youtube_for_lessons(lessons):
+    """Find and link videos for many lessons with shared statistics calls; returns lesson id -> results.
+    
+    Every lesson's search runs first (concurrently), then the statistics of all
+    candidates are fetched in one deduplicated video_statistics call, and only then is
+    each lesson's video ranked and linked. Lessons whose search failed are left out.
+    """
+    if not lessons:
+        return {}
+    
+    def find(lesson):
+        try:
+            return find_videos(youtube_query_for_lesson(lesson))
+        except Exception as e:
+            print(f"Error in YouTube search for lesson {lesson.id}: {str(e)}")
+            return None
+        finally:
+            connection.close()
+    
+    with ThreadPoolExecutor(max_workers=min(len(lessons), 4)) as executor:
+        found = dict(zip([lesson.id for lesson in lessons], executor.map(find, lessons)))
+    
+    video_ids = list(dict.fromkeys(vid for entry in found.values() if entry for vid in candidate_ids(entry)))
+    stats_map = video_statistics(video_ids)
+    
+    results = {}
+    for lesson in lessons:
+        if found[lesson.id] is None:
+            continue
+        try:
+            yt_results = rank_videos(found[lesson.id], stats_map)
+        except Exception as e:
+            print(f"Error ranking YouTube videos for lesson {lesson.id}: {str(e)}")
+            continue
+        for attempt in range(1, LINK_ATTEMPTS + 1):
+            try:
+                link_lesson_videos(lesson, yt_results)
+                results[lesson.id] = yt_results
+                break
+            except DatabaseError as e:
+                print(f"⚠️ Linking YouTube videos for lesson {lesson.id} failed (attempt {attempt}/{LINK_ATTEMPTS}): {str(e)}")
+                if attempt < LINK_ATTEMPTS:
+                    time.sleep(LINK_BACKOFF * attempt)
+    return results
+    
 def generate_programming_exercise(lesson):
     """Generate a programming project for a given lesson using Cerebras API."""
-    chat_completion = client.chat.completions.create(
-        messages=[
+    project_data = complete_structured(
+        "programming_exercise",
+        [
             {
                 "role": "system",
                 "content": """
@@ -1419,41 +1313,32 @@ def generate_programming_exercise(lesson):
                 """,
             }
         ],
-        model="qwen-3-coder-480b",
+        client,
     )
-
-    response_content = chat_completion.choices[0].message.content
-    try:
-        project_data = json.loads(response_content.strip())
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in generate_programming_exercise: {e}")
-        print(f"Response content length: {len(response_content)}")
-        # Try to extract JSON between first { and last }
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        if start != -1 and end > start:
-            project_data = json.loads(response_content[start:end+1])
-        else:
-            raise ValueError("No JSON object found in response")
     
-    # Create the Project object
-    project = Project.objects.create(
-        lesson=lesson,
-        name=f"Exercise for {lesson.lesson_name}",
-        description=f"Programming exercise: {lesson.lesson_description}",
-        grading_method=project_data.get('grading_method', 'ai_review'),
-        expected_output=project_data.get('expected_output', '')
-    )
-    
-    # Create File objects for starter files
     starter_files = project_data.get('starter_files', {})
-    for filename, content in starter_files.items():
-        File.objects.create(
-            project=project,
-            name=filename,
-            relative_path=filename,
-            content=content
+    
+    def save_project():
+        # Create the Project object
+        project = Project.objects.create(
+            lesson=lesson,
+            name=f"Exercise for {lesson.lesson_name}",
+            description=f"Programming exercise: {lesson.lesson_description}",
+            grading_method=project_data.get('grading_method', 'ai_review'),
+            expected_output=project_data.get('expected_output', '')
         )
+        
+        # Create File objects for starter files
+        for filename, content in starter_files.items():
+            File.objects.create(
+                project=project,
+                name=filename,
+                relative_path=filename,
+                content=content
+            )
+        return project
+    
+    project = write(save_project)
 
     print(f"✅ Generated programming exercise for Lesson {lesson.lesson_number} with {len(starter_files)} starter files")
     
@@ -1462,16 +1347,15 @@ def generate_programming_exercise(lesson):
 def lesson_youtube(request, lesson_id):
     """Display the YouTube video(s) for a lesson."""
     from .models import GeneratedLesson
-    lesson = GeneratedLesson.objects.get(id=lesson_id)
+    lesson = GeneratedLesson.objects.select_related('chapter').get(id=lesson_id)
     # Mark as complete when user visits the video lesson
-    if not lesson.is_complete:
-        try:
-            lesson.is_complete = True
-            lesson.save(update_fields=['is_complete'])
-        except Exception:
-            pass
-    ctx = {'lesson': lesson}
-    ctx.update(_sidebar_context_for_lesson(lesson))
+    try:
+        mark_complete(request, lesson)
+    except Exception:
+        pass
+    videos = [entry.video for entry in lesson.youtube_videos.select_related('video')]
+    ctx = {'lesson': lesson, 'videos': videos}
+    ctx.update(_sidebar_context_for_lesson(lesson, request))
     return render(request, 'generation/youtube_vid.html', ctx)
 
 def load_lesson_project(request, lesson_id):
@@ -1479,7 +1363,7 @@ def load_lesson_project(request, lesson_id):
     workspace_path = '/Users/aditya/Documents/Programming/Hackathon/PennApps/pennapps25/workspace-python/'
     
     # Get the lesson
-    lesson = get_object_or_404(GeneratedLesson, id=lesson_id)
+    lesson = get_object_or_404(GeneratedLesson.objects.select_related('chapter'), id=lesson_id)
     
     # Get the associated project
     try:
@@ -1534,7 +1418,7 @@ def load_lesson_project(request, lesson_id):
         'project': project,
         'files': files
     }
-    context.update(_sidebar_context_for_lesson(lesson))
+    context.update(_sidebar_context_for_lesson(lesson, request))
     
     return render(request, 'generation/code_editor.html', context)
 
@@ -1630,20 +1514,9 @@ def final_project_feedback(request, lesson_id):
         ]
 
         try:
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-coder-480b",
-            )
-            response_content = chat_completion.choices[0].message.content.strip()
-            try:
-                data = json.loads(response_content)
-            except json.JSONDecodeError:
-                start = response_content.find('{')
-                end = response_content.rfind('}')
-                if start != -1 and end > start:
-                    data = json.loads(response_content[start:end+1])
-                else:
-                    data = {"bullets": ["Feedback temporarily unavailable.", "Please try again shortly.", "" , "", ""]}
+            data = complete_structured("project_feedback", messages, client)
+        except StructuredOutputError:
+            data = {"bullets": ["Feedback temporarily unavailable.", "Please try again shortly.", "" , "", ""]}
         except Exception as e:
             print(f"❌ Final project feedback error: {e}")
             data = {"bullets": [
@@ -1760,81 +1633,72 @@ def submit_code_correction(request, lesson_id):
         print(f"📄 Files included: {included_files}")
         
         # Use Cerebras API to correct the code
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"""
-                    You are an expert programming instructor. Your task is to analyze and correct student code for a programming exercise that may contain multiple files.
-
-                    Lesson Context:
-                    - Lesson: {lesson.lesson_name}
-                    - Description: {lesson.lesson_description}
-                    - Details: {lesson.lesson_details}
-                    - Goals: {lesson.lesson_goals}
-
-                    The student has submitted a complete project with multiple files. Your task is to:
-                    1. Analyze ALL files in the project comprehensively
-                    2. Identify syntax errors, logical errors, architectural issues, and improvements needed across all files
-                    3. Check for proper file organization, imports, and inter-file dependencies
-                    4. Provide corrected code for files that need changes
-                    5. Explain what was wrong and how you fixed it across the entire project
-                    6. Suggest improvements, best practices, and architectural recommendations
-                    7. Give an overall PASS/FAIL assessment based on whether the complete project meets lesson requirements
-
-                    Return your response as JSON with the following structure:
-                    {{
-                        "pass_fail": "PASS" or "FAIL",
-                        "corrected_code": {{
-                            "main.py": "corrected main file content",
-                            "utils.py": "corrected utils file content",
-                            "other_file.py": "corrected content for other files as needed"
-                        }},
-                        "explanation": "detailed explanation of changes across all files and overall project structure",
-                        "issues_found": ["list of issues identified across all files"],
-                        "suggestions": ["list of improvement suggestions for the entire project"],
-                        "file_analysis": {{
-                            "main.py": "specific analysis and issues for this file",
-                            "utils.py": "specific analysis and issues for this file"
+        try:
+            correction_data = complete_structured(
+                "code_correction",
+                [
+                    {
+                        "role": "system",
+                        "content": f"""
+                        You are an expert programming instructor. Your task is to analyze and correct student code for a programming exercise that may contain multiple files.
+
+                        Lesson Context:
+                        - Lesson: {lesson.lesson_name}
+                        - Description: {lesson.lesson_description}
+                        - Details: {lesson.lesson_details}
+                        - Goals: {lesson.lesson_goals}
+
+                        The student has submitted a complete project with multiple files. Your task is to:
+                        1. Analyze ALL files in the project comprehensively
+                        2. Identify syntax errors, logical errors, architectural issues, and improvements needed across all files
+                        3. Check for proper file organization, imports, and inter-file dependencies
+                        4. Provide corrected code for files that need changes
+                        5. Explain what was wrong and how you fixed it across the entire project
+                        6. Suggest improvements, best practices, and architectural recommendations
+                        7. Give an overall PASS/FAIL assessment based on whether the complete project meets lesson requirements
+
+                        Return your response as JSON with the following structure:
+                        {{
+                            "pass_fail": "PASS" or "FAIL",
+                            "corrected_code": {{
+                                "main.py": "corrected main file content",
+                                "utils.py": "corrected utils file content",
+                                "other_file.py": "corrected content for other files as needed"
+                            }},
+                            "explanation": "detailed explanation of changes across all files and overall project structure",
+                            "issues_found": ["list of issues identified across all files"],
+                            "suggestions": ["list of improvement suggestions for the entire project"],
+                            "file_analysis": {{
+                                "main.py": "specific analysis and issues for this file",
+                                "utils.py": "specific analysis and issues for this file"
+                            }}
                         }}
-                    }}
 
-                    For PASS/FAIL assessment:
-                    - PASS: All files work together properly, no critical errors, meets core lesson objectives
-                    - FAIL: Critical errors in any file, improper file organization, or doesn't meet basic lesson requirements
+                        For PASS/FAIL assessment:
+                        - PASS: All files work together properly, no critical errors, meets core lesson objectives
+                        - FAIL: Critical errors in any file, improper file organization, or doesn't meet basic lesson requirements
 
-                    Be comprehensive in your analysis - look at the entire project as a cohesive system.
-                    Be helpful, educational, and encouraging. Focus on teaching why changes are needed.
-                    Only include files in corrected_code that actually need corrections.
-                    """,
-                },
-                {
-                    "role": "user",
-                    "content": f"Here is my complete project for the lesson '{lesson.lesson_name}':\n\n{code_summary}"
-                }
-            ],
-            model="qwen-3-coder-480b",
-        )
-
-        response_content = chat_completion.choices[0].message.content
-        
-        try:
-            correction_data = json.loads(response_content.strip())
-        except json.JSONDecodeError:
-            # Try to extract JSON
-            start = response_content.find('{')
-            end = response_content.rfind('}')
-            if start != -1 and end > start:
-                correction_data = json.loads(response_content[start:end+1])
-            else:
-                correction_data = {
-                    "pass_fail": "UNKNOWN",
-                    "corrected_code": response_content,
-                    "explanation": "Code analysis completed",
-                    "issues_found": ["Analysis provided"],
-                    "suggestions": ["Review the corrected code"],
-                    "grade": "N/A"
-                }
+                        Be comprehensive in your analysis - look at the entire project as a cohesive system.
+                        Be helpful, educational, and encouraging. Focus on teaching why changes are needed.
+                        Only include files in corrected_code that actually need corrections.
+                        """,
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Here is my complete project for the lesson '{lesson.lesson_name}':\n\n{code_summary}"
+                    }
+                ],
+                client,
+            )
+        except StructuredOutputError as e:
+            correction_data = {
+                "pass_fail": "UNKNOWN",
+                "corrected_code": e.content,
+                "explanation": "Code analysis completed",
+                "issues_found": ["Analysis provided"],
+                "suggestions": ["Review the corrected code"],
+                "grade": "N/A"
+            }
         
         # Update files with corrected code
         if 'corrected_code' in correction_data:
@@ -1859,9 +1723,7 @@ def submit_code_correction(request, lesson_id):
             if isinstance(correction_data, dict):
                 pass_fail_value = correction_data.get('pass_fail')
             if isinstance(pass_fail_value, str) and pass_fail_value.upper() == 'PASS':
-                if not lesson.is_complete:
-                    lesson.is_complete = True
-                    lesson.save(update_fields=['is_complete'])
+                mark_complete(request, lesson)
                 lesson_completed = True
             else:
                 lesson_completed = False
@@ -1884,40 +1746,37 @@ def submit_code_correction(request, lesson_id):
 # --------------- Additional lesson pages ---------------
 def lesson_article(request, lesson_id):
     """Display generated article content for a lesson (art)."""
-    lesson = get_object_or_404(GeneratedLesson, id=lesson_id)
+    lesson = get_object_or_404(GeneratedLesson.objects.select_related('chapter'), id=lesson_id)
     article = getattr(lesson, 'article', None)
     # Mark as complete on article view
-    if not lesson.is_complete:
-        try:
-            lesson.is_complete = True
-            lesson.save(update_fields=['is_complete'])
-        except Exception:
-            pass
+    try:
+        mark_complete(request, lesson)
+    except Exception:
+        pass
     ctx = {'lesson': lesson, 'article': article}
-    ctx.update(_sidebar_context_for_lesson(lesson))
+    ctx.update(_sidebar_context_for_lesson(lesson, request))
     return render(request, 'generation/article.html', ctx)
 
 
 def lesson_external(request, lesson_id):
     """Display an external article link for a lesson (ext)."""
-    lesson = get_object_or_404(GeneratedLesson, id=lesson_id)
+    lesson = get_object_or_404(GeneratedLesson.objects.select_related('chapter'), id=lesson_id)
     external = getattr(lesson, 'external_article', None)
     # Mark as complete on external lesson view
-    if not lesson.is_complete:
-        try:
-            lesson.is_complete = True
-            lesson.save(update_fields=['is_complete'])
-        except Exception:
-            pass
+    try:
+        mark_complete(request, lesson)
+    except Exception:
+        pass
     ctx = {'lesson': lesson, 'external': external}
-    ctx.update(_sidebar_context_for_lesson(lesson))
+    ctx.update(_sidebar_context_for_lesson(lesson, request))
     return render(request, 'generation/external_article.html', ctx)
 
 
 def generate_text_response_questions(lesson):
     """Generate 2-5 questions for text response lessons using Cerebras API."""
-    chat_completion = client.chat.completions.create(
-        messages=[
+    questions_data = complete_structured(
+        "text_questions",
+        [
             {
                 "role": "system",
                 "content": """
@@ -1966,35 +1825,17 @@ def generate_text_response_questions(lesson):
                 """,
             }
         ],
-        model="qwen-3-coder-480b",
+        client,
     )
-
-    response_content = chat_completion.choices[0].message.content
-    try:
-        questions_data = json.loads(response_content.strip())
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in generate_text_response_questions: {e}")
-        print(f"Response content length: {len(response_content)}")
-        # Try to extract JSON between first { and last }
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        if start != -1 and end > start:
-            json_str = response_content[start:end+1].strip()
-            try:
-                questions_data = json.loads(json_str)
-            except json.JSONDecodeError as e2:
-                print(f"Failed to parse extracted JSON: {e2}")
-                raise ValueError("Unable to parse questions JSON")
-        else:
-            raise ValueError("No JSON object found in response")
+    
+    questions = questions_data.get('questions', [])
     
     # Save questions to the database using the new model
-    with transaction.atomic():
+    def save_questions():
         # Delete existing questions for this lesson
         TextResponseQuestion.objects.filter(lesson=lesson).delete()
         
         # Create new questions
-        questions = questions_data.get('questions', [])
         for question_data in questions:
             TextResponseQuestion.objects.create(
                 lesson=lesson,
@@ -2003,6 +1844,8 @@ def generate_text_response_questions(lesson):
                 optimal_answer=question_data.get('optimal_answer', '')
             )
     
+    write(save_questions)
+    
     print(f"✅ Generated and saved {len(questions)} text response questions for Lesson {lesson.lesson_number} in Chapter {lesson.chapter.chapter_number}")
     
     return questions_data
@@ -2029,100 +1872,86 @@ def grade_text_responses(lesson, user_answers):
             "user_answer": user_answer
         })
     
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                    You are an expert educational assessor and grader. Your task is to evaluate student text responses to questions.
+    try:
+        grades_data = complete_structured(
+            "text_grades",
+            [
+                {
+                    "role": "system",
+                    "content": """
+                        You are an expert educational assessor and grader. Your task is to evaluate student text responses to questions.
 
-                    For each question, you will be provided with:
-                    - The original question
-                    - The optimal answer (reference answer)
-                    - The student's actual answer
+                        For each question, you will be provided with:
+                        - The original question
+                        - The optimal answer (reference answer)
+                        - The student's actual answer
 
-                    Grade each answer on a scale of 0-100 based on:
-                    - Accuracy: How correct is the information?
-                    - Completeness: Does it cover the key points?
-                    - Understanding: Does the student demonstrate comprehension?
-                    - Clarity: Is the answer well-structured and clear?
+                        Grade each answer on a scale of 0-100 based on:
+                        - Accuracy: How correct is the information?
+                        - Completeness: Does it cover the key points?
+                        - Understanding: Does the student demonstrate comprehension?
+                        - Clarity: Is the answer well-structured and clear?
 
-                    Provide constructive feedback explaining what was good and what could be improved.
+                        Provide constructive feedback explaining what was good and what could be improved.
 
-                    Output format: Return ONLY valid JSON in the following structure:
-                    {
-                        "grades": [
-                            {
-                                "question_number": 1,
-                                "score": 85,
-                                "feedback": "Good understanding of the core concepts. You correctly identified the main benefits but could have elaborated more on collaboration aspects.",
-                                "strengths": ["Accurate information", "Clear structure"],
-                                "improvements": ["Add more detail on team collaboration", "Include specific examples"]
-                            },
-                            {
-                                "question_number": 2,
-                                "score": 92,
-                                "feedback": "Excellent response with clear examples and comprehensive coverage of error handling techniques.",
-                                "strengths": ["Complete coverage", "Good examples", "Clear explanation"],
-                                "improvements": ["Minor: Could mention logging best practices"]
-                            }
-                        ],
-                        "overall_score": 88.5,
-                        "overall_feedback": "Strong performance overall. Good understanding of key concepts with room for more detailed explanations."
-                    }
+                        Output format: Return ONLY valid JSON in the following structure:
+                        {
+                            "grades": [
+                                {
+                                    "question_number": 1,
+                                    "score": 85,
+                                    "feedback": "Good understanding of the core concepts. You correctly identified the main benefits but could have elaborated more on collaboration aspects.",
+                                    "strengths": ["Accurate information", "Clear structure"],
+                                    "improvements": ["Add more detail on team collaboration", "Include specific examples"]
+                                },
+                                {
+                                    "question_number": 2,
+                                    "score": 92,
+                                    "feedback": "Excellent response with clear examples and comprehensive coverage of error handling techniques.",
+                                    "strengths": ["Complete coverage", "Good examples", "Clear explanation"],
+                                    "improvements": ["Minor: Could mention logging best practices"]
+                                }
+                            ],
+                            "overall_score": 88.5,
+                            "overall_feedback": "Strong performance overall. Good understanding of key concepts with room for more detailed explanations."
+                        }
 
-                    Be fair, constructive, and encouraging in your feedback.
-                    DO NOT include any additional text outside the JSON.
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
-                    Lesson: {lesson.lesson_name}
+                        Be fair, constructive, and encouraging in your feedback.
+                        DO NOT include any additional text outside the JSON.
+                    """,
+                },
+                {
+                    "role": "user",
+                    "content": f"""
+                        Lesson: {lesson.lesson_name}
                     
-                    Please grade the following responses:
+                        Please grade the following responses:
                     
-                    {json.dumps(grading_data, indent=2)}
-                """,
-            }
-        ],
-        model="qwen-3-coder-480b",
-    )
-
-    response_content = chat_completion.choices[0].message.content
-    try:
-        grades_data = json.loads(response_content.strip())
-    except json.JSONDecodeError as e:
-        print(f"JSON decode error in grade_text_responses: {e}")
-        print(f"Response content length: {len(response_content)}")
-        # Try to extract JSON between first { and last }
-        start = response_content.find('{')
-        end = response_content.rfind('}')
-        if start != -1 and end > start:
-            json_str = response_content[start:end+1].strip()
-            try:
-                grades_data = json.loads(json_str)
-            except json.JSONDecodeError as e2:
-                print(f"Failed to parse extracted JSON: {e2}")
-                # Create fallback grades
-                fallback_grades = {
-                    "grades": [],
-                    "overall_score": 75.0,
-                    "overall_feedback": "Your responses have been received and reviewed."
+                        {json.dumps(grading_data, indent=2)}
+                    """,
                 }
-                for question in questions:
-                    question_num = str(question.question_number)
-                    if question_num in user_answers and user_answers[question_num].strip():
-                        fallback_grades["grades"].append({
-                            "question_number": question.question_number,
-                            "score": 75,
-                            "feedback": "Your response shows understanding of the topic.",
-                            "strengths": ["Shows engagement with the material"],
-                            "improvements": ["Consider adding more specific details"]
-                        })
-                return fallback_grades
-        else:
-            raise ValueError("No JSON object found in response")
+            ],
+            client,
+        )
+    except StructuredOutputError as e:
+        print(f"Failed to parse grading JSON: {e}")
+        # Create fallback grades
+        fallback_grades = {
+            "grades": [],
+            "overall_score": 75.0,
+            "overall_feedback": "Your responses have been received and reviewed."
+        }
+        for question in questions:
+            question_num = str(question.question_number)
+            if question_num in user_answers and user_answers[question_num].strip():
+                fallback_grades["grades"].append({
+                    "question_number": question.question_number,
+                    "score": 75,
+                    "feedback": "Your response shows understanding of the topic.",
+                    "strengths": ["Shows engagement with the material"],
+                    "improvements": ["Consider adding more specific details"]
+                })
+        return fallback_grades
     
     print(f"✅ Graded {len(grades_data.get('grades', []))} responses for Lesson {lesson.lesson_number} in Chapter {lesson.chapter.chapter_number}")
     
@@ -2131,7 +1960,7 @@ def grade_text_responses(lesson, user_answers):
 
 def lesson_text_response(request, lesson_id):
     """Display text response questions for a lesson (txt)."""
-    lesson = get_object_or_404(GeneratedLesson, id=lesson_id)
+    lesson = get_object_or_404(GeneratedLesson.objects.select_related('chapter'), id=lesson_id)
     
     # Check if questions exist in the database
     questions = TextResponseQuestion.objects.filter(lesson=lesson).order_by('question_number')
@@ -2157,7 +1986,7 @@ def lesson_text_response(request, lesson_id):
         'lesson': lesson, 
         'questions': questions
     }
-    ctx.update(_sidebar_context_for_lesson(lesson))
+    ctx.update(_sidebar_context_for_lesson(lesson, request))
     return render(request, 'generation/text_response.html', ctx)
 
 
@@ -2211,8 +2040,7 @@ def submit_text_responses(request, lesson_id):
         # Mark lesson complete if overall score >= 70
         try:
             if grades_data.get('overall_score', 0) >= 70:
-                lesson.is_complete = True
-                lesson.save(update_fields=['is_complete'])
+                mark_complete(request, lesson)
         except Exception:
             pass
 
@@ -2244,19 +2072,15 @@ def course_detail(request, course_id):
                    .prefetch_related('lessons', 'lessons__quiz', 'lessons__article', 'lessons__external_article')
                    .order_by('chapter_number'))
         
-        # Calculate totals
-        total_lessons = sum(chapter.lessons.count() for chapter in chapters)
-        total_chapters = chapters.count()
-        
-        # Get lesson type stats
-        lesson_type_counts = {}
-        for chapter in chapters:
-            for lesson in chapter.lessons.all():
-                lesson_type = lesson.lesson_type
-                lesson_type_counts[lesson_type] = lesson_type_counts.get(lesson_type, 0) + 1
+        # Totals and lesson type stats are counters stored on the course row
+        total_lessons = course_generation.total_lessons
+        total_chapters = course_generation.total_chapters
+        lesson_type_counts = course_generation.lesson_type_counts
         
-        # Calculate completion percentage (for now, just based on status)
-        completion_percentage = 100 if course_generation.status == 'completed' else 0
+        # This learner's progress: one bitset read, mapped to lessons through the cached tree
+        completed_ids = completed_lesson_ids(completed_bits(request, course_generation.id),
+                                             course_tree(course_generation.id))
+        completion_percentage = percent_complete(len(completed_ids), total_lessons)
         
         context = {
             'course_generation': course_generation,
@@ -2264,6 +2088,7 @@ def course_detail(request, course_id):
             'total_chapters': total_chapters,
             'total_lessons': total_lessons,
             'lesson_type_counts': lesson_type_counts,
+            'completed_lesson_ids': completed_ids,
             'completion_percentage': completion_percentage,
         }
         
@@ -2275,12 +2100,28 @@ def course_detail(request, course_id):
         })
 
 
+def course_snapshot(request, course_id):
+    """Stream a course's complete generated data (outline and lesson plans) as JSON."""
+    chunks = stream_snapshot(course_id)
+    if chunks is None:
+        return JsonResponse({'error': 'Course snapshot not found'}, status=404)
+    return StreamingHttpResponse(chunks, content_type='application/json')
+
+
 def course_list(request):
-    """Display all generated courses."""
-    courses = CourseGeneration.objects.all().order_by('-created_at')
+    """Display generated courses, newest first, one keyset page at a time."""
+    cursor = request.GET.get('after')
+    # Only what the cards render; the lesson type counters' JSON stays in the database
+    courses = CourseGeneration.objects.only(
+        'id', 'user_prompt', 'status', 'total_chapters', 'total_lessons', 'created_at', 'completed_at'
+    )
+    page, next_cursor = keyset_page(courses, 'created_at', cursor)
     
     context = {
-        'courses': courses
+        'courses': page,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+        'total_courses': cached_count('courses', CourseGeneration.objects.all()),
     }
     
     return render(request, 'generation/course_list.html', context)
@@ -2340,56 +2181,13 @@ def generate_ai_code_feedback(code_content, file_name="main.py", lesson_context=
             }
         ]
         
-        # Try primary client first
         try:
-            print(f"🔄 Generating AI feedback for {file_name} with primary Cerebras client...")
-            chat_completion = client.chat.completions.create(
-                messages=messages,
-                model="qwen-3-coder-480b",
-            )
-            print("✅ Primary client succeeded for AI feedback")
-        except Exception as e:
-            print(f"❌ Primary client failed for AI feedback: {str(e)}")
-            try:
-                print(f"🔄 Retrying AI feedback with secondary Cerebras client...")
-                chat_completion = second_client.chat.completions.create(
-                    messages=messages,
-                    model="qwen-3-coder-480b",
-                )
-                print("✅ Secondary client succeeded for AI feedback")
-            except Exception as e2:
-                print(f"❌ Secondary client also failed for AI feedback: {str(e2)}")
-                # Return fallback feedback
-                return {
-                    "feedback_items": [
-                        {
-                            "type": "encouragement",
-                            "priority": 3,
-                            "title": "Keep coding!",
-                            "message": "You're making great progress! Keep working on your implementation.",
-                            "line_reference": ""
-                        }
-                    ],
-                    "overall_assessment": "AI feedback temporarily unavailable, but you're doing great!"
-                }
-
-        response_content = chat_completion.choices[0].message.content.strip()
-        
-        try:
-            feedback_data = json.loads(response_content)
+            print(f"🔄 Generating AI feedback for {file_name}...")
+            feedback_data = complete_structured("code_feedback", messages, [client, second_client])
+            print("✅ Generated AI feedback")
             return feedback_data
-        except json.JSONDecodeError as e:
+        except StructuredOutputError as e:
             print(f"JSON decode error in AI feedback: {e}")
-            # Try to extract JSON between first { and last }
-            start = response_content.find('{')
-            end = response_content.rfind('}')
-            if start != -1 and end > start:
-                try:
-                    feedback_data = json.loads(response_content[start:end+1])
-                    return feedback_data
-                except json.JSONDecodeError:
-                    pass
-            
             # Return fallback feedback if JSON parsing fails
             return {
                 "feedback_items": [
@@ -2403,6 +2201,21 @@ def generate_ai_code_feedback(code_content, file_name="main.py", lesson_context=
                 ],
                 "overall_assessment": "Code analysis in progress..."
             }
+        except Exception as e:
+            print(f"❌ All clients failed for AI feedback: {str(e)}")
+            # Return fallback feedback
+            return {
+                "feedback_items": [
+                    {
+                        "type": "encouragement",
+                        "priority": 3,
+                        "title": "Keep coding!",
+                        "message": "You're making great progress! Keep working on your implementation.",
+                        "line_reference": ""
+                    }
+                ],
+                "overall_assessment": "AI feedback temporarily unavailable, but you're doing great!"
+            }
             
     except Exception as e:
         print(f"❌ Error generating AI feedback: {str(e)}")
@@ -2463,12 +2276,11 @@ def get_ai_feedback(request):
         # If lesson provided and feedback indicates PASS, mark lesson complete
         try:
             if lesson_id:
-                lesson = GeneratedLesson.objects.get(id=lesson_id)
+                lesson = GeneratedLesson.objects.select_related('chapter').get(id=lesson_id)
                 pass_fail = feedback.get('pass_fail') if isinstance(feedback, dict) else None
                 # Some responses may have nested fields; handle common cases
                 if isinstance(pass_fail, str) and pass_fail.upper() == 'PASS':
-                    lesson.is_complete = True
-                    lesson.save(update_fields=['is_complete'])
+                    mark_complete(request, lesson)
         except Exception:
             pass
         
@@ -2490,4 +2302,21 @@ def get_ai_feedback(request):
                 }
             ],
             'overall_assessment': "System temporarily unavailable"
-        }, status=500)
\ No newline at end of file
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def provider_metrics(request):
+    """JSON snapshot of adaptive concurrency limits, model routing, call coalescing, retrieval cache, YouTube quota and database lock waits."""
+    # Internal state (quota, key-level limits, lock stats) is for staff only
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required'}, status=403)
+    return JsonResponse({
+        'limiters': limiter_stats(),
+        'models': model_stats(),
+        'coalescing': flight_stats(),
+        'retrieval_cache': retrieval_cache_stats(),
+        'youtube_quota': quota_usage(),
+        'youtube_stats_batching': batching_stats(),
+        'database': db_stats(),
+    })
@@ -1,74 +1,86 @@
+import asyncio
+import copy
+import hashlib
+import json
 import os
-import requests
-from cerebras.cloud.sdk import Cerebras
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from datetime import timedelta
+from zoneinfo import ZoneInfo
 import dotenv
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+from .llm_utils import complete_structured, StructuredOutputError
+from .singleflight import call_key, flight
+from .concurrency import key_id, limiter
+from .db_utils import write
+from . import providers
+from .models import VideoCatalog, VideoQueryMatch, YouTubeQuotaUsage, YouTubeSearchCache
 
 dotenv.load_dotenv()
 
-client = Cerebras(api_key=os.getenv('CEREBRAS_API_KEY'))
+client = providers.lazy("cerebras")
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 YOUTUBE_SEARCH_URL = 'https://www.googleapis.com/youtube/v3/search'
+YOUTUBE_VIDEOS_URL = 'https://www.googleapis.com/youtube/v3/videos'
+# (connect, read) seconds; a stuck request must not hold a limiter slot forever
+DEFAULT_HTTP_TIMEOUT = (3.05, 10)
 
 def generate_youtube_query(lesson):
     """Use Cerebras API to generate a YouTube search query and relevant parameters for a lesson."""
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": """
-                    You are an expert educational content curator specializing in finding the best YouTube videos for learning. Your task is to generate a JSON object for a YouTube search API call to find the most relevant educational video, based on the lesson details provided.
-
-                    The JSON should include:
-                    - query: a concise search query string
-                    - relevanceLanguage: the most relevant language code (ISO 639-1, e.g. 'en'), if possible
-                    - regionCode: the most relevant country code (ISO 3166-1 alpha-2, e.g. 'US'), if possible
-                    - videoCategoryId: the most relevant YouTube video category ID (as a string), if possible
-
-                    The video must be a maximum of 20 minutes long. 
-                    Only return the JSON object, no explanations or extra text.
-                """,
-            },
-            {
-                "role": "user",
-                "content": f"""
-                    Lesson Name: {lesson['lesson_name']}
-                    Lesson Description: {lesson['lesson_description']}
-                    Lesson Details: {lesson['lesson_details']}
-                """,
-            }
-        ],
-        model="qwen-3-coder-480b",
-    )
-    # Parse JSON from response
-    import json
-    result = chat_completion.choices[0].message.content.strip()
     try:
-        params = json.loads(result)
-    except json.JSONDecodeError as e:
+        params = complete_structured(
+            "youtube_query",
+            [
+                {
+                    "role": "system",
+                    "content": """
+                        You are an expert educational content curator specializing in finding the best YouTube videos for learning. Your task is to generate a JSON object for a YouTube search API call to find the most relevant educational video, based on the lesson details provided.
+
+                        The JSON should include:
+                        - query: a concise search query string
+                        - relevanceLanguage: the most relevant language code (ISO 639-1, e.g. 'en'), if possible
+                        - regionCode: the most relevant country code (ISO 3166-1 alpha-2, e.g. 'US'), if possible
+                        - videoCategoryId: the most relevant YouTube video category ID (as a string), if possible
+
+                        The video must be a maximum of 20 minutes long. 
+                        Only return the JSON object, no explanations or extra text.
+                    """,
+                },
+                {
+                    "role": "user",
+                    "content": f"""
+                        Lesson Name: {lesson['lesson_name']}
+                        Lesson Description: {lesson['lesson_description']}
+                        Lesson Details: {lesson['lesson_details']}
+                    """,
+                }
+            ],
+            client,
+        )
+    except StructuredOutputError as e:
         print(f"JSON decode error in generate_youtube_query: {e}")
-        print(f"Response content length: {len(result)}")
-        # Try to extract JSON between first { and last }
-        start = result.find('{')
-        end = result.rfind('}')
-        if start != -1 and end > start:
-            json_str = result[start:end+1].strip()
-            try:
-                params = json.loads(json_str)
-            except json.JSONDecodeError as e2:
-                print(f"Failed to parse extracted JSON: {e2}")
-                params = {"query": result}
-        else:
-            params = {"query": result}
+        params = {"query": e.content.strip()}
+    if not params.get("query"):
+        params["query"] = f"{lesson['lesson_name']} tutorial"
     return params
 
 def search_youtube(query_params, max_results=5):
     """Search YouTube for videos matching the query, return the single best video (most relevant, then highest view or like count)."""
+    # Lessons that land on the same query share one search + videos.list round trip
+    return flight("youtube").do(call_key(query_params, max_results), _search_youtube, query_params, max_results)
+
+def _search_params(query_params, max_results):
     params = {
         'part': 'snippet',
         'q': query_params.get('query', ''),
         'type': 'video',
         'maxResults': max_results,
-        'key': YOUTUBE_API_KEY,
         'safeSearch': 'strict',
         'videoDuration': 'medium',
         'order': 'relevance',  # First, get most relevant
@@ -79,27 +91,374 @@ def search_youtube(query_params, max_results=5):
         params['regionCode'] = query_params['regionCode']
     if 'videoCategoryId' in query_params:
         params['videoCategoryId'] = query_params['videoCategoryId']
-    response = requests.get(YOUTUBE_SEARCH_URL, params=params)
+    return params
+
+# --------------- HTTP ---------------
+# Every call goes through one keep-alive pool per process (providers "youtube_http"),
+# so a lesson's search.list and videos.list reuse the same TLS connection. The async
+# variants use one httpx.AsyncClient per event loop.
+
+ASYNC_POOL_SIZE = 16
+
+_async_clients = weakref.WeakKeyDictionary()
+
+def _timeout():
+    return tuple(_setting('YOUTUBE_HTTP_TIMEOUT', DEFAULT_HTTP_TIMEOUT))
+
+def _get(url, params):
+    response = providers.get("youtube_http").get(url, params={**params, 'key': YOUTUBE_API_KEY}, timeout=_timeout())
     response.raise_for_status()
-    data = response.json()
-    items = data.get('items', [])
-    if not items:
-        return {'items': []}
-    # Get video IDs
-    video_ids = [item['id']['videoId'] for item in items if 'videoId' in item['id']]
+    return response.json()
+
+def async_client():
+    """The pooled httpx.AsyncClient for the running event loop."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    http = _async_clients.get(loop)
+    if http is None:
+        connect, read = _timeout()
+        http = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=ASYNC_POOL_SIZE, max_keepalive_connections=ASYNC_POOL_SIZE),
+        )
+        _async_clients[loop] = http
+    return http
+
+async def _aget(url, params):
+    response = await async_client().get(url, params={**params, 'key': YOUTUBE_API_KEY})
+    response.raise_for_status()
+    return response.json()
+
+async def aclose_async_client():
+    """Close this event loop's client; call before the loop shuts down."""
+    http = _async_clients.pop(asyncio.get_running_loop(), None)
+    if http is not None:
+        await http.aclose()
+
+# --------------- Cache and quota ---------------
+# search.list costs 100 quota units and videos.list 1. Search results are cached per
+# full parameter set and statistics per video id (on its VideoCatalog row), each with
+# its own TTL. Spending is
+# counted per quota day; once a call would eat into the reserve it is refused and
+# we fall back to cached data, however old.
+
+SEARCH_COST = 100
+VIDEOS_COST = 1
+DEFAULT_SEARCH_TTL = 7 * 24 * 60 * 60
+DEFAULT_STATS_TTL = 24 * 60 * 60
+DEFAULT_DAILY_QUOTA = 10000
+DEFAULT_QUOTA_RESERVE = 500
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def quota_day():
+    """The current YouTube quota day (quotas reset at midnight Pacific time)."""
+    return timezone.now().astimezone(QUOTA_TIMEZONE).date()
+
+def charge_quota(units, kind):
+    """Reserve quota units for one call; False when that would exceed the daily budget minus the reserve."""
+    day = quota_day()
+    limit = _setting('YOUTUBE_DAILY_QUOTA', DEFAULT_DAILY_QUOTA) - _setting('YOUTUBE_QUOTA_RESERVE', DEFAULT_QUOTA_RESERVE)
+    counter = 'search_calls' if kind == 'search' else 'videos_calls'
+
+    def charge():
+        YouTubeQuotaUsage.objects.get_or_create(day=day)
+        # Conditional increment so concurrent workers cannot overshoot together
+        charged = (YouTubeQuotaUsage.objects
+                   .filter(day=day, units__lte=limit - units)
+                   .update(units=F('units') + units, **{counter: F(counter) + 1}))
+        if not charged:
+            YouTubeQuotaUsage.objects.filter(day=day).update(refused_calls=F('refused_calls') + 1)
+        return charged
+
+    try:
+        # Searches run on worker threads, so the counters are updated by the shared writer (generation/db_utils.py)
+        charged = write(charge)
+    except DatabaseError as e:
+        # Spending we cannot record is spending we do not allow
+        print(f"⚠️ Could not record YouTube quota use, refusing {kind} call: {e}")
+        return False
+    if not charged:
+        print(f"⚠️ YouTube quota nearly exhausted for {day}; refusing {kind} call ({units} units)")
+    return bool(charged)
+
+def quota_usage():
+    """Units used today and the configured daily quota."""
+    usage = YouTubeQuotaUsage.objects.filter(day=quota_day()).first()
+    return {
+        'day': str(quota_day()),
+        'units': usage.units if usage else 0,
+        'quota': _setting('YOUTUBE_DAILY_QUOTA', DEFAULT_DAILY_QUOTA),
+        'refused_calls': usage.refused_calls if usage else 0,
+    }
+
+def _upsert(model, lookup, values):
+    if not model.objects.filter(**lookup).update(**values):
+        model.objects.create(**lookup, **values)
+
+def _store(model, lookup, values):
+    """Best-effort cache write; a lost write (busy database, duplicate key) only costs a later miss."""
+    try:
+        write(_upsert, model, lookup, values)
+    except DatabaseError as e:
+        print(f"⚠️ Could not store {model.__name__} entry: {e}")
+
+def _search_key(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _lookup_search(params):
+    """(cache key, cached entry or None, whether the entry is still fresh)."""
+    key = _search_key(params)
+    entry = YouTubeSearchCache.objects.filter(key=key).first()
+    fresh_after = timezone.now() - timedelta(seconds=_setting('YOUTUBE_SEARCH_TTL', DEFAULT_SEARCH_TTL))
+    return key, entry, bool(entry and entry.fetched_at >= fresh_after)
+
+def _store_search(key, params, items):
+    _store(YouTubeSearchCache, {'key': key}, {'params': params, 'items': items, 'fetched_at': timezone.now()})
+
+def _cached_search(params):
+    """search.list items for these parameters: cache, then API, then stale cache when out of quota."""
+    key, entry, fresh = _lookup_search(params)
+    if fresh:
+        return entry.items
+    if not charge_quota(SEARCH_COST, 'search'):
+        return entry.items if entry else []
+    with limiter("youtube", key_id(YOUTUBE_API_KEY)).slot():
+        items = _get(YOUTUBE_SEARCH_URL, params).get('items', [])
+    _store_search(key, params, items)
+    return items
+
+# --------------- videos.list batching ---------------
+# videos.list takes up to 50 ids per call (1 quota unit either way). Course
+# generation searches all its video lessons first and asks for every candidate's
+# statistics in one video_statistics() call (see "Two-phase search" below), which
+# fetches them in 50-id chunks. Lookups from different courses running at the same
+# time are pooled as well: the first caller in a window waits BATCH_WINDOW seconds
+# for others to add their ids, then fetches everything pending and hands each caller
+# its share.
+
+VIDEOS_PER_CALL = 50
+BATCH_WINDOW = 0.05
+
+def _fetch_statistics(video_ids):
+    """One videos.list call for up to 50 ids; stores what comes back in the stats cache."""
+    if not charge_quota(VIDEOS_COST, 'videos'):
+        return {}
+    with limiter("youtube", key_id(YOUTUBE_API_KEY)).slot():
+        data = _get(YOUTUBE_VIDEOS_URL, {'part': 'statistics', 'id': ','.join(video_ids)})
+    stats = {item['id']: item['statistics'] for item in data.get('items', [])}
+    gone = [vid for vid in video_ids if vid not in stats]
+    try:
+        write(_store_statistics, stats, gone, timezone.now())
+    except DatabaseError as e:
+        print(f"⚠️ Could not store statistics of {len(video_ids)} videos: {e}")
+    return stats
+
+def _store_statistics(stats, gone, now):
+    # One writer batch per videos.list call rather than one per video
+    for vid, statistics in stats.items():
+        _upsert(VideoCatalog, {'video_id': vid}, {'statistics': statistics, 'stats_fetched_at': now, 'available': True})
+    if gone:
+        VideoCatalog.objects.filter(video_id__in=gone).update(available=False)
+
+class StatsBatcher:
+    """Pools concurrent statistics lookups into as few videos.list calls as possible."""
+
+    def __init__(self, window=BATCH_WINDOW, chunk=VIDEOS_PER_CALL):
+        self.window = window
+        self.chunk = chunk
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._leader = False
+        self.stats = {'requested_ids': 0, 'calls': 0}
+
+    def fetch(self, video_ids):
+        futures = {}
+        with self._lock:
+            for vid in video_ids:
+                if vid not in self._pending:
+                    self._pending[vid] = Future()
+                    self.stats['requested_ids'] += 1
+                futures[vid] = self._pending[vid]
+            lead = not self._leader
+            self._leader = True
+        if lead:
+            time.sleep(self.window)
+            self._flush()
+        results = {}
+        for vid, future in futures.items():
+            statistics = future.result()
+            if statistics is not None:
+                results[vid] = statistics
+        return results
+
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            # Ids arriving from now on start a new window with a new leader
+            self._leader = False
+        ids = list(batch)
+        for start in range(0, len(ids), self.chunk):
+            chunk = ids[start:start + self.chunk]
+            try:
+                fetched = _fetch_statistics(chunk)
+                with self._lock:
+                    self.stats['calls'] += 1
+            except Exception as e:
+                print(f"❌ videos.list failed for {len(chunk)} ids: {e}")
+                fetched = {}
+            for vid in chunk:
+                batch[vid].set_result(fetched.get(vid))
+
+_stats_batcher = StatsBatcher()
+
+def batching_stats():
+    """Ids requested from and calls made by the statistics batcher in this process."""
+    with _stats_batcher._lock:
+        return dict(_stats_batcher.stats)
+
+def video_statistics(video_ids):
+    """Statistics per video id, from the cache where fresh and batched videos.list calls for the rest."""
     if not video_ids:
-        return {'items': []}
-    # Fetch statistics for these videos
-    stats_url = 'https://www.googleapis.com/youtube/v3/videos'
-    stats_params = {
-        'part': 'statistics',
-        'id': ','.join(video_ids),
-        'key': YOUTUBE_API_KEY
+        return {}
+    cached = {entry.video_id: entry for entry in (VideoCatalog.objects
+                                                  .filter(video_id__in=video_ids, stats_fetched_at__isnull=False)
+                                                  .only('video_id', 'statistics', 'stats_fetched_at'))}
+    fresh_after = timezone.now() - timedelta(seconds=_setting('YOUTUBE_STATS_TTL', DEFAULT_STATS_TTL))
+    stats = {vid: entry.statistics for vid, entry in cached.items() if entry.stats_fetched_at >= fresh_after}
+    missing = [vid for vid in video_ids if vid not in stats]
+    if missing:
+        stats.update(_stats_batcher.fetch(missing))
+    # Out of quota (or not returned): stale statistics are better than none for ranking
+    for vid in video_ids:
+        if vid not in stats and vid in cached:
+            stats[vid] = cached[vid].statistics
+    return stats
+
+# --------------- Video catalog ---------------
+# Every video seen in search results gets one VideoCatalog row (compact snippet
+# metadata, statistics); lessons link to those rows instead of storing their own
+# copy. The video picked for a query is remembered in VideoQueryMatch, so a repeat
+# of the query (same filters) within YOUTUBE_MATCH_TTL costs neither search.list nor
+# videos.list as long as the video is still available.
+
+DEFAULT_MATCH_TTL = 30 * 24 * 60 * 60
+DESCRIPTION_CHARS = 500
+
+def _match_key(params):
+    params = {name: value for name, value in params.items() if name != 'maxResults'}
+    params['q'] = ' '.join(str(params.get('q', '')).lower().split())
+    return _search_key(params)
+
+def _catalog_fields(item):
+    snippet = item.get('snippet', {})
+    return {
+        'title': snippet.get('title', '')[:300],
+        'description': snippet.get('description', '')[:DESCRIPTION_CHARS],
+        'thumbnail_url': snippet.get('thumbnails', {}).get('default', {}).get('url', ''),
+        'channel_title': snippet.get('channelTitle', '')[:200],
+        'published_at': snippet.get('publishedAt') or None,
+    }
+
+def catalog_videos(items):
+    """Add the videos of search.list items to the catalog (existing rows are left alone)."""
+    fields = {item['id']['videoId']: _catalog_fields(item) for item in items if 'videoId' in item.get('id', {})}
+    if not fields:
+        return
+    known = set(VideoCatalog.objects.filter(video_id__in=list(fields)).values_list('video_id', flat=True))
+    try:
+        write(
+            VideoCatalog.objects.bulk_create,
+            [VideoCatalog(video_id=vid, **values) for vid, values in fields.items() if vid not in known],
+            ignore_conflicts=True,
+        )
+    except DatabaseError as e:
+        print(f"⚠️ Could not add videos to the catalog: {e}")
+
+def catalog_entry(item):
+    """The VideoCatalog row for one search item, creating it if needed."""
+    vid = item['id']['videoId']
+    entry = VideoCatalog.objects.filter(video_id=vid).first()
+    if entry is not None:
+        return entry
+    entry, _created = write(VideoCatalog.objects.get_or_create, video_id=vid, defaults=_catalog_fields(item))
+    return entry
+
+def catalog_item(video):
+    """A catalog row in the shape of a search.list item (with statistics attached)."""
+    return {
+        'id': {'kind': 'youtube#video', 'videoId': video.video_id},
+        'snippet': {
+            'title': video.title,
+            'description': video.description,
+            'thumbnails': {'default': {'url': video.thumbnail_url}},
+            'channelTitle': video.channel_title,
+            'publishedAt': video.published_at.isoformat() if video.published_at else None,
+        },
+        'statistics': video.statistics,
     }
-    stats_resp = requests.get(stats_url, params=stats_params)
-    stats_resp.raise_for_status()
-    stats_data = stats_resp.json()
-    stats_map = {item['id']: item['statistics'] for item in stats_data.get('items', [])}
+
+def catalog_match(params):
+    """The known-good catalog video previously picked for these search parameters, or None."""
+    fresh_after = timezone.now() - timedelta(seconds=_setting('YOUTUBE_MATCH_TTL', DEFAULT_MATCH_TTL))
+    match = (VideoQueryMatch.objects
+             .select_related('video')
+             .filter(key=_match_key(params), matched_at__gte=fresh_after,
+                     video__available=True, video__stats_fetched_at__isnull=False)
+             .first())
+    return match.video if match else None
+
+def remember_match(params, result):
+    items = result.get('items', [])
+    if not items:
+        return
+    video = VideoCatalog.objects.filter(video_id=items[0]['id']['videoId']).first()
+    if video is not None:
+        _store(VideoQueryMatch, {'key': _match_key(params)},
+               {'query': str(params.get('q', ''))[:200], 'video': video, 'matched_at': timezone.now()})
+
+# --------------- Two-phase search ---------------
+# A search is split so many lessons can share statistics calls: find_videos() runs
+# the search (catalog match, cache or search.list) and returns the candidates,
+# video_statistics() is then called once with every candidate id of every lesson,
+# and rank_videos() picks each lesson's video from those statistics.
+# search_youtube() runs the three phases for a single query.
+
+def find_videos(query_params, max_results=5):
+    """Search phase: {'params', 'items', 'known'}; known is True for a catalog hit that needs no ranking."""
+    # Lessons that land on the same query share one search
+    return flight("youtube").do(call_key("find", query_params, max_results), _find_videos, query_params, max_results)
+
+def _find_videos(query_params, max_results):
+    params = _search_params(query_params, max_results)
+    known = catalog_match(params)
+    if known is not None:
+        print(f"📚 Video catalog hit for: {params['q'][:60]}")
+        return {'params': params, 'items': [catalog_item(known)], 'known': True}
+    items = [item for item in _cached_search(params) if 'videoId' in item.get('id', {})]
+    catalog_videos(items)
+    return {'params': params, 'items': items, 'known': False}
+
+def candidate_ids(found):
+    """Video ids whose statistics rank_videos needs for a find_videos result."""
+    return [] if found['known'] else [item['id']['videoId'] for item in found['items']]
+
+def rank_videos(found, stats_map):
+    """Ranking phase: the best video of a find_videos result, remembered for its query."""
+    if found['known'] or not found['items']:
+        return {'items': found['items']}
+    result = _pick_best(found['items'], stats_map)
+    remember_match(found['params'], result)
+    return result
+
+def _search_youtube(query_params, max_results):
+    found = _find_videos(query_params, max_results)
+    return rank_videos(found, video_statistics(candidate_ids(found)))
+
+def _pick_best(items, stats_map):
     # Attach stats to items
     for item in items:
         vid = item['id'].get('videoId')
@@ -120,3 +479,52 @@ def search_youtube(query_params, max_results=5):
     items_sorted = sorted(items, key=lambda x: (get_likes(x), get_views(x)), reverse=True)
     best_item = items_sorted[0]
     return {'items': [best_item]}
+
+# --------------- Async variant ---------------
+# For an asyncio generation engine: many lessons' searches run concurrently on one
+# event loop over the pooled AsyncClient. Cache and quota bookkeeping run through
+# sync_to_async; statistics still go through the shared batcher (in a worker thread)
+# so concurrent lessons keep sharing videos.list calls.
+
+_async_flights = weakref.WeakKeyDictionary()
+
+async def _acached_search(params):
+    key, entry, fresh = await sync_to_async(_lookup_search)(params)
+    if fresh:
+        return entry.items
+    if not await sync_to_async(charge_quota)(SEARCH_COST, 'search'):
+        return entry.items if entry else []
+    async with limiter("youtube", key_id(YOUTUBE_API_KEY)).aslot():
+        items = (await _aget(YOUTUBE_SEARCH_URL, params)).get('items', [])
+    await sync_to_async(_store_search)(key, params, items)
+    return items
+
+def _closing(fn, *args):
+    try:
+        return fn(*args)
+    finally:
+        connection.close()
+
+async def _asearch_youtube(query_params, max_results):
+    params = _search_params(query_params, max_results)
+    known = await sync_to_async(catalog_match)(params)
+    if known is not None:
+        return {'items': [catalog_item(known)]}
+    items = [item for item in await _acached_search(params) if 'videoId' in item.get('id', {})]
+    await sync_to_async(catalog_videos)(items)
+    found = {'params': params, 'items': items, 'known': False}
+    stats_map = await asyncio.to_thread(_closing, video_statistics, candidate_ids(found))
+    return await sync_to_async(rank_videos)(found, stats_map)
+
+async def asearch_youtube(query_params, max_results=5):
+    """Async search_youtube; identical concurrent searches on the same loop share one task."""
+    flights = _async_flights.setdefault(asyncio.get_running_loop(), {})
+    key = call_key(query_params, max_results)
+    task = flights.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_asearch_youtube(query_params, max_results))
+        flights[key] = task
+        task.add_done_callback(lambda _: flights.pop(key, None))
+    result = await asyncio.shield(task)
+    # Each caller gets its own copy, like search_youtube's followers
+    return copy.deepcopy(result)
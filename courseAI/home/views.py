@@ -5,7 +5,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 import os
-from cerebras.cloud.sdk import Cerebras
+from generation.llm_utils import complete_text
+from generation import providers
 
 # Create your views here.
 
@@ -36,10 +37,8 @@ def chat_api(request):
         if not user_message:
             return JsonResponse({'error': 'Message is required'}, status=400)
         
-        # Initialize Cerebras client
-        client = Cerebras(
-            api_key=os.environ.get("CEREBRAS_API_KEY")
-        )
+        # Shared Cerebras client (built on first use)
+        client = providers.get("cerebras")
         
         # Get conversation history from session
         if 'chat_history' not in request.session:
@@ -75,19 +74,16 @@ def chat_api(request):
             "content": user_message
         })
         
-        # Call Cerebras API
-        completion_response = client.chat.completions.create(
-            messages=messages,
-            model="qwen-3-235b-a22b-instruct-2507",
+        # Call Cerebras API on the model routed for chat
+        ai_response = complete_text(
+            "chat",
+            messages,
+            client,
             stream=False,
-            max_completion_tokens=1000,
             temperature=0.7,
             top_p=0.8
         )
         
-        # Extract the AI response
-        ai_response = completion_response.choices[0].message.content
-        
         # Update session with new messages
         chat_history.append({"role": "user", "content": user_message})
         chat_history.append({"role": "assistant", "content": ai_response})